@@ -0,0 +1,354 @@
+# Vectorized damage engine
+# Same formulas as the scalar functions in damage_sim.py, but every input can be a numpy array.
+# Inputs are integer ids from the stat registry (weapon/ammo/target/hitzone/faction/difficulty codes)
+# plus float arrays for distance and barrel condition. Anything that broadcasts works, so passing
+# np.ix_(...) style axes evaluates a whole grid in one go.
+from collections import namedtuple
+import numpy as np
+from metrics import metrics
+
+#Other important data
+difficulty_mult = {
+    'easy': 1.3,
+    'medium': 1.05,
+    'hard': 0.9,
+    'master': 0.8
+}
+
+legmeta = [ #if gun/ammo is in this section, do not add an AP boost to legshots; lines 807-814
+    "ammo_7.92x33_ap",
+    "ammo_7.92x33_fmj",
+    "ammo_7.62x54_7h1",
+    "ammo_7.62x54_ap",
+    "ammo_7.62x54_7h14",
+    "ammo_magnum_300",
+    "ammo_50_bmg",
+    "ammo_gauss",
+    "wpn_l96a1",
+    "wpn_mk14",
+    "wpn_remington700",
+    "wpn_m40_cw",
+    "wpn_wa2000"
+]
+
+buckshot = ["ammo_12x70_buck", "ammo_20x70_buck", "ammo_23x75_shrapnel"] #gets smaller head/leg AP boosts
+
+#standardize hitzone input because fuck no
+hitzones_mutants = [ "head", "torso", "limbs", "rear", "other"]
+hitzones_stalkers = [ "head", "torso", "arms", "legs"]
+stalker_bone_mult = { "head": 3.65, "torso": 0.9, "arms": 0.4, "legs": 0.4 }
+
+faction_res_table = { #isg_res = ap res, sin_res = dmg res. anything not in here is 1.0/1.0
+    'other': {'ap_res': 1.0, 'dmg_res': 1.0},
+    'greh': {'ap_res': 0.9, 'dmg_res': 0.3},
+    'monolith': {'ap_res': 0.9, 'dmg_res': 0.8},
+    'isg': {'ap_res': 0.7, 'dmg_res': 0.65},
+    'bandit': {'ap_res': 1.1, 'dmg_res': 1.0},
+    'zombie': {'ap_res': 1.0, 'dmg_res': 0.3}
+}
+
+# code lookups, position in the tuple = integer code
+difficulties = tuple(difficulty_mult)
+factions = tuple(faction_res_table)
+
+# order of positional args for every engine call
+INPUT_KEYS = ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
+
+# min/avg/max multipliers for the random non-pen damage roll
+RAND_DMG_MIN = 25
+RAND_DMG_AVG = 62.5
+RAND_DMG_MAX = 100
+
+StalkerHit = namedtuple('StalkerHit', ['penetrated', 'new_armor', 'damage', 'min_damage', 'max_damage', 'random_damage', 'ap'])
+MutantHit = namedtuple('MutantHit', ['penetrated', 'damage', 'gbo_damage'])
+# everything one Calculate click needs, from a single pass. damage/min/max are vs. the current armor,
+# pen_damage is what a shot does once armor is gone, shot counts are floats (inf if the target can't be hurt)
+# travel_time/ttk_seconds/one_mag need the weapon catalog, NaN/False for weapons it doesn't cover
+HitResult = namedtuple('HitResult', ['penetrated', 'random_damage', 'ap', 'nominal_damage', 'damage', 'min_damage', 'max_damage',
+                                     'pen_damage', 'armor', 'new_armor', 'shots_to_pen', 'ttk', 'ttk_min', 'ttk_max',
+                                     'travel_time', 'ttk_seconds', 'one_mag'])
+
+def _frozen(values, dtype=None):
+    arr = np.array(values, dtype=dtype)
+    arr.setflags(write=False)
+    return arr
+
+def barrel_cond(barrel): #takes a float or array, 0-1
+    barrel = np.asarray(barrel, dtype=float)
+    barrel_corrected = ( 130 - ( 1.12 * barrel ) ) * ( barrel * 1.12 ) / 100
+    return np.where(barrel_corrected < 1, barrel_corrected, 1.0)
+
+def stalker_armor_calc(ap, dmg, bone_armor, hit_fraction, hp_no_penetration_penalty):
+    # same branches as the scalar version, except ap == bone_armor counts as non-penetrating
+    # (the scalar version fell through both ifs and returned None there)
+    ap, dmg, bone_armor = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (ap, dmg, bone_armor)))
+    loss_increment = ap * 0.6
+    new_bone_armor = bone_armor - loss_increment
+    penetrated = ap > bone_armor
+    random_damage = ~penetrated & ~(ap > new_bone_armor)
+    base = 0.0025 * dmg * hit_fraction
+    damage = np.where(penetrated, dmg, np.where(random_damage, base * RAND_DMG_AVG / hp_no_penetration_penalty, dmg * hit_fraction))
+    min_damage = np.where(random_damage, base * RAND_DMG_MIN / hp_no_penetration_penalty, damage)
+    max_damage = np.where(random_damage, base * RAND_DMG_MAX / hp_no_penetration_penalty, damage)
+    return StalkerHit(penetrated, new_bone_armor, damage, min_damage, max_damage, random_damage, ap)
+
+class BatchEngine:
+    # holds per-table numpy arrays pulled out of a StatRegistry; read-only once built
+    # catalog: optional weapon_catalog.load_catalog frame for fire rate/mag size/muzzle velocity, in registry weapon order
+
+    def __init__(self, registry, catalog=None):
+        self.registry = registry
+        weapons, ammo, stalkers, mutants = registry.weapons, registry.ammo, registry.stalkers, registry.mutants
+
+        self.hit_power = weapons.columns['hit_power']
+        self.integrated_silencer = weapons.columns['integrated_silencer']
+        self.wpn_legmeta = _frozen([w in legmeta for w in weapons.ids])
+        for col in ('fire_rate', 'mag_size', 'muzzle_velocity'):
+            values = catalog[col].to_numpy(dtype=float) if catalog is not None else np.full(len(weapons), np.nan)
+            setattr(self, col, _frozen(values))
+
+        self.k_hit = ammo.columns['k_hit']
+        self.k_ap = ammo.columns['k_ap']
+        self.air_res = ammo.columns['air_res']
+        self.ammo_mult_mutant = ammo.columns['ammo_mult_mutant']
+        self.gigant_ammo_mult = ammo.columns['gigant_ammo_mult']
+        self.ammo_mult_stalker = ammo.columns['ammo_mult_stalker']
+        self.hp_no_penetration_penalty = ammo.columns['hp_no_penetration_penalty']
+        self.pellets = ammo.columns['pellets']
+        self.ammo_legmeta = _frozen([a in legmeta for a in ammo.ids])
+        self.ammo_buckshot = _frozen([a in buckshot for a in ammo.ids])
+
+        self.stalker_hit_fraction = stalkers.columns['hit_fraction']
+        self.stalker_ap_scale = stalkers.columns['ap_scale']
+        self.stalker_armor = _frozen([ #(target, hitzone) - head uses head armor, everything else body armor
+            [s.head_bonearmor if hz == 'head' else s.body_bonearmor for hz in hitzones_stalkers] for s in stalkers
+        ], dtype=float)
+        self.stalker_bone_mult = _frozen([stalker_bone_mult[hz] for hz in hitzones_stalkers], dtype=float)
+
+        self.mutant_mult = mutants.columns['mutant_mult']
+        self.spec_mutant_mult = mutants.columns['spec_mutant_mult']
+        self.mutant_armor = mutants.columns['skin_armor']
+        self.mutant_hit_fraction = mutants.columns['hit_fraction']
+        self.zombie_modifier = mutants.columns['zombie_modifier']
+        self.mutant_is_gigant = _frozen([m == 'm_gigant_e' for m in mutants.ids]) #special pseudogiant handling
+        self.mutant_zone_mult = _frozen([[m[hz] for hz in hitzones_mutants] for m in mutants], dtype=float)
+        self.mutant_crit_mult = _frozen([ #crit_hit if the zone is the mutant's crit zone, else 1
+            [m.crit_hit if m.crit_zone != 'none' and m.crit_zone == hz else 1.0 for hz in hitzones_mutants] for m in mutants
+        ], dtype=float)
+
+        self.difficulty_mult = _frozen([difficulty_mult[d] for d in difficulties], dtype=float)
+        self.faction_ap_res = _frozen([faction_res_table[f]['ap_res'] for f in factions], dtype=float)
+        self.faction_dmg_res = _frozen([faction_res_table[f]['dmg_res'] for f in factions], dtype=float)
+
+    # Encoding - string ids to integer codes
+
+    def encode(self, values, kind='stalker'): #dict with INPUT_KEYS (scalars or lists) -> tuple of code arrays in INPUT_KEYS order
+        if kind == 'stalker':
+            targets, zones = self.registry.stalkers, hitzones_stalkers
+        else:
+            targets, zones = self.registry.mutants, hitzones_mutants
+        with metrics.stage('lookup'):
+            return self._encode(values, targets, zones)
+
+    def _encode(self, values, targets, zones):
+        return (
+            _codes(self.registry.weapons.index.__getitem__, values['weapon']),
+            _codes(self.registry.ammo.index.__getitem__, values['bullet']),
+            _codes(targets.index.__getitem__, values['target']),
+            _codes(zones.index, values['hitzone']),
+            _codes(lambda f: factions.index(f) if f in factions else 0, values['faction']), #unknown faction = no resistances
+            np.asarray(values['dist'], dtype=float),
+            np.asarray(values['barrel'], dtype=float),
+            _codes(difficulties.index, values['game_difficulty']),
+            np.asarray(values['silencer'], dtype=bool)
+        )
+
+    # Shared sub-calculations
+
+    def air_res_function(self, ammo, dist):
+        air_res = self.air_res[ammo]
+        return (1 + dist / 200 * (air_res * 0.5 / (1 - air_res + 0.1 )))
+
+    def silencer_mult(self, weapon, silencer): #extra silencer or integral silencer both count
+        return np.where(np.asarray(silencer, dtype=bool) | self.integrated_silencer[weapon], 1.07, 1.0)
+
+    def stalker_armor_at(self, target, hitzone):
+        return self.stalker_armor[target, hitzone]
+
+    def kill_time(self, weapon, dist, ttk): #(bullet travel time, seconds from first shot to the killing hit, fits in one mag)
+        # shots go out every 60/rpm seconds, the last one still has to fly to the target. reloads aren't counted
+        travel_time = dist / self.muzzle_velocity[weapon]
+        ttk_seconds = (ttk - 1) * (60 / self.fire_rate[weapon]) + travel_time
+        return travel_time, ttk_seconds, ttk <= self.mag_size[weapon]
+
+    # Stalkers
+
+    def stalker_ap(self, weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer):
+        local_ap = self.k_ap[ammo] * 10
+        buck = self.ammo_buckshot[ammo]
+        #Hitzone-specific AP changes
+        legs_bonus = np.where(buck, 0.013, np.where(self.wpn_legmeta[weapon] | self.ammo_legmeta[ammo], 0.0, 0.075))
+        head_bonus = np.where(buck, 0.019, 0.04)
+        hitzone = np.asarray(hitzone)
+        local_ap = local_ap + np.where(hitzone == hitzones_stalkers.index('legs'), legs_bonus,
+                                       np.where(hitzone == hitzones_stalkers.index('head'), head_bonus, 0.0))
+
+        # the multipliers are grouped so the small ones combine before broadcasting out to the full grid,
+        # only the last divide by air resistance runs at full size
+        local_ap = local_ap * self.stalker_ap_scale[target] * barrel_cond(barrel)
+        other_mults = self.faction_ap_res[faction] * self.silencer_mult(weapon, silencer) * self.difficulty_mult[difficulty] \
+            * 0.8 * self.pellets[ammo] #calculation nominally should apply across every pellet
+        return local_ap * other_mults / self.air_res_function(ammo, dist)
+
+    def stalker_damage(self, weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer): #nominal damage before armor
+        # note: silencer isn't applied to damage here, same as the scalar version
+        wpn_ammo = self.hit_power[weapon] * self.k_hit[ammo] * self.ammo_mult_stalker[ammo] * self.pellets[ammo] #nominal dmg is multiplied by pellet number
+        target_mults = self.stalker_bone_mult[hitzone] * self.stalker_ap_scale[target] * 1.1
+        other_mults = barrel_cond(barrel) * self.faction_dmg_res[faction] * self.difficulty_mult[difficulty]
+        return wpn_ammo * target_mults * other_mults / self.air_res_function(ammo, dist)
+
+    def stalker_hit(self, weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer, bone_armor=None):
+        # bone_armor: optional override, NaN entries fall back to the profile's armor
+        args = (weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer)
+        default_armor = self.stalker_armor_at(target, hitzone)
+        if bone_armor is None:
+            bone_armor = default_armor
+        else:
+            bone_armor = np.asarray(bone_armor, dtype=float)
+            bone_armor = np.where(np.isnan(bone_armor), default_armor, bone_armor)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return stalker_armor_calc(self.stalker_ap(*args), self.stalker_damage(*args), bone_armor,
+                                      self.stalker_hit_fraction[target], self.hp_no_penetration_penalty[ammo])
+
+    # Mutants
+
+    def mutant_hit(self, weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer): #gbo damage, before armor
+        cqc_mult = 1.0 #not handling melee weapons in this version
+        raw_dmg = self.hit_power[weapon] * self.k_hit[ammo] * self.pellets[ammo]
+        ammo_mult = np.where(self.mutant_is_gigant[target], self.gigant_ammo_mult[ammo], self.ammo_mult_mutant[ammo])
+        bone_mult = self.mutant_zone_mult[target, hitzone] * self.mutant_crit_mult[target, hitzone]
+        with np.errstate(divide='ignore'): #high air_res ammo hits zero at some distance, inf damage like the old version
+            air_res_function = self.air_res_function(ammo, dist)
+        gbo_dmg = raw_dmg / air_res_function * self.mutant_mult[target] * ammo_mult * self.spec_mutant_mult[target] \
+            * bone_mult * cqc_mult * barrel_cond(barrel) * self.difficulty_mult[difficulty]
+        #bullshit zombie modifier
+        return gbo_dmg * self.zombie_modifier[target]
+
+    def anomaly_engine_pen(self, gbo_dmg, ammo, target, hitzone, armor_override=None, kind='mutant'): #how the engine handles pen or non-pen hits
+        ap = self.k_ap[ammo]
+        if kind == 'mutant':
+            armor = self.mutant_armor[target]
+            hit_fraction = self.mutant_hit_fraction[target]
+            hit_scale = self.mutant_zone_mult[target, hitzone]
+            ap_scale = 0.75
+        else:
+            armor = self.stalker_armor_at(target, hitzone)
+            hit_fraction = self.stalker_hit_fraction[target]
+            hit_scale = self.stalker_bone_mult[hitzone]
+            ap_scale = self.stalker_ap_scale[target]
+        if armor_override is not None: #NaN entries mean no override
+            armor_override = np.asarray(armor_override, dtype=float)
+            armor = np.where(np.isnan(armor_override), armor, armor_override)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d_hit_power = (ap - armor) / (ap * ap_scale)
+        d_hit_power = np.where(d_hit_power < hit_fraction, hit_fraction, np.where(d_hit_power > 1, 1.0, d_hit_power))
+        return ap * ap_scale > armor, gbo_dmg * d_hit_power * hit_scale
+
+    def mutant_pen_hit(self, weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer, armor_override=None):
+        gbo_dmg = self.mutant_hit(weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer)
+        penetrated, damage = self.anomaly_engine_pen(gbo_dmg, ammo, target, hitzone, armor_override)
+        return MutantHit(penetrated, damage, gbo_dmg)
+
+    # Full single-pass evaluation
+
+    def evaluate(self, kind, weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer, armor_override=None):
+        # one pass over the engine per shot: hit, shots to pen and shots to kill share the same AP/damage arrays
+        args = (weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer)
+        if kind == 'stalker':
+            return self._evaluate_stalker(args, armor_override)
+        return self._evaluate_mutant(args, armor_override)
+
+    def _evaluate_stalker(self, args, armor_override):
+        weapon, ammo, target, hitzone = args[:4]
+        armor = self.stalker_armor_at(target, hitzone)
+        if armor_override is not None:
+            armor_override = np.asarray(armor_override, dtype=float)
+            armor = np.where(np.isnan(armor_override), armor, armor_override)
+        hit_fraction = self.stalker_hit_fraction[target]
+        hp_penalty = self.hp_no_penetration_penalty[ammo]
+        ap_scale = self.stalker_ap_scale[target]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            with metrics.stage('ap'):
+                ap = self.stalker_ap(*args)
+                nominal = self.stalker_damage(*args)
+            with metrics.stage('armor'):
+                hit = stalker_armor_calc(ap, nominal, armor, hit_fraction, hp_penalty)
+                #damage once armor is gone (armor_calc with bone_armor = 0): full damage, unless there's no AP at all
+                pen_damage = np.where(ap > 0, nominal, 0.0025 * nominal * hit_fraction * RAND_DMG_AVG / hp_penalty)
+
+            with metrics.stage('ttk'):
+                #how many shots needed to destroy armor at hitzone, round UP since 3.1 = needs 4 shots to pen
+                scaled_ap = ap * ap_scale
+                shots_to_pen = np.where(scaled_ap < armor, np.ceil((armor - scaled_ap) / (ap * 0.6)), 1.0)
+                shots_to_pen = np.maximum(shots_to_pen, 1.0) #clamp minimum to 1
+
+                #partially recreate stalker armor calc: armor shots, then full damage shots for whatever health is left
+                ttk = shots_to_pen + np.ceil((1.0 - shots_to_pen * hit.damage) / pen_damage)
+                ttk_min = np.where(hit.random_damage, shots_to_pen + np.ceil((1.0 - shots_to_pen * hit.min_damage) / pen_damage), ttk)
+                ttk_max = np.where(hit.random_damage, shots_to_pen + np.ceil((1.0 - shots_to_pen * hit.max_damage) / pen_damage), ttk)
+                travel_time, ttk_seconds, one_mag = self.kill_time(weapon, args[5], ttk)
+        return HitResult(*np.broadcast_arrays(hit.penetrated, hit.random_damage, ap, nominal, hit.damage, hit.min_damage, hit.max_damage,
+                                              pen_damage, armor, hit.new_armor, shots_to_pen, ttk, ttk_min, ttk_max,
+                                              travel_time, ttk_seconds, one_mag))
+
+    def _evaluate_mutant(self, args, armor_override):
+        weapon, ammo, target, hitzone = args[:4]
+        armor = self.mutant_armor[target]
+        if armor_override is not None:
+            armor_override = np.asarray(armor_override, dtype=float)
+            armor = np.where(np.isnan(armor_override), armor, armor_override)
+        with metrics.stage('ap'):
+            gbo_dmg = self.mutant_hit(*args)
+        with metrics.stage('armor'):
+            penetrated, damage = self.anomaly_engine_pen(gbo_dmg, ammo, target, hitzone, armor_override)
+        with np.errstate(divide='ignore', invalid='ignore'), metrics.stage('ttk'):
+            ttk = np.ceil(1 / damage)
+            travel_time, ttk_seconds, one_mag = self.kill_time(weapon, args[5], ttk)
+        #mutant armor never degrades and there's no random roll, so it's always one shot "to pen"
+        return HitResult(*np.broadcast_arrays(penetrated, False, self.k_ap[ammo], gbo_dmg, damage, damage, damage,
+                                              damage, armor, armor, 1.0, ttk, ttk, ttk, travel_time, ttk_seconds, one_mag))
+
+    # Grids
+
+    def axis_codes(self, kind='stalker', **axes): #lists of string ids/values per INPUT_KEY -> 1-D code arrays, defaults = everything
+        if kind == 'stalker':
+            targets, zones = self.registry.stalkers, hitzones_stalkers
+        else:
+            targets, zones = self.registry.mutants, hitzones_mutants
+        defaults = dict(weapon=self.registry.weapons.ids, bullet=self.registry.ammo.ids, target=targets.ids, hitzone=zones,
+                        faction=['other'], dist=[0], barrel=[1.0], game_difficulty=['hard'], silencer=[False])
+        values = {key: list(np.atleast_1d(axes[key])) if axes.get(key) is not None else list(defaults[key]) for key in INPUT_KEYS}
+        return self.encode(values, kind)
+
+    def sweep(self, kind='stalker', weapons_per_chunk=1, armor_override=None, **axes):
+        # evaluates the full cartesian product of the given axes (see axis_codes), a few weapons at a time
+        # yields (weapon codes, HitResult) - result arrays have one dimension per INPUT_KEY, in that order
+        codes = [c.astype(np.intp) if c.dtype == bool else c for c in self.axis_codes(kind, **axes)] #np.ix_ treats bools as masks
+        weapons = codes[0]
+        for start in range(0, len(weapons), weapons_per_chunk):
+            grid = np.ix_(weapons[start:start + weapons_per_chunk], *codes[1:])
+            yield grid[0].ravel(), self.evaluate(kind, *grid, armor_override=armor_override)
+
+def _codes(lookup, values): #scalar stays a 0-d array, lists become 1-d
+    if isinstance(values, (list, tuple, np.ndarray)):
+        return np.array([lookup(v) for v in values], dtype=np.intp)
+    return np.asarray(lookup(values), dtype=np.intp)
+
+def scalar_result(result): #HitResult of 0-d arrays -> plain python values, shot counts as ints where they're finite
+    values = {}
+    for field, value in zip(HitResult._fields, result):
+        value = np.asarray(value).item()
+        if field in ('shots_to_pen', 'ttk', 'ttk_min', 'ttk_max') and np.isfinite(value):
+            value = int(value)
+        values[field] = value
+    return HitResult(**values)
@@ -0,0 +1,227 @@
+# Benchmarks for the damage engine, the output callbacks and startup
+# Runs offline against the local csvs (GAMMA_SIM_SOURCE is forced to local) with a fixed seed, so two runs on the same
+# machine are comparable. Results are written as json; --compare an older file to see what got slower.
+#   python damage-sim/bench.py                        full run, writes bench_output.json
+#   python damage-sim/bench.py --quick                fewer repeats and a smaller sweep
+#   python damage-sim/bench.py --compare old.json     exits 1 if anything is over --threshold times slower
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SIM_DIR)
+os.environ['GAMMA_SIM_SOURCE'] = 'local' #never hit the network from a benchmark
+
+FACTIONS = ['other', 'greh', 'monolith', 'isg', 'bandit', 'zombie']
+DISTANCES = [0, 10, 25, 50, 100, 200, 300]
+BARRELS = [0.1, 0.5, 0.85, 1.0]
+SWEEP_DISTANCES = [0, 25, 50, 100, 200]
+
+def timed(fn, repeat=5, number=None): #per-call seconds over `repeat` runs of `number` calls
+    timer = timeit.Timer(fn)
+    if number is None:
+        number, _ = timer.autorange() #enough calls for ~0.2s a run
+    runs = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {'unit': 's/call', 'min': min(runs), 'median': statistics.median(runs), 'max': max(runs), 'calls': number * repeat}
+
+def scenarios(sim, kind, count, seed): #fixed set of representative inputs, [weapon, bullet, target, hitzone, faction, dist, barrel, difficulty, silencer]
+    from batch_engine import difficulties
+    rng = random.Random(seed)
+    pairs = [(w, a) for w in sim.weapons_df.index for a in sim.compatible_ammo(w)]
+    if kind == 'stalker':
+        targets, zones, factions = list(sim.stalkers_df.index), sim.hitzones_stalkers, FACTIONS
+    else:
+        targets, zones, factions = list(sim.mutants_df.index), sim.hitzones_mutants, ['other']
+    out = []
+    for _ in range(count):
+        weapon, bullet = rng.choice(pairs)
+        out.append([weapon, bullet, rng.choice(targets), rng.choice(zones), rng.choice(factions), rng.choice(DISTANCES),
+                    rng.choice(BARRELS), rng.choice(difficulties), rng.choice([False, True])])
+    return out
+
+def per_scenario(fn, inputs, repeat): #time one pass over all inputs, reported per call
+    def run():
+        for s in inputs:
+            fn(s)
+    result = timed(run, repeat=repeat, number=1)
+    for key in ('min', 'median', 'max'):
+        result[key] /= len(inputs)
+    result['calls'] *= len(inputs)
+    result['scenarios'] = len(inputs)
+    return result
+
+def bench_engine(sim, repeat, count):
+    stalker = scenarios(sim, 'stalker', count, seed=1)
+    mutant = scenarios(sim, 'mutant', count, seed=2)
+    return {
+        'stalker_hit': per_scenario(sim.stalker_hit, stalker, repeat),
+        'stalker_shots_to_pen': per_scenario(sim.shots_to_pen, stalker, repeat),
+        'stalker_time_to_kill': per_scenario(sim.time_to_kill, stalker, repeat),
+        'mutant_hit': per_scenario(sim.mutant_hit, mutant, repeat),
+        'mutant_time_to_kill': per_scenario(sim.time_to_kill, mutant, repeat),
+        'evaluate_hit': per_scenario(sim.evaluate_hit, stalker + mutant, repeat)
+    }
+
+def bench_callbacks(sim, ds, repeat, count): #the server side of Calculate, called directly with form-style inputs
+    inputs = []
+    for i, s in enumerate(scenarios(sim, 'stalker', count, seed=3) + scenarios(sim, 'mutant', count, seed=4)):
+        weapon, bullet, target, hitzone, faction, dist, barrel, difficulty, silencer = s
+        override = i % 5 == 0
+        inputs.append(dict(submit=1, show_override=override, armor_override=0.3 if override else None, scale_display=i % 2 == 0,
+                           weapon=weapon, bullet=bullet, target=target, hitzone=hitzone, faction=faction, dist=dist,
+                           barrel=barrel * 100, game_difficulty=difficulty, silencer=silencer))
+    results = {
+        'output_cards': per_scenario(lambda a: ds.output_cards(**a), inputs, repeat),
+        'update_output': per_scenario(lambda a: ds.update_output(**a), inputs, repeat)
+    }
+    maxsize = ds.result_cache.maxsize
+    ds.result_cache.maxsize = 0 #the result cache would turn every repeat after the first into a lookup
+    try:
+        results['calculate'] = per_scenario(lambda a: ds.calculate(**a), inputs, repeat)
+        results['calculate_curves'] = per_scenario(lambda a: ds.calculate(**a, show_curves=True), inputs[:max(1, count // 4)], repeat)
+    finally:
+        ds.result_cache.maxsize = maxsize
+    if maxsize > 0: #repeat clicks with the same inputs, served from the cache
+        ds.result_cache.reset(ds.result_cache.data_hash)
+        results['calculate_cache_hit'] = per_scenario(lambda a: ds.calculate(**a), inputs[:maxsize], repeat)
+    return results
+
+def bench_sweep(sim, weapons): #full-grid throughput over every ammo/target/hitzone/faction for the first `weapons` weapons
+    results = {}
+    for kind in ('stalker', 'mutant'):
+        axes = dict(weapon=list(sim.weapons_df.index[:weapons]), dist=SWEEP_DISTANCES)
+        if kind == 'stalker':
+            axes['faction'] = FACTIONS
+        cells = 0
+        start = time.perf_counter()
+        for _, result in sim.engine.sweep(kind, weapons_per_chunk=4, **axes):
+            cells += result.ttk.size
+        elapsed = time.perf_counter() - start
+        results['sweep_' + kind] = {'unit': 'cells/s', 'cells': cells, 'seconds': elapsed, 'rate': cells / elapsed}
+    return results
+
+def import_time(env, statement='import sim_engine'): #seconds to run `statement` in a fresh interpreter
+    code = 'import sys, time; sys.path.insert(0, {!r}); t = time.perf_counter(); {}; print(time.perf_counter() - t)'.format(SIM_DIR, statement)
+    out = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def bench_startup(repeat):
+    results = {}
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as cache:
+        env['GAMMA_SIM_CACHE'] = cache
+        cold = []
+        for _ in range(repeat):
+            for name in os.listdir(cache): #no snapshot: csv parse + snapshot write
+                os.remove(os.path.join(cache, name))
+            cold.append(import_time(env))
+        warm = [import_time(env) for _ in range(repeat)] #snapshot from the last cold run
+        app = [import_time(env, 'import damage_sim; damage_sim.create_app()') for _ in range(repeat)] #Dash, layout, leaderboard
+    for name, runs in (('import_cold_cache', cold), ('import_warm_cache', warm), ('app_startup', app)):
+        results[name] = {'unit': 's', 'min': min(runs), 'median': statistics.median(runs), 'max': max(runs), 'runs': len(runs)}
+    return results
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR, capture_output=True, text=True)
+    except OSError:
+        return None
+    commit = out.stdout.strip() or None
+    if commit and dirty.stdout.strip():
+        commit += '-dirty'
+    return commit
+
+def headline(result): #the one number to compare per benchmark, bigger = slower
+    if result['unit'] == 'cells/s':
+        return 1 / result['rate']
+    return result['median']
+
+def compare(current, baseline, threshold): #prints a ratio per benchmark, returns names that got slower than threshold
+    slower = []
+    print('{:<26}{:>14}{:>14}{:>9}'.format('benchmark', 'baseline', 'current', 'ratio'))
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        old, new = headline(baseline['results'][name]), headline(result)
+        ratio = new / old if old else float('inf')
+        flag = ' <-- slower' if ratio > threshold else ''
+        print('{:<26}{:>14.6g}{:>14.6g}{:>8.2f}x{}'.format(name, old, new, ratio, flag))
+        if ratio > threshold:
+            slower.append(name)
+    if baseline['meta'].get('data_hash') != current['meta'].get('data_hash'):
+        print('note: data changed since the baseline ({} -> {})'.format(baseline['meta'].get('data_hash'), current['meta'].get('data_hash')))
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the damage sim')
+    parser.add_argument('--out', default='bench_output.json', help='where to write the results json')
+    parser.add_argument('--quick', action='store_true', help='fewer repeats and a smaller sweep')
+    parser.add_argument('--only', nargs='+', choices=['engine', 'callbacks', 'sweep', 'startup'], help='run just these groups')
+    parser.add_argument('--sweep-weapons', type=int, default=None, help='weapons in the sweep grid (default 40, 5 with --quick)')
+    parser.add_argument('--compare', help='baseline json from an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.25, help='ratio over the baseline that counts as a regression')
+    args = parser.parse_args(argv)
+
+    groups = args.only or ['engine', 'callbacks', 'sweep', 'startup']
+    repeat = 3 if args.quick else 7
+    count = 50 if args.quick else 200
+    sweep_weapons = args.sweep_weapons or (5 if args.quick else 40)
+
+    results = {}
+    if 'startup' in groups: #before importing anything here, so nothing is warmed up by this process
+        print('startup...')
+        results.update(bench_startup(2 if args.quick else 5))
+    sys.path.insert(0, SIM_DIR)
+    os.chdir(REPO_DIR) #damage_sim expects to be run from the repo root
+    import numpy as np
+    import sim_engine as sim
+    if 'engine' in groups:
+        print('engine...')
+        results.update(bench_engine(sim, repeat, count))
+    if 'callbacks' in groups:
+        print('callbacks...')
+        import damage_sim as ds
+        results.update(bench_callbacks(sim, ds, repeat, count))
+    if 'sweep' in groups:
+        print('sweep...')
+        results.update(bench_sweep(sim, sweep_weapons))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'data_hash': sim.snapshot().data_hash,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'quick': args.quick
+        },
+        'results': results
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    for name, result in results.items():
+        if result['unit'] == 'cells/s':
+            print('{:<26}{:>14,.0f} cells/s'.format(name, result['rate']))
+        else:
+            print('{:<26}{:>14.3f} ms'.format(name, result['median'] * 1000))
+    print('wrote', args.out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# Breakpoint solver: where along one input the shots to kill steps up or down
+# For a scenario (same fields as scenarios.py) and an axis - dist (m), barrel (%) or armor (the bone/skin armor,
+# what armor_override sets) - the answer is a piecewise table over that axis:
+#   [{'from': 0, 'to': 41.377, 'ttk': 2, 'ttk_min': 2, 'ttk_max': 2}, {'from': 41.377, 'to': 300, 'ttk': 3, ...}]
+# instead of evaluating every metre/percent. Each axis is sampled on a coarse grid (one engine call for all the
+# scenarios), and every grid cell where ttk/ttk_min/ttk_max differ at the two ends is bisected down to the axis tolerance,
+# all open cells in one engine call per step. A cell holding several steps is bisected again from the first one found.
+# Distance and barrel only scale AP and damage together (through air_res_function and barrel_cond) and more armor only
+# ever costs shots, so shots to kill moves one way along each axis. A step that went and came back inside one grid cell
+# (5m, 1.7% barrel, 0.017 armor) would be missed, but that doesn't happen with these formulas.
+# Counts past max_shots are lumped together as max_shots + 1, otherwise a barrel near 0% is thousands of one-shot steps.
+import numpy as np
+from batch_engine import INPUT_KEYS
+from scenarios import normalize_scenario, _json_number, SCENARIO_FIELDS
+
+AXES = {'dist': (0, 300, 1e-3), 'barrel': (0, 100, 1e-3), 'armor': (0, 1, 1e-6)} #axis -> (low, high, tolerance)
+GRID_POINTS = 61 #coarse samples per axis, before bisecting
+SHOT_FIELDS = ('ttk_min', 'ttk', 'ttk_max')
+MAX_SHOTS = 100 #segments above this read max_shots + 1, None is still can't kill
+
+def check_axis(axis, low=None, high=None): #-> (low, high, tolerance), raises ValueError on a bad axis or range
+    if axis not in AXES:
+        raise ValueError('axis must be one of {}'.format(', '.join(AXES)))
+    axis_low, axis_high, tolerance = AXES[axis]
+    low = axis_low if low is None else low
+    high = axis_high if high is None else high
+    for value in (low, high):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not axis_low <= value <= axis_high:
+            raise ValueError('{} range must be numbers between {} and {}'.format(axis, axis_low, axis_high))
+    if low >= high:
+        raise ValueError('range low must be below high')
+    return float(low), float(high), tolerance
+
+def _same(a, b): #rows of (ttk_min, ttk, ttk_max) that match, NaN counts as equal to NaN
+    return np.all((a == b) | (np.isnan(a) & np.isnan(b)), axis=-1)
+
+def _shots(engine, kind, codes, armor_override, rows, axis, x, max_shots): #(ttk_min, ttk, ttk_max) stacked on the last axis
+    args = [c[rows] for c in codes]
+    armor = armor_override[rows]
+    if axis == 'dist':
+        args[INPUT_KEYS.index('dist')] = x
+    elif axis == 'barrel':
+        args[INPUT_KEYS.index('barrel')] = x / 100
+    else:
+        armor = x
+    result = engine.evaluate(kind, *args, armor_override=armor)
+    shots = np.stack(np.broadcast_arrays(*(getattr(result, f) for f in SHOT_FIELDS)), axis=-1)
+    return np.where(np.isfinite(shots) & (shots > max_shots), max_shots + 1, shots)
+
+def solve_kind(engine, kind, items, axis, low, high, tolerance, max_shots=MAX_SHOTS): #normalized scenarios of one kind -> list of segment lists
+    columns = {key: [sc[key] for sc in items] for key in SCENARIO_FIELDS}
+    columns['barrel'] = [b / 100 for b in columns['barrel']]
+    codes = engine.encode(columns, kind)
+    armor_override = np.array([np.nan if a is None else a for a in columns['armor_override']], dtype=float)
+    shots = lambda rows, x: _shots(engine, kind, codes, armor_override, rows, axis, x, max_shots)
+
+    grid = np.linspace(low, high, GRID_POINTS)
+    values = shots(np.arange(len(items))[:, None], grid[None, :]) #(scenario, grid point, 3)
+    rows, cells = np.nonzero(~_same(values[:, :-1], values[:, 1:]))
+    lo, end = grid[cells], grid[cells + 1]
+    left, right = values[rows, cells], values[rows, cells + 1]
+    found = [] #(rows, where the step is, shots from there on)
+    while len(rows):
+        hi, after = end.copy(), right.copy()
+        while (hi - lo).max() > tolerance: #lo still has the left value, hi already doesn't
+            mid = (lo + hi) / 2
+            value = shots(rows, mid)
+            same = _same(value, left)
+            lo, hi = np.where(same, mid, lo), np.where(same, hi, mid)
+            after = np.where(same[:, None], after, value)
+        found.append((rows, hi, after))
+        more = ~_same(after, right) #another step between this one and the end of the cell
+        rows, lo, end, left, right = rows[more], hi[more], end[more], after[more], right[more]
+
+    steps = [[] for _ in items]
+    for step_rows, where, after in found:
+        for row, x, value in zip(step_rows.tolist(), where.tolist(), after.tolist()):
+            steps[row].append((x, value))
+    ndigits = int(round(-np.log10(tolerance)))
+    segments = []
+    for row, row_steps in enumerate(steps):
+        start, value, table = low, values[row, 0].tolist(), []
+        for x, after in sorted(row_steps):
+            table.append(_segment(start, x, value, ndigits))
+            start, value = x, after
+        table.append(_segment(start, high, value, ndigits))
+        segments.append(table)
+    return segments
+
+def _segment(start, stop, value, ndigits):
+    row = {'from': round(start, ndigits), 'to': round(stop, ndigits)}
+    for field, shots in zip(SHOT_FIELDS, value):
+        shots = _json_number(shots)
+        row[field] = int(shots) if shots is not None else None #None = can't kill
+    return row
+
+def solve_breakpoints(engine, scenarios, axis='dist', low=None, high=None, max_shots=MAX_SHOTS):
+    # list of scenario dicts -> list of {'axis', 'segments'} in the same order, bad scenarios get an error entry.
+    # The scenario's own value for the axis is ignored. Raises ValueError for a bad axis/range
+    low, high, tolerance = check_axis(axis, low, high)
+    results = [None] * len(scenarios)
+    groups = {'stalker': [], 'mutant': []}
+    for i, scenario in enumerate(scenarios):
+        try:
+            kind, sc = normalize_scenario(engine.registry, scenario)
+        except ValueError as e:
+            results[i] = {'error': str(e)}
+            continue
+        groups[kind].append((i, sc))
+    for kind, items in groups.items():
+        if not items:
+            continue
+        for (i, _), segments in zip(items, solve_kind(engine, kind, [sc for _, sc in items], axis, low, high, tolerance, max_shots)):
+            results[i] = {'axis': axis, 'segments': segments}
+    return results
@@ -0,0 +1,52 @@
+# Weapon -> compatible ammo index
+# Built once from the stat registry: each weapon's ammo_type is reduced to a caliber (ammo_5.45x39, ammo_pkm, ...)
+# and each caliber maps to the ammo ids that share it. Dropdown options are prebuilt per weapon,
+# so the ammo dropdown and the leaderboard/bulk code only do dict lookups.
+import re
+from types import MappingProxyType
+
+CALIBER_PATTERN = re.compile(r'(ammo_\d[.x\d]{1,6})|(ammo_[a-z]{0,6})')
+
+# calibers whose ammo family can't be found by prefix matching
+# 12ga: weapons say 12x70 but also chamber the 12x76 slug/dart, and 12x70_buck_self/12x76_bull aren't fired from them
+FAMILY_OVERRIDES = {
+    'ammo_12x70': ('ammo_12x70_buck', 'ammo_12x76_zhekan', 'ammo_12x76_dart')
+}
+
+def caliber_of(ammo_type): #'ammo_5.45x39_fmj' -> 'ammo_5.45x39', None if it doesn't look like ammo
+    match = CALIBER_PATTERN.search(str(ammo_type))
+    if match is None:
+        return None
+    return match.group(1) if match.group(1) is not None else match.group(2)
+
+def _options(ammo_table, ammo_ids):
+    return tuple({'label': ammo_table[a].name, 'value': a} for a in ammo_ids)
+
+class CaliberIndex:
+
+    def __init__(self, registry, family_overrides=FAMILY_OVERRIDES):
+        ammo_ids = registry.ammo.ids
+        weapon_caliber = {w.id: caliber_of(w.ammo_type) for w in registry.weapons}
+        families = {}
+        for caliber in set(weapon_caliber.values()):
+            if caliber is None:
+                continue
+            if caliber in family_overrides:
+                families[caliber] = tuple(a for a in family_overrides[caliber] if a in registry.ammo)
+            else:
+                families[caliber] = tuple(a for a in ammo_ids if caliber in a)
+        self.weapon_caliber = MappingProxyType(weapon_caliber)
+        self.families = MappingProxyType(families)
+        self.weapon_ammo = MappingProxyType({w: families.get(c, ()) for w, c in weapon_caliber.items()})
+        # dropdown payloads, built once and handed out as-is
+        self.all_options = _options(registry.ammo, ammo_ids)
+        family_options = {c: _options(registry.ammo, ids) for c, ids in families.items()}
+        self.weapon_options = MappingProxyType({w: family_options.get(c, ()) for w, c in weapon_caliber.items()})
+
+    def compatible(self, weapon): #ammo ids the weapon can fire, empty for unknown weapons
+        return list(self.weapon_ammo.get(weapon, ()))
+
+    def options(self, weapon, limit=True): #ammo dropdown options, every ammo if limit is off
+        if not limit:
+            return list(self.all_options)
+        return list(self.weapon_options.get(weapon, ()))
@@ -0,0 +1,98 @@
+# Loadout comparison: N loadouts (weapon, ammo, silencer, barrel) side by side against a set of targets and hitzones
+# A loadout's four fields vary together, so the loadouts are one axis of the grid and targets and hitzones the other two.
+# Each target kind is then a single engine call on a (loadout, target, hitzone) grid, so 50 loadouts against every
+# target and hitzone is one pass per kind instead of a Calculate round trip per cell.
+from batch_engine import hitzones_stalkers, hitzones_mutants, difficulties, factions
+from scenarios import _number, _bool, result_values, result_row
+
+LOADOUT_DEFAULTS = dict(silencer=False, barrel=100)
+LOADOUT_FIELDS = ('weapon', 'bullet', 'silencer', 'barrel')
+MAX_LOADOUTS = 100
+
+def normalize_loadout(registry, loadout): #fills in defaults and checks every field, raises ValueError on bad input
+    if not isinstance(loadout, dict):
+        raise ValueError('loadout must be an object')
+    unknown = set(loadout) - set(LOADOUT_FIELDS)
+    if unknown:
+        raise ValueError('unknown fields: {}'.format(', '.join(sorted(unknown))))
+    lo = dict(LOADOUT_DEFAULTS, **loadout)
+    for key in ('weapon', 'bullet'):
+        if key not in lo:
+            raise ValueError('missing {}'.format(key))
+        if not isinstance(lo[key], str):
+            raise ValueError('{} must be a string'.format(key))
+    if lo['weapon'] not in registry.weapons:
+        raise ValueError('unknown weapon: {}'.format(lo['weapon']))
+    if lo['bullet'] not in registry.ammo:
+        raise ValueError('unknown bullet: {}'.format(lo['bullet']))
+    lo['barrel'] = _number(lo['barrel'], 'barrel', 0, 100)
+    lo['silencer'] = _bool(lo['silencer'], 'silencer')
+    return lo
+
+def compare_columns(registry, targets, hitzones=None): #[(kind, target, hitzone)] in target order, hitzones None = all of the kind's
+    if hitzones is not None and not isinstance(hitzones, (list, tuple)):
+        raise ValueError('hitzones must be a list')
+    if any(not isinstance(v, str) for v in list(targets) + list(hitzones or [])):
+        raise ValueError('targets and hitzones must be strings')
+    columns = []
+    for target in targets:
+        if target in registry.stalkers:
+            kind, zones = 'stalker', hitzones_stalkers
+        elif target in registry.mutants:
+            kind, zones = 'mutant', hitzones_mutants
+        else:
+            raise ValueError('unknown target: {}'.format(target))
+        columns.extend((kind, target, hz) for hz in zones if hitzones is None or hz in hitzones)
+    if hitzones is not None:
+        unknown = set(hitzones) - set(hitzones_stalkers) - set(hitzones_mutants)
+        if unknown:
+            raise ValueError('unknown hitzones: {}'.format(', '.join(sorted(unknown))))
+    if not columns:
+        raise ValueError('none of the hitzones apply to the chosen targets')
+    return columns
+
+def compare_loadouts(engine, loadouts, targets, hitzones=None, dist=0, game_difficulty='hard', faction='other'):
+    # -> {'loadouts': normalized loadouts, 'columns': [{'target', 'hitzone'}], 'results': [[result dict per column] per loadout]}
+    # Result dicts have the scenarios.RESULT_FIELDS. Raises ValueError on any bad input, there's no partial answer
+    registry = engine.registry
+    if not loadouts:
+        raise ValueError('no loadouts')
+    if len(loadouts) > MAX_LOADOUTS:
+        raise ValueError('at most {} loadouts'.format(MAX_LOADOUTS))
+    loadouts = [normalize_loadout(registry, lo) for lo in loadouts]
+    columns = compare_columns(registry, targets, hitzones)
+    dist = _number(dist, 'dist', 0, 300)
+    if not isinstance(game_difficulty, str) or not isinstance(faction, str):
+        raise ValueError('game_difficulty and faction must be strings')
+    if game_difficulty not in difficulties:
+        raise ValueError('game_difficulty must be one of {}'.format(', '.join(difficulties)))
+    if faction not in factions:
+        raise ValueError('faction must be one of {}'.format(', '.join(factions)))
+
+    results = [[None] * len(columns) for _ in loadouts]
+    for kind in ('stalker', 'mutant'):
+        kind_columns = [(j, target, hz) for j, (k, target, hz) in enumerate(columns) if k == kind]
+        if not kind_columns:
+            continue
+        kind_targets = list(dict.fromkeys(target for _, target, _ in kind_columns))
+        kind_zones = list(dict.fromkeys(hz for _, _, hz in kind_columns))
+        codes = engine.encode(dict(
+            weapon=[lo['weapon'] for lo in loadouts], bullet=[lo['bullet'] for lo in loadouts], target=kind_targets,
+            hitzone=kind_zones, faction=faction if kind == 'stalker' else 'other', dist=dist,
+            barrel=[lo['barrel'] / 100 for lo in loadouts], game_difficulty=game_difficulty,
+            silencer=[lo['silencer'] for lo in loadouts]), kind)
+        # loadout fields down the first axis, targets along the second, hitzones along the third
+        weapon, ammo, target_codes, zone_codes, fac, d, barrel, difficulty, silencer = codes
+        result = engine.evaluate(kind, weapon[:, None, None], ammo[:, None, None], target_codes[None, :, None], zone_codes[None, None, :],
+                                 fac, d, barrel[:, None, None], difficulty, silencer[:, None, None])
+        values = result_values(result)
+        n_targets, n_zones = len(kind_targets), len(kind_zones)
+        for j, target, hz in kind_columns:
+            t, z = kind_targets.index(target), kind_zones.index(hz)
+            for i in range(len(loadouts)):
+                results[i][j] = result_row(values, (i * n_targets + t) * n_zones + z)
+    return {
+        'loadouts': loadouts,
+        'columns': [{'target': target, 'hitzone': hz} for _, target, hz in columns],
+        'results': results
+    }
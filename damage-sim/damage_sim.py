@@ -1,405 +1,43 @@
 # Import packages
-from dash import Dash, html, dcc, callback, Output, Input, State, ctx, no_update
+from dash import Dash, html, dcc, callback, clientside_callback, Output, Input, State, ALL, ctx, no_update
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
+from flask import request, jsonify, Response, g
+import json
+import os
 #import plotly.express as px
-import pandas as pd
-import re, math
-
-# Incorporate data
-
-weapons_df = pd.read_csv('https://github.com/veerserif/gamma-dashboard/raw/main/damage-sim/src/weapons.csv', index_col = 0)
-ammo_df = pd.read_csv('https://github.com/veerserif/gamma-dashboard/raw/main/damage-sim/src/ammo.csv', index_col = 0, skiprows=[1,2,3,4,5,6,7,8])
-stalkers_df = pd.read_csv('https://raw.githubusercontent.com/veerserif/gamma-dashboard/main/damage-sim/src/curated_npc_profiles.csv', index_col = 0)
-mutants_df = pd.read_csv('https://github.com/veerserif/gamma-dashboard/raw/main/damage-sim/src/mutants.csv', index_col = 0, skiprows=[1])
-ids_df = pd.concat([weapons_df[['name']], ammo_df[['name']], mutants_df[['name']], stalkers_df[['name']]])
-
-#Other important data
-difficulty_mult = {
-    'easy': 1.3,
-    'medium': 1.05,
-    'hard': 0.9,
-    'master': 0.8
-}
-
-legmeta = [ #if gun/ammo is in this section, do not add an AP boost to legshots; lines 807-814
-    "ammo_7.92x33_ap",
-    "ammo_7.92x33_fmj",
-    "ammo_7.62x54_7h1",
-    "ammo_7.62x54_ap",
-    "ammo_7.62x54_7h14",
-    "ammo_magnum_300",
-    "ammo_50_bmg",
-    "ammo_gauss",
-    "wpn_l96a1",
-    "wpn_mk14",
-    "wpn_remington700",
-    "wpn_m40_cw",
-    "wpn_wa2000"
-]
-
-#standardize hitzone input because fuck no
-hitzones_mutants = [ "head", "torso", "limbs", "rear", "other"]
-hitzones_stalkers = [ "head", "torso", "arms", "legs"]
-stalker_bone_mult = { "head": 3.65, "torso": 0.9, "arms": 0.4, "legs": 0.4 }
-
-# # # # # # # # # # # # # # # # # # # #
-# Damage sim functions
-# # # # # # # # # # # # # # # # # # # #
-
-def get_name(some_id): #gets name from namecol if it exists
-    return ids_df.loc[some_id].to_list()[0]
-
-def get_id(some_name): #gets name from namecol if it exists
-    return ids_df.index[ids_df['name'] == some_name].to_list()[0]
-
-def get_ammo_type(weapon): #returns array of allowable ammos for the weapon
-    ammo_array = []
-    re_ammo = r'(ammo_\d[.x\d]{1,6})|(ammo_[a-z]{0,6})'
-    ammo_class = ""
-    if weapon: #if weapon exists
-        ammo_class = re.search(re_ammo, weapons_df.loc[weapon]['ammo_type'])
-        if ammo_class.group(1) is not None:
-            ammo_array = [a for a in ammo_df.index if a.find(ammo_class.group(1)) != -1]
-        elif ammo_class.group(2) is not None:
-            ammo_array = [a for a in ammo_df.index if a.find(ammo_class.group(2)) != -1]
-    return ammo_array
-
-def get_wpn_hit_power(weapon): #takes some string that we will match to weapon ID
-    wpn_name = str(weapon) # we convert to string
-    hit_power = 0.0
-    try:
-        hit_power = float( weapons_df.loc[wpn_name]['hit_power'])
-    except (TypeError, KeyError):
-        print('Error: bad input wpn name')
-        return
-    return hit_power
-
-def get_ammo_stats(ammo): #we want k_hit, k_ap, air_res, ammo_mult_mutant, ammo_mult_gigant, ammo_mult_stalker, hp_no_pen, pellets
-    ammo_name = str(ammo)
-    try:
-        ammo_s = ammo_df.loc[ammo_name][1:].to_dict()
-    except (TypeError, KeyError):
-        print('Error: bad input ammo name')
-        return
-    return ammo_s
-
-def get_npc_stats(npc): #see above but npcs version
-    npc_id = str(npc)
-    try:
-        npc_data = stalkers_df.loc[npc_id][1:].to_dict()
-    except (TypeError, KeyError):
-        print('Error: bad input stalker profile')
-        return
-    return npc_data
-
-def get_mutant_stats(mutant): #clone of npc function
-    mutant_id = str(mutant)
-    try:
-        mutant_data = mutants_df.loc[mutant_id][1:].to_dict()
-    except (TypeError, KeyError):
-        print('Error: bad input mutant profile')
-        return
-    return mutant_data
-
-def is_wpn_silenced(weapon, silenced=False):
-    wpn_name = str(weapon)
-    silenced = bool(silenced) #whether or not there's an additional silencer
-    if silenced == False:
-        try:
-            silenced = weapons_df.loc[wpn_name]['integrated_silencer']
-            return silenced #always returns True if there's an integrated silencer
-        except (TypeError, KeyError):
-            print('Bad input, silenced status')
-            return
-    else:
-        return silenced
-
-def get_armor(target, hitzone="torso"): #args: target (str), id of mutant/stalker; hitzone, area hit, opt
-    armor = 0.0
-    bodyzone = [ "torso", "arms", "legs"]
-    if target.find('stalker') == -1: #if target is not a stalker
-        armor = mutants_df.loc[target]['skin_armor']
-        return armor
-    elif hitzone in bodyzone: #body shot
-        armor = stalkers_df.loc[target]['body_bonearmor']
-        return armor
-    elif hitzone == "head":
-        armor = stalkers_df.loc[target]['head_bonearmor']
-        return armor
-    else:
-        return armor
-    return
-
-# Damage sub-functions
-
-def barrel_cond(barrel): #takes a float
-    barrel_health = float(barrel)
-    barrel_corrected = 0.0
-    try:
-        barrel_corrected = ( 130 - ( 1.12 * barrel_health ) ) * ( barrel_health * 1.12 ) / 100
-        if barrel_corrected < 1:
-            return barrel_corrected
-        else:
-            return 1.0
-    except TypeError:
-        print('Error: bad barrel cond input')
-        return
-    return
-
-def stalker_legs_ap(weapon, bullet): #leg-specific AP boosts; only call if target is lowerbody
-    buckshot = ["ammo_12x70_buck", "ammo_20x70_buck", "ammo_23x75_shrapnel"]
-    base_ap = get_ammo_stats(bullet)['k_ap'] * 10
-    final_ap = 0.0
-    if bullet in buckshot:
-        final_ap = base_ap + 0.013
-        return final_ap
-    elif (weapon in legmeta) or (bullet in legmeta):
-        final_ap = base_ap
-        return final_ap
-    else:
-        final_ap = base_ap + 0.075
-        return final_ap
-
-def npc_faction_res(faction): #per-faction resistances
-    faction_res = {'ap_res': 1.0, 'dmg_res': 1.0 } #isg_res = ap res, sin_res = dmg res
-    if faction == "greh":
-        faction_res['dmg_res'] = 0.3
-        faction_res['ap_res'] = 0.9
-    elif faction == "monolith":
-        faction_res['dmg_res'] = 0.8
-        faction_res['ap_res'] = 0.9
-    elif faction == "isg":
-        faction_res['dmg_res'] = 0.65
-        faction_res['ap_res'] = 0.7
-    elif faction == "bandit":
-        faction_res['ap_res'] = 1.1
-    elif faction == "zombie":
-        faction_res['dmg_res'] = 0.3
-    return faction_res
-
-def get_stalkerhit_ap(input_array):
-    # Array parsing
-    keys = ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
-    input_dict = dict(zip(keys, input_array))
-
-    surrendering = False #let's just not deal with surrendering atm
-    gbo_dmg = 0.0
-    silencer_mult = 1
-    ammo = get_ammo_stats(input_dict['bullet'])
-    local_ap = ammo['k_ap'] * 10
-    difficulty = difficulty_mult[input_dict['game_difficulty']]
-    barrel_mult = barrel_cond(input_dict['barrel'])
-    hp_no_penetration_penalty = ammo['hp_no_penetration_penalty']
-    bone_mult = stalker_bone_mult[input_dict['hitzone']]
-    target_d = get_npc_stats(input_dict['target'])
-    ap_scale = target_d['ap_scale']
-    hit_fraction = target_d['hit_fraction']
-    bone_armor = get_armor(input_dict['target'], input_dict['hitzone'])
-    faction_res = npc_faction_res(input_dict['faction'])
-
-    wpn_hit_power = get_wpn_hit_power(input_dict['weapon'])
-    air_res_function = (1 + input_dict['dist'] / 200 * (ammo['air_res'] * 0.5 / (1 - ammo['air_res'] + 0.1 )))
-
-    #needed for headshot AP
-    buckshot = ["ammo_12x70_buck", "ammo_20x70_buck", "ammo_23x75_shrapnel"]
-
-    #Silencer mult handling
-    if input_dict['silencer'] == True:
-        silencer_mult = 1.07
-    elif is_wpn_silenced(input_dict['weapon'], input_dict['silencer']) == True:
-        silencer_mult = 1.07
-    else:
-        silencer_mult = 1
-
-    #Hitzone-specific AP changes
-    if input_dict['hitzone'] == "legs":
-        local_ap = stalker_legs_ap(input_dict['weapon'], input_dict['bullet'])
-    if input_dict['hitzone'] == "head":
-        if input_dict['bullet'] in buckshot:
-            local_ap = local_ap + 0.019
-        else:
-            local_ap = local_ap + 0.04
-
-    local_ap = local_ap * ap_scale * barrel_mult
-    local_ap = local_ap / air_res_function * faction_res['ap_res'] * silencer_mult * difficulty * 0.8 * ammo['pellets'] #calculation nominally should apply across every pellet
-
-    return local_ap
-
-# Actual damage functions
-
-def mutant_hit(input_array):
-
-    keys = ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
-    input_dict = dict(zip(keys, input_array))
-
-    ammo = get_ammo_stats(input_dict['bullet'])
-    mutant = get_mutant_stats(input_dict['target'])
-    cqc_mult = 1.0 #not handling melee weapons in this version
-    mutant_mult = mutant['mutant_mult']
-    ammo_mult = ammo['ammo_mult_mutant']
-    spec_monster_mult = mutant['spec_mutant_mult']
-    crit_mult = 1.0
-    bone_mult = 1.0
-    gbo_dmg = 0.0
-
-    #special pseudogiant handling
-    if input_dict['target'] == 'm_gigant_e':
-        ammo_mult = ammo['gigant_ammo_mult']
-
-    # start deriving calculated values
-    raw_dmg = weapons_df.loc[input_dict['weapon']]['hit_power'] * ammo['k_hit'] * ammo['pellets']
-    air_res = ammo['air_res']
-    difficulty = difficulty_mult[input_dict['game_difficulty']]
-    barrel_mult = barrel_cond(input_dict['barrel'])
-    bone_mult = mutant[input_dict['hitzone']]
-
-    #check for crits
-    if mutant['crit_zone'] != "none":
-        if mutant['crit_zone'] == input_dict['hitzone']:
-            crit_mult = mutant['crit_hit']
-
-    bone_mult = bone_mult * crit_mult
-
-    #final calculation
-    gbo_dmg = raw_dmg / ( 1 + input_dict['dist'] / 200 * ( air_res * 0.5 / ( 1 - air_res + 0.1 ))) * mutant_mult * ammo_mult * spec_monster_mult * bone_mult * cqc_mult * barrel_mult * difficulty
-    #bullshit zombie modifier
-    gbo_dmg = gbo_dmg * mutant['zombie_modifier']
-    return gbo_dmg #, input_dict['bullet'], input_dict['target'], input_dict['hitzone']
-
-def stalker_armor_calc(ap, dmg, bone_armor, hit_fraction, hp_no_penetration_penalty):
-    loss_increment = ap * 0.6
-    new_bone_armor = bone_armor - loss_increment
-    did_shot_pen = False
-    if ap < bone_armor:
-        if ap > new_bone_armor:
-            dmg = dmg * hit_fraction
-            return did_shot_pen, new_bone_armor, dmg
-        else:
-            #remove random number function in favour of min/avg/max
-            min_dmg = 0.0025 * dmg * hit_fraction * 25 / hp_no_penetration_penalty
-            avg_dmg = 0.0025 * dmg * hit_fraction * 62.5 / hp_no_penetration_penalty
-            max_dmg = 0.0025 * dmg * hit_fraction * 100 / hp_no_penetration_penalty
-            return did_shot_pen, new_bone_armor, avg_dmg, min_dmg, max_dmg
-    if ap > bone_armor:
-        did_shot_pen = True
-        return did_shot_pen, new_bone_armor, dmg
-
-def shots_to_pen(input_array): #how many shots needed to destroy armor at hitzone
-
-    # Array parsing
-    keys = ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
-    input_dict = dict(zip(keys, input_array))
-
-    shots_to_pen = 1 # min. shot to penetrate is 1
-    ap_scale = 0.75 #anomaly engine default
-    if input_dict['target'].find('m_') == -1: #if not mutant. i really should have made this a function.
-        ap_scale = stalkers_df.loc[input_dict['target']]['ap_scale']
-    elif input_dict['target'].find('stalker_') == -1: #if NOT stalker
-        ap_scale = 0.75
-    local_ap = get_stalkerhit_ap(input_array)
-    bone_armor = get_armor(input_dict['target'], input_dict['hitzone'])
-    loss_increment = local_ap * 0.6
-
-    if local_ap * ap_scale < bone_armor:
-        shots_to_pen = math.ceil((bone_armor - (local_ap * ap_scale)) / loss_increment) # round UP to nearest integer, since 3.1 = needs 4 shots to pen
-    if shots_to_pen < 1: #clamp minimum to 1
-        shots_to_pen = 1
-    return shots_to_pen
-
-
-def stalker_hit(input_array, bone_armor = None):
-    # Array parsing
-    keys = ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
-    input_dict = dict(zip(keys, input_array))
-
-    surrendering = False #let's just not deal with surrendering atm
-    gbo_dmg = 0.0
-    silencer_mult = 1
-    ammo = get_ammo_stats(input_dict['bullet'])
-    local_ap = ammo['k_ap'] * 10
-    difficulty = difficulty_mult[input_dict['game_difficulty']]
-    barrel_mult = barrel_cond(input_dict['barrel'])
-    hp_no_penetration_penalty = ammo['hp_no_penetration_penalty']
-    bone_mult = stalker_bone_mult[input_dict['hitzone']]
-    target_d = get_npc_stats(input_dict['target'])
-    ap_scale = target_d['ap_scale']
-    hit_fraction = target_d['hit_fraction']
-    if bone_armor == None: #allows passing of a new armor value
-        bone_armor = get_armor(input_dict['target'], input_dict['hitzone'])
-    faction_res = npc_faction_res(input_dict['faction'])
-
-    wpn_hit_power = get_wpn_hit_power(input_dict['weapon'])
-    air_res_function = (1 + input_dict['dist'] / 200 * (ammo['air_res'] * 0.5 / (1 - ammo['air_res'] + 0.1 )))
-
-    local_ap = get_stalkerhit_ap(input_array)
-
-    gbo_dmg = wpn_hit_power / air_res_function * ammo['k_hit'] * bone_mult * ap_scale * 1.1 * barrel_mult * faction_res['dmg_res'] * difficulty * ammo['ammo_mult_stalker'] * silencer_mult * ammo['pellets'] #nominal dmg is multiplied by pellet number
-
-    post_armor = stalker_armor_calc(local_ap, gbo_dmg, bone_armor, hit_fraction, hp_no_penetration_penalty)
-    return post_armor
-
-def anomaly_engine_pen(gbo_dmg, bullet, target, hitzone, armor_override=None): #how the engine handles pen or non-pen hits
-    ap = ammo_df.loc[bullet]['k_ap'] #* 10
-    if armor_override != None: #if armor_override is provided
-        armor = armor_override
-    else:
-        armor = get_armor(target, hitzone)
-    hit_fraction = 0.0
-    d_hit_power = 0.0
-    final_dmg = gbo_dmg
-    is_pen = False
-    ap_scale = 0.75
-    hit_scale = 1.0
-    #first, get hit fraction and ap_scale
-    if target.find('stalker') == -1: #if not NPC
-        hit_fraction = mutants_df.loc[target]['hit_fraction']
-        hit_scale = mutants_df.loc[target][hitzone]
-    else:
-        hit_fraction = stalkers_df.loc[target]['hit_fraction']
-        ap_scale = stalkers_df.loc[target]['ap_scale']
-        hit_scale = stalker_bone_mult[hitzone]
-    d_hit_power = (ap - armor) / (ap * ap_scale)
-    if (d_hit_power < hit_fraction):
-        d_hit_power = hit_fraction
-    elif d_hit_power > 1:
-        d_hit_power = 1
-    final_dmg = gbo_dmg * d_hit_power * hit_scale
-    #print if armor was penetrated
-    if ap * ap_scale > armor:
-        is_pen = True
-    else:
-        is_pen = False
-    #print('hit_power: ' + str(d_hit_power) + ', hit_scale: ' + str(hit_scale)) #temporary for debugging
-    return is_pen, final_dmg
-
-def time_to_kill(input_array):
-    # Array parsing
-    keys = ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
-    input_d = dict(zip(keys, input_array))
-    ttk = 1 #integer, shots to kill, always at least 1
-    min_ttk = 1
-    max_ttk = 1
-
-    if input_d['target'].find('stalker_') != -1: #if target is stalker
-        #partially recreate stalker armor calc
-        stp = shots_to_pen(input_array)
-        hit = stalker_hit(input_array)
-        ttk = stp + math.ceil((1.0 - (stp * hit[2])) / stalker_hit(input_array, 0.0)[2])
-        if len(hit) > 3: #if random damage is in play
-            #print('STP: ' + str(stp) + ', ' + str(hit))
-            min_ttk = stp + math.ceil((1.0 - (stp * hit[3])) / stalker_hit(input_array, 0.0)[2])
-            max_ttk = stp  + math.ceil((1.0 - (stp * hit[4])) / stalker_hit(input_array, 0.0)[2])
-    elif input_d['target'].find('m_') != -1: #if target is mutant
-        damage = anomaly_engine_pen(mutant_hit(input_array), input_d['bullet'], input_d['target'], input_d['hitzone'])[1]
-        ttk = math.ceil(1/damage)
-    return ttk, min_ttk, max_ttk
-
-
-# Initialize the app
-
-#style = "path/to/stylesheet.css"
-app = Dash(external_stylesheets=[dbc.themes.DARKLY, 'damage-sim/assets/style.css'])
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+import numpy as np
+from name_index import KINDS
+from leaderboard import DIST_BUCKETS
+from scenarios import evaluate_scenarios, iter_evaluate_scenarios
+import breakpoints
+from compare import compare_loadouts, MAX_LOADOUTS
+import monte_carlo
+from result_cache import make_cache, scenario_key
+from metrics import metrics
+from request_profiler import profiler
+from data_reload import reloader
+from batch_engine import difficulty_mult, hitzones_mutants, hitzones_stalkers, stalker_bone_mult
+# Data + damage functions live in sim_engine (no Dash), the app below only lays them out
+# Reads local csvs via a cached snapshot; GAMMA_SIM_SOURCE=remote pulls them from Github instead
+# Reads go through snapshot(), which is the data the current request started with (see create_app), so a reload
+# halfway through a callback can't mix old and new stats
+from sim_engine import (snapshot, pin, unpin, on_swap, get_name, get_ammo_stats, get_npc_stats, get_mutant_stats, is_wpn_silenced,
+                        get_armor, barrel_cond, npc_faction_res, evaluate_hit, hit_curves, simulate_ttk, ttk_breakpoints, get_leaderboard,
+                        CURVE_DISTANCES, CURVE_BARRELS)
+
+# Calculate results by normalized inputs, LRU sized by GAMMA_RESULT_CACHE_SIZE, shared between workers if GAMMA_RESULT_CACHE_DB is set
+result_cache = make_cache(snapshot().data_hash)
+
+# Dropdown options built from the data, refresh_options() swaps them out when the data is reloaded
+def weapon_options(snap):
+    return [{'label': x[1], 'value': x[0]} for x in zip(snap.weapons_df.index, snap.weapons_df['name'])]
+
+def target_options(snap, kind):
+    targets = snap.stalkers_df if kind == 'stalker' else snap.mutants_df
+    return [{'label': x[1], 'value': x[0]} for x in zip(targets.index, targets['name'])]
 
 # Theming
 
@@ -434,7 +72,7 @@ input_field_weapons = html.Div([
 
     dbc.Select(
         id='weapons-dropdown',
-        options=[{'label': x[1], 'value': x[0]} for x in zip(weapons_df.index, weapons_df['name'])]
+        options=weapon_options(snapshot())
     ),
 
     dbc.Label('Integrally silenced', id='integral_silencer', style={'display':'none'}),
@@ -450,7 +88,7 @@ input_field_ammo = html.Div([
     html.Label(children='Ammo'),
     dbc.Select(
         id='ammo-dropdown',
-        options=[{'label': x[1], 'value': x[0]} for x in zip(ammo_df.index, ammo_df['name'])]
+        options=snapshot().calibers.options(None, limit=False)
         ),
     dbc.Switch(id='ammo-limiter', label='Limit ammo types', value=False),
     dbc.Tooltip(
@@ -459,20 +97,22 @@ input_field_ammo = html.Div([
     )
 ])
 
+faction_options = [
+    {'label':'Other', 'value':'other'},
+    {'label': 'Sin', 'value': 'greh'},
+    {'label': 'UNISG', 'value': 'isg'},
+    {'label':'Monolith', 'value':'monolith'},
+    {'label':'Bandit', 'value':'bandit'},
+    {'label':'Zombified', 'value':'zombie'}
+]
+
 input_field_target = html.Div(children=[
     html.P('Choose a target type', id='target-type-description'),
     html.Div(
         [
             dbc.Select(id='target-type-inputs'),
             html.P('They are in the faction...', id='faction-desc', hidden=True),
-            dbc.Select(id='faction-select', options = [
-                {'label':'Other', 'value':'other'},
-                {'label': 'Sin', 'value': 'greh'},
-                {'label': 'UNISG', 'value': 'isg'},
-                {'label':'Monolith', 'value':'monolith'},
-                {'label':'Bandit', 'value':'bandit'},
-                {'label':'Zombified', 'value':'zombie'}
-                ], value='other', className='dash-bootstrap', style={'display': 'none'}),
+            dbc.Select(id='faction-select', options = faction_options, value='other', className='dash-bootstrap', style={'display': 'none'}),
             html.P('I hit them in the'),
             dbc.RadioItems(id='hitzone-select')
     ], id='target-div', style={'display': 'none'})
@@ -490,21 +130,30 @@ input_field_distance = html.Div(
     dbc.FormText('Must be a whole number, between 0 and 300')
 ], id='styled-numeric-input')
 
+difficulty_options = [
+    {'label':'Easy', 'value':'easy'},
+    {'label': 'Medium', 'value':'medium'},
+    {'label':'Hard', 'value':'hard'},
+    {'label':'Master (hidden)', 'value': 'master'}
+]
+
 input_field_difficulty = html.Div([
     dbc.Label('Game difficulty'),
     dbc.RadioItems(id='game-difficulty-radio',
-        options=[
-            {'label':'Easy', 'value':'easy'},
-            {'label': 'Medium', 'value':'medium'},
-            {'label':'Hard', 'value':'hard'},
-            {'label':'Master (hidden)', 'value': 'master'}
-            ], value='hard', inline=True
+        options=difficulty_options, value='hard', inline=True
     )])
 
 input_display_options = html.Div([
     dbc.Switch(id='scale-output-numbers', label='Scale output numbers', value=True, style={'padding-top':'0.5em'}),
     dbc.Tooltip('Multiplies most numbers by 100 for readability', target='scale-output-numbers'),
-    dbc.Switch(id='show-advanced-options', label='Enable armor override', value=False)
+    dbc.Switch(id='show-advanced-options', label='Enable armor override', value=False),
+    dbc.Switch(id='show-curves', label='Plot over distance', value=False),
+    dbc.Switch(id='curves-vary-barrel', label='Also vary barrel condition', value=False),
+    dbc.Tooltip('Shots to kill for every barrel condition and distance, instead of the current barrel only', target='curves-vary-barrel'),
+    dbc.Switch(id='simulate-random', label='Simulate random damage', value=False),
+    dbc.Tooltip('Rolls the random non-penetration damage shot by shot over 100,000 tries and shows how many shots it took (stalkers only)', target='simulate-random'),
+    dbc.Switch(id='show-breakpoints', label='Show where shots to kill changes', value=False),
+    dbc.Tooltip('The distances, barrel conditions and armor values where this loadout gains or loses a shot', target='show-breakpoints')
 ])
 
 input_advanced_options = html.Div([
@@ -576,6 +225,109 @@ output_damage_info = html.Div([
         ])
 ])
 
+output_curves = html.Div([
+    dbc.Card(
+        [
+            dbc.CardHeader('Damage and shots to kill over distance'),
+            dbc.CardBody(dcc.Graph(id='curve-graph', config={'displayModeBar': False}))
+        ])
+], id='curve-div', style={'display': 'none', 'padding-top': '0.5em'})
+
+#best loadouts section
+leaderboard_section = html.Div([
+    html.H3('Best loadouts'),
+    dcc.Markdown('''
+    Every weapon paired with the ammo it can fire, ranked by shots to kill against one target. Ties are broken by damage per shot.
+    Assumes a 100% barrel, no extra silencer, and distance is rounded to the nearest of the listed ranges. Damage is multiplied by 100 for readability.
+    Time to kill uses the fire rate and muzzle velocity from the items database and leaves out reloads; "+ reload" means the kill takes more than one magazine.
+    '''),
+    dbc.Row([
+        dbc.Col([
+            dbc.Label('Target'),
+            dbc.Select(id='leaderboard-target',
+                options=target_options(snapshot(), 'stalker') + target_options(snapshot(), 'mutant'),
+                value='stalker_sunrise')
+        ], md=4),
+        dbc.Col([
+            dbc.Label('Hitzone'),
+            dbc.Select(id='leaderboard-hitzone', options=hitzones_stalkers, value='torso')
+        ], md=2),
+        dbc.Col([
+            dbc.Label('Distance'),
+            dbc.Select(id='leaderboard-dist', options=[{'label': '{}m'.format(d), 'value': d} for d in DIST_BUCKETS], value=50)
+        ], md=2),
+        dbc.Col([
+            dbc.Label('Difficulty'),
+            dbc.Select(id='leaderboard-difficulty', options=difficulty_options, value='hard')
+        ], md=2),
+        dbc.Col([
+            dbc.Label('Faction'),
+            dbc.Select(id='leaderboard-faction', options=faction_options, value='other')
+        ], md=2)
+    ]),
+    html.Div(id='leaderboard-table', style={'padding-top':'0.5em'})
+])
+
+#loadout comparison section
+compare_section = html.Div([
+    html.H3('Compare loadouts'),
+    dcc.Markdown('''
+    Add weapon and ammo combos (up to {}) and see their shots to kill side by side, against as many targets and hitzones as you like.
+    The best loadout in each column is in bold. Time to kill leaves out reloads, same as the best loadouts table.
+    '''.format(MAX_LOADOUTS)),
+    dbc.Row([
+        dbc.Col([
+            dbc.Label('Weapon'),
+            dbc.Select(id='compare-weapon', options=weapon_options(snapshot()))
+        ], md=4),
+        dbc.Col([
+            dbc.Label('Ammo'),
+            dbc.Select(id='compare-ammo')
+        ], md=3),
+        dbc.Col([
+            dbc.Label('Barrel condition (%)'),
+            dbc.Input(id='compare-barrel', type='number', inputmode='numeric', min=0, max=100, step=1, value=100)
+        ], md=2),
+        dbc.Col([
+            dbc.Switch(id='compare-silencer', label='Silenced', value=False)
+        ], md=1, align='end'),
+        dbc.Col([
+            html.Div([
+                dbc.Button('Add', id='compare-add', n_clicks=0),
+                dbc.Button('Add from calculator', id='compare-add-current', color='secondary', n_clicks=0),
+                dbc.Button('Clear', id='compare-clear', color='danger', outline=True, n_clicks=0)
+            ], className='d-flex gap-2 flex-wrap')
+        ], md=2, align='end')
+    ]),
+    dbc.Row([
+        dbc.Col([
+            dbc.Label('Targets'),
+            dcc.Dropdown(id='compare-targets',
+                options=target_options(snapshot(), 'stalker') + target_options(snapshot(), 'mutant'),
+                value=['stalker_sunrise'], multi=True, className='dash-bootstrap')
+        ], md=4),
+        dbc.Col([
+            dbc.Label('Hitzones'),
+            dbc.Checklist(id='compare-hitzones', options=list(dict.fromkeys(hitzones_stalkers + hitzones_mutants)),
+                value=['head', 'torso'], inline=True)
+        ], md=3),
+        dbc.Col([
+            dbc.Label('Distance'),
+            dbc.Input(id='compare-dist', type='number', inputmode='numeric', min=0, max=300, step=1, value=50, debounce=True)
+        ], md=1),
+        dbc.Col([
+            dbc.Label('Difficulty'),
+            dbc.Select(id='compare-difficulty', options=difficulty_options, value='hard')
+        ], md=2),
+        dbc.Col([
+            dbc.Label('Faction'),
+            dbc.Select(id='compare-faction', options=faction_options, value='other')
+        ], md=2)
+    ], style={'padding-top':'0.5em'}),
+    dcc.Store(id='compare-loadouts', data=[]),
+    html.Div(id='compare-table', style={'padding-top':'0.5em'})
+])
+
 sim_explanation = dcc.Markdown('''
     ##### What's the point of this?
     Sating my curiosity, practicing Python/Pandas/Dash, providing an easy tool to play around with damage calculations. Source csvs are available [on Github](https://github.com/veerserif/gamma-dashboard/tree/main/damage-sim/src).
@@ -649,7 +401,7 @@ sim_explanation = dcc.Markdown('''
 ''')
 
 #do styling down there
-app.layout = [
+layout = [
     dbc.Container([
         dbc.Row(dbc.Col(title_section)),
         dbc.Row(dbc.Col(intro_section)),
@@ -697,10 +449,15 @@ app.layout = [
                         output_cards_2
                         ])
                 ]),
-                dbc.Row([dbc.Col([output_damage_info])], style={'padding-top':'0.5em'})
+                dbc.Row([dbc.Col([output_damage_info])], style={'padding-top':'0.5em'}),
+                dbc.Row([dbc.Col([output_curves])])
             ], style={'padding':'1em'})
         ]),
 
+    dbc.Row([dbc.Col([compare_section])], style={'padding-top':'3em'}),
+
+    dbc.Row([dbc.Col([leaderboard_section])], style={'padding-top':'3em'}),
+
     dbc.Row([dbc.Col([
         html.H3('Boring Explanations For Big Nerds'),
         sim_explanation
@@ -709,6 +466,15 @@ app.layout = [
     ])
 ]
 
+@on_swap
+def refresh_options(old, new): #data reload: dropdowns in the layout get the new options, cached results from the old data go
+    input_field_weapons['weapons-dropdown'].options = weapon_options(new)
+    input_field_ammo['ammo-dropdown'].options = new.calibers.options(None, limit=False)
+    leaderboard_section['leaderboard-target'].options = target_options(new, 'stalker') + target_options(new, 'mutant')
+    compare_section['compare-weapon'].options = weapon_options(new)
+    compare_section['compare-targets'].options = target_options(new, 'stalker') + target_options(new, 'mutant')
+    result_cache.reset(new.data_hash)
+
 # Callbacks (aka. controls)
 # Do this _first_ so that it can modify all the other info, _once_
 @callback(
@@ -723,37 +489,39 @@ app.layout = [
         Input('stalker-button', 'n_clicks')
         )
 
+@metrics.timed('set_target_select')
 def set_target_select(btn_mutant,btn_stalker):
     if 'mutant-button' == ctx.triggered_id:
-        return True, [{'label': x[1], 'value': x[0]} for x in zip(mutants_df.index, mutants_df['name'])], 'm_boar', {'display': 'inherit'}, hitzones_mutants, {'display': 'none'}, 'My target is a...'
+        return True, target_options(snapshot(), 'mutant'), 'm_boar', {'display': 'inherit'}, hitzones_mutants, {'display': 'none'}, 'My target is a...'
     elif 'stalker-button'  == ctx.triggered_id:
-        return False, [{'label': x[1], 'value': x[0]} for x in zip(stalkers_df.index, stalkers_df['name'])], 'stalker_sunrise', {'display': 'inherit'}, hitzones_stalkers, {'display': 'inherit'}, "My target is, or is wearing..."
+        return False, target_options(snapshot(), 'stalker'), 'stalker_sunrise', {'display': 'inherit'}, hitzones_stalkers, {'display': 'inherit'}, "My target is, or is wearing..."
     else:
         raise PreventUpdate
 
+# UI-only callbacks run in the browser, no server round trip
+
 #Advanced options callback
-@callback(
-        Output('advanced-options-div', 'style'),
-        Input('show-advanced-options', 'value')
+clientside_callback(
+    """
+    function(show_options) {
+        return show_options === true ? {'display': 'inherit'} : {'display': 'none'};
+    }
+    """,
+    Output('advanced-options-div', 'style'),
+    Input('show-advanced-options', 'value')
 )
 
-def show_advanced_options(show_options):
-    if show_options ==  True:
-        return {'display':'inherit'}
-    else:
-        return {'display':'none'}
-
 #Barrel condition label for user
-@callback(
+clientside_callback(
+    """
+    function(barrel) {
+        return 'Barrel condition: ' + Math.trunc(barrel) + '%';
+    }
+    """,
     Output('barrel-cond-label', 'children'),
     Input('barrel-condition-slider', 'value')
 )
 
-def update_info_strings(barrel):
-    return 'Barrel condition: {}%'.format(
-        int(barrel)
-    )
-
 #Disable silencer toggle if weapon is integrally silenced
 @callback(
     Output('silencer', 'disabled'),
@@ -762,6 +530,7 @@ def update_info_strings(barrel):
     prevent_initial_call = True
 )
 
+@metrics.timed('disable_silencer_toggle')
 def disable_silencer_toggle(weapon):
     silenced = is_wpn_silenced(weapon, False)
     if silenced == True:
@@ -770,49 +539,61 @@ def disable_silencer_toggle(weapon):
         return False,{'display':'none'}
 
 #Limit ammo to type used by weapon
-# Default output: [{'label': x[1], 'value': x[0]} for x in zip(ammo_df.index, ammo_df['name'])]
+# Default output: snapshot().calibers.options(None, limit=False), every ammo
 @callback(
     Output('ammo-dropdown', 'options'),
     State('weapons-dropdown', 'value'),
     Input('ammo-limiter', 'value')
 )
 
+@metrics.timed('limit_ammo_dropdown')
 def limit_ammo_dropdown(weapon, limiter):
-    allowable_ammo = []
     if weapon:
-        allowable_ammo = get_ammo_type(weapon)
-        if "ammo_12x70_buck" in allowable_ammo: #hand code exception for 12ga because lol fucking typo
-            allowable_ammo = ["ammo_12x70_buck", "ammo_12x76_zhekan", "ammo_12x76_dart"]
         if limiter == True:
-            return [{'label': x[1], 'value': x[0]} for x in zip(allowable_ammo, ammo_df.loc[allowable_ammo]['name'])]
+            return snapshot().calibers.options(weapon)
         elif limiter == False:
-            return [{'label': x[1], 'value': x[0]} for x in zip(ammo_df.index, ammo_df['name'])]
+            return snapshot().calibers.options(weapon, limit=False)
     else:
         return no_update
 
 # Shows alert message if user clicks "Calculate" while a field is empty
-@callback(
+# same check as missing_inputs() below, which the server uses to skip the calculation
+clientside_callback(
+    """
+    function(submit, show_override, armor_override, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer) {
+        const required = [weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer];
+        if (required.some(v => v === null || v === undefined)) {
+            return true;
+        }
+        if (show_override === true) {
+            if (armor_override === null || armor_override === undefined) {
+                return true;
+            }
+            if (armor_override > 1 || armor_override < 0) { //if armor override is on but value too large
+                return true;
+            }
+        }
+        return false;
+    }
+    """,
     Output('missing-input-alert', 'is_open'),
-    inputs=dict( # ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
-        #mutant_button = Input('mutant-button', 'n_clicks'),
-        #stalker_button = Input('stalker-button', 'n_clicks'),
-        submit = Input('submit-button', 'n_clicks'),
-        show_override = State('show-advanced-options', 'value'),
-        armor_override = State('armor-override', 'value'),
-        weapon = State('weapons-dropdown', 'value'),
-        bullet = State('ammo-dropdown', 'value'),
-        target = State('target-type-inputs', 'value'),
-        hitzone = State('hitzone-select', 'value'),
-        faction = State('faction-select','value'),
-        dist = State('distance-input', 'value'),
-        barrel = State('barrel-condition-slider', 'value'),
-        game_difficulty = State('game-difficulty-radio', 'value'),
-        silencer = State('silencer', 'value')
-        ),
+    Input('submit-button', 'n_clicks'),
+    State('show-advanced-options', 'value'),
+    State('armor-override', 'value'),
+    State('weapons-dropdown', 'value'),
+    State('ammo-dropdown', 'value'),
+    State('target-type-inputs', 'value'),
+    State('hitzone-select', 'value'),
+    State('faction-select','value'),
+    State('distance-input', 'value'),
+    State('barrel-condition-slider', 'value'),
+    State('game-difficulty-radio', 'value'),
+    State('silencer', 'value'),
     prevent_initial_call=True
 )
 
-def missing_inputs(submit, show_override, armor_override, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer):
+@metrics.timed('missing_inputs')
+def missing_inputs(show_override, armor_override, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer):
     show_alert = False
     if None in [weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer]:
         show_alert = True
@@ -823,7 +604,7 @@ def missing_inputs(submit, show_override, armor_override, weapon, bullet, target
             show_alert = True
     return show_alert
 
-# Reflect chosen weapon + ammo stats
+# One server round trip per Calculate click: the info cards and the damage output come back together
 @callback(
     output= dict(
         weapon_t = Output('weapon-card-title', 'children'),
@@ -832,7 +613,10 @@ def missing_inputs(submit, show_override, armor_override, weapon, bullet, target
         ammo_d =Output('ammo-card-desc', 'children'),
         target_t = Output('target-card-title', 'children'),
         target_d = Output('target-card-desc', 'children'),
-        game_d = Output('game-card-desc', 'children')
+        game_d = Output('game-card-desc', 'children'),
+        damage = Output('output-div', 'children'),
+        curves = Output('curve-graph', 'figure'),
+        curves_style = Output('curve-div', 'style')
     ),
     inputs=dict( # ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
         submit = Input('submit-button', 'n_clicks'),
@@ -847,24 +631,152 @@ def missing_inputs(submit, show_override, armor_override, weapon, bullet, target
         dist = State('distance-input', 'value'),
         barrel = State('barrel-condition-slider', 'value'),
         game_difficulty = State('game-difficulty-radio', 'value'),
-        silencer = State('silencer', 'value')
+        silencer = State('silencer', 'value'),
+        show_curves = State('show-curves', 'value'),
+        vary_barrel = State('curves-vary-barrel', 'value'),
+        simulate = State('simulate-random', 'value'),
+        show_breakpoints = State('show-breakpoints', 'value')
     ),
     prevent_initial_call=True
 )
 
+@metrics.timed('calculate')
+def calculate(submit, show_override, armor_override, scale_display, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer, show_curves=False, vary_barrel=False, simulate=False, show_breakpoints=False):
+    if missing_inputs(show_override, armor_override, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer):
+        raise PreventUpdate # no update if fields are empty, or override over 1
+    args = (submit, show_override, armor_override, scale_display, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer)
+    cards, damage = result_cache.get_or_compute(scenario_key(*args[1:]), lambda: (output_cards(*args), update_output(*args)),
+                                                data_hash=snapshot().data_hash)
+    output_dict = dict(cards, damage=damage) #copy, the cached dict is shared between requests
+    if simulate == True and target.find('stalker') != -1: #no random roll against mutants
+        output_dict['damage'] = output_dict['damage'] + simulation_output(*args)
+    if show_breakpoints == True:
+        output_dict['damage'] = output_dict['damage'] + breakpoint_output(*args)
+    if show_curves == True:
+        output_dict['curves'] = curve_figure(*args, vary_barrel=vary_barrel)
+        output_dict['curves_style'] = {'display': 'inherit', 'padding-top': '0.5em'}
+    else:
+        output_dict['curves'] = no_update
+        output_dict['curves_style'] = {'display': 'none'}
+    return output_dict
+
+# Monte Carlo shots to kill, text + histogram appended to the damage card
+@metrics.timed('simulation_output')
+def simulation_output(submit, show_override, armor_override, scale_display, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer):
+    if show_override == False:
+        armor_override = None
+    input_array = [weapon, bullet, target, hitzone, faction, dist, barrel/100, game_difficulty, silencer]
+    sim = simulate_ttk(input_array, armor_override)
+    output = [html.Hr()]
+    if sim.unkilled == sim.trials:
+        output.append('Not killed within {} shots in any of {:,} tries.'.format(monte_carlo.MAX_SHOTS, sim.trials))
+        return output
+    pct = sim.percentiles
+    output.append('Simulated shots to kill over {:,} tries: median {}, middle 90% between {} and {}, worst 1% at {} or more.'.format(
+        sim.trials, pct[50], pct[5], pct[95], pct[99]))
+    if sim.random_shots == 0:
+        output.extend([html.Br(), 'No shot lands in the random damage range, so every try takes the same number of shots.'])
+    if sim.unkilled:
+        output.extend([html.Br(), '{:.2%} of tries did not kill within {} shots.'.format(sim.unkilled / sim.trials, monte_carlo.MAX_SHOTS)])
+    values, counts = sim.histogram
+    keep = values <= monte_carlo.MAX_SHOTS
+    fig = go.Figure(go.Bar(x=values[keep], y=counts[keep] / sim.trials, hovertemplate='%{x} shots: %{y:.2%}<extra></extra>'))
+    fig.update_xaxes(title_text='Shots to kill', dtick=1)
+    fig.update_yaxes(title_text='Share of tries', tickformat='.0%')
+    fig.update_layout(template='plotly_dark', height=250, margin={'l': 20, 'r': 20, 't': 20, 'b': 20})
+    output.append(dcc.Graph(figure=fig, config={'displayModeBar': False}))
+    return output
+
+# Where shots to kill steps, over distance, barrel condition and armor, appended to the damage card
+BREAKPOINT_AXES = (('dist', 'By distance', '{:g}m'), ('barrel', 'By barrel condition', '{:g}%'), ('armor', 'By armor', '{:g}'))
+BREAKPOINT_MAX_SHOTS = 20 #slower than this is lumped together, a worn out barrel is otherwise dozens of one-shot steps
+
+def breakpoint_ranges(segments): #solver segments -> [from, to, avg shots, fewest, most] merged by average shots to kill
+    ranges = []
+    for seg in segments:
+        shots = [v for v in (seg['ttk_min'], seg['ttk'], seg['ttk_max']) if v is not None]
+        ttk = seg['ttk'] if seg['ttk'] is None or seg['ttk'] <= BREAKPOINT_MAX_SHOTS else BREAKPOINT_MAX_SHOTS + 1
+        if ranges and ranges[-1][2] == ttk:
+            ranges[-1][1] = seg['to']
+            ranges[-1][3:] = [min(shots + ranges[-1][3:4]), max(shots + ranges[-1][4:5])] if shots else ranges[-1][3:]
+        else:
+            ranges.append([seg['from'], seg['to'], ttk, min(shots, default=None), max(shots, default=None)])
+    return ranges
+
+@metrics.timed('breakpoint_output')
+def breakpoint_output(submit, show_override, armor_override, scale_display, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer):
+    display_scale = 100 if scale_display == True else 1
+    if target.find('stalker') == -1: #mutants have no faction
+        faction = 'other'
+    if show_override == False:
+        armor_override = None
+    input_array = [weapon, bullet, target, hitzone, faction, dist, barrel/100, game_difficulty, silencer]
+    output = [html.Hr(), 'Shots to kill, with everything else as above:']
+    for axis, label, unit in BREAKPOINT_AXES:
+        segments = ttk_breakpoints(input_array, axis, armor_override, max_shots=BREAKPOINT_MAX_SHOTS)
+        if segments is None:
+            continue
+        scale = display_scale if axis == 'armor' else 1
+        parts = []
+        for start, stop, ttk, fewest, most in breakpoint_ranges(segments):
+            if round(start * scale, 2) == round(stop * scale, 2): #e.g. can't kill at exactly 0% barrel
+                continue
+            if ttk is None:
+                shots = "can't kill"
+            elif ttk > BREAKPOINT_MAX_SHOTS:
+                shots = 'over {}'.format(BREAKPOINT_MAX_SHOTS)
+            elif fewest != most: #random damage, the average plus the spread
+                shots = '{} ({}-{})'.format(ttk, fewest, min(most, BREAKPOINT_MAX_SHOTS + 1))
+            else:
+                shots = str(ttk)
+            parts.append('{} to {}: {}'.format(unit.format(round(start * scale, 2)), unit.format(round(stop * scale, 2)), shots))
+        output.extend([html.Br(), '{}: {}'.format(label, ', '.join(parts))])
+    return output
+
+# Damage/TTK over distance figure
+@metrics.timed('curve_figure')
+def curve_figure(submit, show_override, armor_override, scale_display, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer, vary_barrel=False):
+    display_scale = 100 if scale_display == True else 1
+    if target.find('stalker') == -1: #mutants have no faction
+        faction = 'other'
+    if show_override == False:
+        armor_override = None
+    input_array = [weapon, bullet, target, hitzone, faction, dist, barrel/100, game_difficulty, silencer]
+    result = hit_curves(input_array, armor_override, vary_barrel)
+    ttk = np.where(np.isfinite(result.ttk), result.ttk, np.nan) #can't-kill shows as a gap
+
+    if vary_barrel == True: #heatmap, shots to kill by barrel condition and distance
+        fig = go.Figure(go.Heatmap(
+            x=CURVE_DISTANCES, y=CURVE_BARRELS, z=ttk.astype(np.float32), #float32 keeps the payload small
+            customdata=(result.damage * display_scale).astype(np.float32),
+            colorscale='Viridis', reversescale=True,
+            colorbar={'title': 'Shots to kill'},
+            hovertemplate='%{x}m, barrel %{y}%<br>Shots to kill: %{z}<br>Damage: %{customdata:.4f}<extra></extra>'
+        ))
+        fig.update_xaxes(title_text='Distance (m)')
+        fig.update_yaxes(title_text='Barrel condition (%)')
+    else: #damage on the left axis, shots to kill as a step line on the right
+        fig = make_subplots(specs=[[{'secondary_y': True}]])
+        fig.add_trace(go.Scatter(x=CURVE_DISTANCES, y=result.damage[0] * display_scale, name='Damage'), secondary_y=False)
+        if result.random_damage.any(): #min/max band where random damage is in play
+            fig.add_trace(go.Scatter(x=CURVE_DISTANCES, y=result.max_damage[0] * display_scale, name='Max damage', line={'dash': 'dot'}), secondary_y=False)
+            fig.add_trace(go.Scatter(x=CURVE_DISTANCES, y=result.min_damage[0] * display_scale, name='Min damage', line={'dash': 'dot'}), secondary_y=False)
+        fig.add_trace(go.Scatter(x=CURVE_DISTANCES, y=ttk[0], name='Shots to kill', line={'shape': 'hv'}), secondary_y=True)
+        fig.update_xaxes(title_text='Distance (m)')
+        fig.update_yaxes(title_text='Damage', secondary_y=False)
+        fig.update_yaxes(title_text='Shots to kill', secondary_y=True, rangemode='tozero')
+        fig.add_vline(x=dist, line_dash='dash', line_color='grey') #current distance
+    fig.update_layout(template='plotly_dark', margin={'l': 20, 'r': 20, 't': 20, 'b': 20}, legend={'orientation': 'h'})
+    return fig
+
+# Reflect chosen weapon + ammo stats
+@metrics.timed('output_cards')
 def output_cards(submit, show_override, armor_override, scale_display, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer):
-    if None in [weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer]: # no update if fields are empty, or override over 1
-        raise PreventUpdate
-    if show_override == True:
-        if armor_override == None:
-            raise PreventUpdate
-        elif (armor_override > 1) or (armor_override < 0): #if armor override is on but value too large
-            raise PreventUpdate
     if scale_display == True: #if we should mult. numbers by 100 for display
         display_scale = 100
     else:
         display_scale = 1
-    wpn_desc = ['Weapon base damage: {}'.format(round(weapons_df.loc[weapon]['hit_power'] * display_scale, 2)), html.Br()]
+    wpn_desc = ['Weapon base damage: {}'.format(round(snapshot().stats.weapons[weapon].hit_power * display_scale, 2)), html.Br()]
     ammo = get_ammo_stats(bullet)
     npc_dict = {}
     barrel_mult = barrel_cond(barrel/100)
@@ -937,37 +849,9 @@ def output_cards(submit, show_override, armor_override, scale_display, weapon, b
     return output_dict
 
 # Calculate damage stats
-
-@callback(
-    Output('output-div', 'children'),
-    inputs=dict( # ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer')
-        submit = Input('submit-button', 'n_clicks'),
-        show_override = State('show-advanced-options', 'value'),
-        armor_override = State('armor-override', 'value'),
-        scale_display = State('scale-output-numbers', 'value'),
-        weapon = State('weapons-dropdown', 'value'),
-        bullet = State('ammo-dropdown', 'value'),
-        target = State('target-type-inputs', 'value'),
-        hitzone = State('hitzone-select', 'value'),
-        faction = State('faction-select','value'),
-        dist = State('distance-input', 'value'),
-        barrel = State('barrel-condition-slider', 'value'),
-        game_difficulty = State('game-difficulty-radio', 'value'),
-        silencer = State('silencer', 'value')
-        ),
-    prevent_initial_call=True
-)
-
+@metrics.timed('update_output')
 def update_output(submit, show_override, armor_override, scale_display, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer):
-    if None in [weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer]:
-        raise PreventUpdate
-    if show_override == True:
-        if armor_override == None:
-            raise PreventUpdate
-        elif (armor_override > 1) or (armor_override < 0): #if armor override is on but value too large
-            raise PreventUpdate
     is_mutant = False
-    outcome=[]
     output = []
     if scale_display == True: #if the display SHOULD be scaled
         display_scale = 100
@@ -985,47 +869,351 @@ def update_output(submit, show_override, armor_override, scale_display, weapon,
     if show_override == False: #if user has NOT chosen to enable armor override
         armor_override = None
 
-    ttk = time_to_kill(input_array)
+    result = evaluate_hit(input_array, armor_override) #everything below comes from this one pass
     if is_mutant == True: #if chosen target is mutant:
-        outcome = anomaly_engine_pen(mutant_hit(input_array), bullet, target, hitzone, armor_override)
         output = [
-            'Estimated damage: {}, rough shots to kill: {}'.format(round(outcome[1] * display_scale, 4), ttk[0])
+            'Estimated damage: {}, rough shots to kill: {}'.format(round(result.damage * display_scale, 4), result.ttk)
         ]
-        if outcome[0] == True:
+        if result.penetrated == True:
             output.extend([html.Br(), 'Shot penetrated armor!'])
     elif is_mutant == False:
-        outcome = stalker_hit(input_array, armor_override)
-        #print(outcome) #debugging
-        if outcome [0] == True: #shot penetrates armor
+        if result.penetrated == True: #shot penetrates armor
             output = [
-            'Estimated damage: {}, rough shots to kill: {}'.format(round(outcome[2] * display_scale, 6), ttk[0]),
+            'Estimated damage: {}, rough shots to kill: {}'.format(round(result.damage * display_scale, 6), result.ttk),
             html.Br(),
             'Shot penetrated armor!'
             ]
-        elif outcome[0] == False: #shot did not penetrate armor
-            if len(outcome) > 3: #if we get to the random damage part
-                output.extend([
-                'Estimated average damage: {}, minimum possible damage: {}, maximum possible damage: {}.'.format(
-                    round(outcome[2] * display_scale, 4),
-                    round(outcome[3] * display_scale, 4),
-                    round(outcome[4] * display_scale, 4)
-                ),
-                html.Br(), 'Estimated average shots to kill: {}, min. shots: {}, max. shots: {}'.format(
-                    ttk[0],
-                    ttk[1],
-                    ttk[2]),
-                html.Br(), 'First shot did not penetrate armor. New armor value: {}'.format(round(outcome[1] * display_scale, 2)),
-                html.Br(), 'Armor should break after {} shot(s).'.format(shots_to_pen(input_array))
+        elif result.random_damage == True: #if we get to the random damage part
+            output.extend([
+            'Estimated average damage: {}, minimum possible damage: {}, maximum possible damage: {}.'.format(
+                round(result.damage * display_scale, 4),
+                round(result.min_damage * display_scale, 4),
+                round(result.max_damage * display_scale, 4)
+            ),
+            html.Br(), 'Estimated average shots to kill: {}, min. shots: {}, max. shots: {}'.format(
+                result.ttk,
+                result.ttk_min,
+                result.ttk_max),
+            html.Br(), 'First shot did not penetrate armor. New armor value: {}'.format(round(result.new_armor * display_scale, 2)),
+            html.Br(), 'Armor should break after {} shot(s).'.format(result.shots_to_pen)
+        ])
+        else: #shot did not penetrate armor, no rand damage
+            output.extend([
+                'Estimated damage: {}, shots to kill: {}'.format(round(result.damage * display_scale, 6), result.ttk),
+                html.Br(), 'First shot did not penetrate armor. New armor value: {}'.format(round(result.new_armor, 2) * display_scale),
+                html.Br(), 'Armor should break after {} shot(s).'.format(result.shots_to_pen)
             ])
-            else: #no rand damage
-                output.extend([
-                    'Estimated damage: {}, shots to kill: {}'.format(round(outcome[2] * display_scale, 6), ttk[0]),
-                    html.Br(), 'First shot did not penetrate armor. New armor value: {}'.format(round(outcome[1], 2) * display_scale),
-                    html.Br(), 'Armor should break after {} shot(s).'.format(shots_to_pen(input_array))
-                ])
+    output.extend(kill_time_output(weapon, dist, result))
     return output
 
+def kill_time_output(weapon, dist, result): #seconds to kill line, from the items database fire rate/mag size/velocity
+    if not np.isfinite(result.ttk_seconds): #can't kill, or weapon isn't in the items database
+        return []
+    handling = snapshot().catalog.loc[weapon]
+    if result.one_mag:
+        mag_note = 'fits in one magazine'
+    else:
+        mag_note = 'needs a reload with a {:.0f} round magazine (reload time not included)'.format(handling['mag_size'])
+    return [
+        html.Br(), 'Time to kill: about {:.2f}s at {:.0f} RPM, {}.'.format(result.ttk_seconds, handling['fire_rate'], mag_note),
+        html.Br(), 'Bullet travel time to {}m: {:.0f}ms.'.format(dist, result.travel_time * 1000)
+    ]
+
+# Best loadouts table
+@callback(
+    Output('leaderboard-hitzone', 'options'),
+    Output('leaderboard-hitzone', 'value'),
+    Output('leaderboard-faction', 'disabled'),
+    Input('leaderboard-target', 'value')
+)
+
+@metrics.timed('set_leaderboard_hitzones')
+def set_leaderboard_hitzones(target):
+    if target is None:
+        raise PreventUpdate
+    if target.find('stalker') == -1: #mutant
+        return hitzones_mutants, 'torso', True
+    return hitzones_stalkers, 'torso', False
+
+@callback(
+    Output('leaderboard-table', 'children'),
+    Input('leaderboard-target', 'value'),
+    Input('leaderboard-hitzone', 'value'),
+    Input('leaderboard-dist', 'value'),
+    Input('leaderboard-difficulty', 'value'),
+    Input('leaderboard-faction', 'value')
+)
+
+@metrics.timed('update_leaderboard')
+def update_leaderboard(target, hitzone, dist, game_difficulty, faction):
+    if None in [target, hitzone, dist, game_difficulty, faction]:
+        raise PreventUpdate
+    try:
+        rows = get_leaderboard().query(target, hitzone, dist, game_difficulty, faction, limit=25)
+    except (KeyError, ValueError): #hitzone options haven't caught up with the target yet
+        raise PreventUpdate
+    header = html.Thead(html.Tr([html.Th('#'), html.Th('Weapon'), html.Th('Ammo'), html.Th('Shots to kill'), html.Th('Time to kill'), html.Th('Damage per shot'), html.Th('Penetrates')]))
+    body = html.Tbody([
+        html.Tr([
+            html.Td(i + 1),
+            html.Td(row['weapon_name']),
+            html.Td(row['bullet_name']),
+            html.Td('{}-{}'.format(row['ttk_min'], row['ttk_max']) if row['ttk_min'] != row['ttk_max'] else (row['ttk'] if row['ttk'] is not None else "Can't kill")),
+            html.Td('{:.2f}s{}'.format(row['ttk_seconds'], '' if row['one_mag'] else ' + reload') if row['ttk_seconds'] is not None else '-'),
+            html.Td(round(row['damage'] * 100, 2)),
+            html.Td('Yes' if row['penetrated'] else 'No')
+        ]) for i, row in enumerate(rows)
+    ])
+    return dbc.Table([header, body], striped=True, hover=True, size='sm')
+
+# Loadout comparison
+@callback(
+    Output('compare-ammo', 'options'),
+    Output('compare-ammo', 'value'),
+    Input('compare-weapon', 'value')
+)
+
+@metrics.timed('compare_ammo_options')
+def compare_ammo_options(weapon):
+    if not weapon:
+        raise PreventUpdate
+    options = snapshot().calibers.options(weapon) or snapshot().calibers.options(weapon, limit=False) #caliber not indexed, offer everything
+    return options, options[0]['value'] if options else None
+
+@callback(
+    Output('compare-loadouts', 'data'),
+    Input('compare-add', 'n_clicks'),
+    Input('compare-add-current', 'n_clicks'),
+    Input('compare-clear', 'n_clicks'),
+    Input({'type': 'compare-remove', 'index': ALL}, 'n_clicks'),
+    State('compare-weapon', 'value'),
+    State('compare-ammo', 'value'),
+    State('compare-barrel', 'value'),
+    State('compare-silencer', 'value'),
+    State('weapons-dropdown', 'value'),
+    State('ammo-dropdown', 'value'),
+    State('barrel-condition-slider', 'value'),
+    State('silencer', 'value'),
+    State('compare-loadouts', 'data'),
+    prevent_initial_call=True
+)
+
+@metrics.timed('edit_loadouts')
+def edit_loadouts(add, add_current, clear, remove, weapon, bullet, barrel, silencer, form_weapon, form_bullet, form_barrel, form_silencer, loadouts):
+    loadouts = list(loadouts or [])
+    trigger = ctx.triggered_id
+    if trigger == 'compare-clear':
+        return []
+    if isinstance(trigger, dict): #a row's remove button
+        if not ctx.triggered[0]['value']: #buttons that were just drawn fire with n_clicks None
+            raise PreventUpdate
+        del loadouts[trigger['index']]
+        return loadouts
+    if trigger == 'compare-add-current': #same weapon/ammo/barrel/silencer as the calculator form
+        weapon, bullet, barrel, silencer = form_weapon, form_bullet, form_barrel, form_silencer
+    if None in (weapon, bullet, barrel) or len(loadouts) >= MAX_LOADOUTS:
+        raise PreventUpdate
+    loadouts.append(dict(weapon=weapon, bullet=bullet, barrel=barrel, silencer=silencer == True))
+    return loadouts
+
+@callback(
+    Output('compare-table', 'children'),
+    Input('compare-loadouts', 'data'),
+    Input('compare-targets', 'value'),
+    Input('compare-hitzones', 'value'),
+    Input('compare-dist', 'value'),
+    Input('compare-difficulty', 'value'),
+    Input('compare-faction', 'value')
+)
+
+@metrics.timed('update_comparison')
+def update_comparison(loadouts, targets, hitzones, dist, game_difficulty, faction):
+    if not loadouts:
+        return html.P('No loadouts yet. Pick a weapon and ammo above and hit Add.')
+    if not targets or not hitzones or None in [dist, game_difficulty, faction]:
+        raise PreventUpdate
+    try: #every loadout x target x hitzone in one batched pass
+        table = compare_loadouts(snapshot().engine, loadouts, targets, hitzones, dist, game_difficulty, faction)
+    except ValueError as e:
+        return dbc.Alert(str(e), color='warning')
+    results = table['results']
+    best = [min((row[j]['ttk'] for row in results if row[j]['ttk'] is not None), default=None) for j in range(len(table['columns']))]
+    header = html.Thead(html.Tr([html.Th('Weapon'), html.Th('Ammo'), html.Th('Barrel'), html.Th('')] + [
+        html.Th('{} ({})'.format(get_name(col['target']), col['hitzone'])) for col in table['columns']
+    ]))
+    body = []
+    for i, (loadout, row) in enumerate(zip(table['loadouts'], results)):
+        cells = []
+        for j, cell in enumerate(row):
+            if cell['ttk'] is None:
+                shots = "Can't kill"
+            elif cell['ttk_min'] != cell['ttk_max']:
+                shots = '{}-{}'.format(cell['ttk_min'], cell['ttk_max'])
+            else:
+                shots = str(cell['ttk'])
+            if cell['ttk_seconds'] is not None:
+                shots += ' ({:.2f}s{})'.format(cell['ttk_seconds'], '' if cell['one_mag'] else ' + reload')
+            #one plain Td per cell, a 50 x 30 table is already a few thousand components
+            cells.append(html.Td(shots, style={'font-weight': 'bold'} if cell['ttk'] is not None and cell['ttk'] == best[j] else None))
+        body.append(html.Tr([
+            html.Td(get_name(loadout['weapon']) + (' (silenced)' if loadout['silencer'] else '')),
+            html.Td(get_name(loadout['bullet'])),
+            html.Td('{:g}%'.format(loadout['barrel'])),
+            html.Td(dbc.Button('Remove', id={'type': 'compare-remove', 'index': i}, size='sm', color='link', n_clicks=0))
+        ] + cells))
+    return dbc.Table([header, html.Tbody(body)], striped=True, hover=True, size='sm', responsive=True)
+
+# JSON API
+
+def leaderboard_api(): #?target=stalker_sunrise&hitzone=torso&dist=50&difficulty=hard&faction=other&sort=ttk&limit=20
+    args = request.args
+    try:
+        limit = int(args['limit']) if 'limit' in args else None
+        if limit is not None and limit < 1: #a negative slice would mean "all but the last N"
+            raise ValueError('limit must be at least 1')
+        rows = get_leaderboard().query(
+            args.get('target', 'stalker_sunrise'),
+            args.get('hitzone', 'torso'),
+            float(args.get('dist', 0)),
+            args.get('difficulty', 'hard'),
+            args.get('faction', 'other'),
+            sort_by=args.get('sort', 'ttk'),
+            limit=limit
+        )
+    except (KeyError, ValueError) as e:
+        return jsonify(error='Bad leaderboard query: {}'.format(e)), 400
+    return jsonify(rows)
+
+def search_api(): #?q=ak&kind=weapon&limit=10, typeahead for weapon/ammo/target pickers
+    args = request.args
+    kind = args.get('kind')
+    if kind is not None and kind not in KINDS:
+        return jsonify(error='kind must be one of {}'.format(', '.join(KINDS))), 400
+    try:
+        limit = int(args.get('limit', 10))
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+    except ValueError as e:
+        return jsonify(error='Bad search query: {}'.format(e)), 400
+    return jsonify(snapshot().names.search(args.get('q', ''), kind=kind, limit=limit))
+
+def reload_api(): #POST starts a data reload in the background, GET shows how the last one went. Needs GAMMA_ADMIN_TOKEN
+    token = os.environ.get('GAMMA_ADMIN_TOKEN')
+    if not token:
+        return jsonify(error='Data reload is disabled, set GAMMA_ADMIN_TOKEN to enable it'), 404
+    if request.headers.get('Authorization') != 'Bearer ' + token:
+        return jsonify(error='Bad or missing admin token'), 403
+    if request.method == 'POST':
+        started = reloader.trigger(force=request.args.get('force') in ('1', 'true'))
+        return jsonify(dict(reloader.status(), started=started)), 202 if started else 409
+    return jsonify(reloader.status())
+
+def cache_stats_api(): #hit/miss counts for the Calculate result cache
+    return jsonify(result_cache.stats())
+
+def metrics_api(): #latency histograms + counters as Prometheus text, only filled in with GAMMA_METRICS=1
+    cache = result_cache.stats()
+    gauges = {'result_cache_' + k: cache[k] for k in ('size', 'maxsize', 'hits', 'shared_hits', 'misses', 'evictions', 'hit_rate')}
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+MAX_BATCH_SCENARIOS = 100000 #bigger requests have to stream
+
+def evaluate_api():
+    # body: {"scenarios": [{"weapon": ..., "bullet": ..., "target": ..., "hitzone": ..., optional "faction", "dist",
+    # "barrel" (0-100), "game_difficulty", "silencer", "armor_override"}, ...]}
+    # returns {"results": [...]} in the same order, or one json object per line with ?stream=1
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('scenarios'), list):
+        return jsonify(error='Expected a JSON object with a "scenarios" list'), 400
+    scenarios = body['scenarios']
+    engine = snapshot().engine
+    if request.args.get('stream') in ('1', 'true'):
+        def generate():
+            for row in iter_evaluate_scenarios(engine, scenarios):
+                yield json.dumps(row) + '\n'
+        return Response(generate(), mimetype='application/x-ndjson')
+    if len(scenarios) > MAX_BATCH_SCENARIOS:
+        return jsonify(error='Too many scenarios ({}), use ?stream=1 above {}'.format(len(scenarios), MAX_BATCH_SCENARIOS)), 413
+    return jsonify(results=evaluate_scenarios(engine, scenarios))
+
+def compare_api():
+    # body: {"loadouts": [{"weapon", "bullet", optional "silencer", "barrel" (0-100)}, ...], "targets": [...],
+    # optional "hitzones" (default: all of each target's), "dist", "game_difficulty", "faction"}
+    # returns {"loadouts": [...], "columns": [{"target", "hitzone"}], "results": [[one result per column] per loadout]}
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('loadouts'), list) or not isinstance(body.get('targets'), list):
+        return jsonify(error='Expected a JSON object with "loadouts" and "targets" lists'), 400
+    try:
+        table = compare_loadouts(snapshot().engine, body['loadouts'], body['targets'], body.get('hitzones'), body.get('dist', 0),
+                                 body.get('game_difficulty', 'hard'), body.get('faction', 'other'))
+    except (TypeError, ValueError) as e:
+        return jsonify(error='Bad comparison: {}'.format(e)), 400
+    return jsonify(table)
+
+MAX_BREAKPOINT_SCENARIOS = 10000
+
+def breakpoints_api():
+    # body: {"scenarios": [...same fields as /api/evaluate...], "axis": "dist" | "barrel" | "armor", optional "range": [low, high]}
+    # returns {"results": [{"axis": ..., "segments": [{"from", "to", "ttk", "ttk_min", "ttk_max"}, ...]}, ...]}, same order
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('scenarios'), list):
+        return jsonify(error='Expected a JSON object with a "scenarios" list'), 400
+    if len(body['scenarios']) > MAX_BREAKPOINT_SCENARIOS:
+        return jsonify(error='Too many scenarios ({}), the limit is {}'.format(len(body['scenarios']), MAX_BREAKPOINT_SCENARIOS)), 413
+    bounds = body.get('range') or [None, None]
+    if not isinstance(bounds, list) or len(bounds) != 2:
+        return jsonify(error='"range" must be a [low, high] list'), 400
+    try:
+        results = breakpoints.solve_breakpoints(snapshot().engine, body['scenarios'], body.get('axis', 'dist'), *bounds)
+    except ValueError as e:
+        return jsonify(error='Bad breakpoint query: {}'.format(e)), 400
+    return jsonify(results=results)
+
+# Initialize the app
+
+def pin_snapshot(): #a request sees one version of the data from start to finish, even if a reload lands meanwhile
+    g.sim_snapshot = pin()
+
+def start_watcher(): #per worker: a watcher thread started before a fork wouldn't exist in the workers
+    reloader.watch() #only if GAMMA_RELOAD_INTERVAL is set, a no-op once it's running
+
+def unpin_snapshot(exc):
+    token = g.pop('sim_snapshot', None)
+    if token is not None:
+        unpin(token)
+
+app = None
+
+def create_app():
+    # builds the Dash app (one per process - @callback registrations are handed to the first app that's created)
+    # and the leaderboard, so a preloading server does the expensive part once, before it forks:
+    #   gunicorn --preload --chdir /path/to/gamma-dashboard --pythonpath damage-sim 'damage_sim:create_server()'
+    global app
+    if app is not None:
+        return app
+    get_leaderboard()
+    #style = "path/to/stylesheet.css"
+    app = Dash(external_stylesheets=[dbc.themes.DARKLY, 'damage-sim/assets/style.css'])
+    app.layout = layout
+    app.server.add_url_rule('/api/leaderboard', view_func=leaderboard_api)
+    app.server.add_url_rule('/api/search', view_func=search_api)
+    app.server.add_url_rule('/api/evaluate', view_func=evaluate_api, methods=['POST'])
+    app.server.add_url_rule('/api/breakpoints', view_func=breakpoints_api, methods=['POST'])
+    app.server.add_url_rule('/api/compare', view_func=compare_api, methods=['POST'])
+    app.server.add_url_rule('/api/cache-stats', view_func=cache_stats_api)
+    app.server.add_url_rule('/metrics', view_func=metrics_api)
+    app.server.add_url_rule('/api/admin/reload', view_func=reload_api, methods=['GET', 'POST'])
+    app.server.before_request(start_watcher)
+    app.server.before_request(pin_snapshot)
+    app.server.teardown_request(unpin_snapshot)
+    metrics.install(app.server)
+    profiler.install(app.server) #GAMMA_PROFILE=1, then X-Gamma-Profile: 1 or ?profile=1 dumps a cProfile per request
+    return app
+
+def create_server(): #the Flask app, for WSGI servers
+    return create_app().server
+
 # Run the app
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,96 @@
+# Reloads the sim data without restarting the server
+# A reload builds a whole new sim_engine.DataSnapshot on a background thread (csv parse, registry, engine, indexes, and
+# the leaderboard if the old one had it) and only then swaps it in, so requests keep running on the old data meanwhile.
+# Two triggers: GAMMA_RELOAD_INTERVAL=<seconds> polls the source csvs' size/mtime, and trigger() for the admin endpoint.
+# Each worker process reloads on its own, so with several workers use the watcher rather than the endpoint. Threads don't
+# survive a fork, so the watcher is started by each worker's first request (watch() is a no-op after that), not before forking.
+import os
+import threading
+import time
+import sim_engine
+from sim_data import source_paths
+from weapon_catalog import ITEMS_CSV
+
+WATCH_INTERVAL = float(os.environ.get('GAMMA_RELOAD_INTERVAL', 0)) #0 = don't watch
+
+def source_state(): #cheap fingerprint of the csvs (sim tables + items database), a change means it's worth reloading
+    state = []
+    for path in list(source_paths().values()) + [ITEMS_CSV]:
+        try:
+            st = os.stat(path)
+            state.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            state.append((path, None, None))
+    return tuple(state)
+
+class DataReloader:
+
+    def __init__(self, interval=WATCH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock() #one reload at a time
+        self._watcher = None
+        self._watcher_pid = None #the process that started it, a forked child has to start its own
+        self._watch_lock = threading.Lock()
+        self.reloads = 0
+        self.last_reload = None
+        self.last_error = None
+
+    @property
+    def reloading(self):
+        return self._lock.locked()
+
+    def reload(self, source=None, force=False): #blocking; True if new data was swapped in
+        with self._lock:
+            try:
+                new = sim_engine.reload_data(source, force=force)
+            except Exception as e: #bad csv or similar: keep serving the old data
+                self.last_error = '{}: {}'.format(type(e).__name__, e)
+                print('Error: data reload failed, keeping the old data: {}'.format(self.last_error))
+                return False
+            self.last_error = None
+            if new is None:
+                return False
+            self.reloads += 1
+            self.last_reload = time.time()
+            return True
+
+    def trigger(self, source=None, force=False): #reload on a background thread; False if one is already running
+        if self.reloading:
+            return False
+        threading.Thread(target=self.reload, args=(source, force), name='sim-data-reload', daemon=True).start()
+        return True
+
+    def watch(self): #starts the polling thread in this process, if an interval is set and it isn't running yet
+        if self.interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        with self._watch_lock:
+            if self._watcher_pid == os.getpid(): #another request thread got here first
+                return
+            self._watcher = threading.Thread(target=self._poll, name='sim-data-watch', daemon=True)
+            self._watcher.start()
+            self._watcher_pid = os.getpid()
+
+    def _poll(self):
+        state = pending = source_state()
+        while True:
+            time.sleep(self.interval)
+            new_state = source_state()
+            if new_state == state or any(mtime is None for _, mtime, _ in new_state): #no change, or a file is gone mid-copy
+                continue
+            if new_state != pending: #still being written, wait until it holds still for one interval
+                pending = new_state
+                continue
+            state = new_state
+            self.reload()
+
+    def status(self):
+        return {
+            'data_hash': sim_engine.snapshot().data_hash,
+            'reloading': self.reloading,
+            'reloads': self.reloads,
+            'last_reload': self.last_reload,
+            'last_error': self.last_error,
+            'watch_interval': self.interval
+        }
+
+reloader = DataReloader() #process-wide instance
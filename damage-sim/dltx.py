@@ -0,0 +1,266 @@
+# DLTX resolver: base configs + an MO2 mod list -> the sections the game ends up with, and which mod set each key
+# Mods are stacked the way MO2's virtual filesystem does it: a file in a higher priority mod replaces the same path
+# from lower ones and from the base tree. Then, per root file, every mod_[root]_*.ltx in the root's folder is applied in
+# alphabetical order of file name (last one wins, see dltx_guide.md):
+#   ![sec]  edit an existing section      @[sec]  edit, or create if missing      !![sec]  delete the section
+#   [sec]   new section                    !key    delete a key                     >key = a, b   append to a list value
+# ModdedConfig.origin_of(section, key) says which mod last set a value, following inheritance.
+# Resolved state is kept in damage-sim/.cache. A rerun first compares file sizes/mtimes. If only DLTX files changed, only
+# the sections those files touch (in their old or new version) are rebuilt. If nothing changed, nothing is parsed.
+#   python damage-sim/dltx.py path/to/configs --mods path/to/MO2/mods --modlist path/to/profile/modlist.txt --why wpn_ak74 hit_power
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+from ltx import LtxConfig, parse_paths, find_ltx, is_dltx, _parse_file, PARSE_CACHE
+from sim_data import CACHE_DIR
+
+STATE_VERSION = 1
+STATE_CACHE = os.path.join(CACHE_DIR, 'dltx_state.pkl')
+BASE = 'base' #provider name for files from the base tree
+
+def read_modlist(path): #MO2 profile modlist.txt -> enabled mods, lowest priority first
+    mods = []
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('+') and not line.endswith('_separator'):
+                mods.append(line[1:])
+    return mods[::-1] #modlist.txt lists the highest priority mod first
+
+def virtual_tree(base_dir, mods_dir=None, mods=()):
+    # {relative path: (file path, provider)} as the game sees it through MO2, paths matched case-insensitively
+    tree = {}
+    for provider, config_dir in [(BASE, base_dir)] + [(mod, os.path.join(mods_dir, mod, 'gamedata', 'configs')) for mod in mods]:
+        if not os.path.isdir(config_dir):
+            continue
+        for rel, path in find_ltx(config_dir).items():
+            low = rel.lower()
+            shown = tree[low][0] if low in tree else rel #keep the base tree's spelling
+            tree[low] = (shown, path, provider)
+    return {shown: (path, provider) for shown, path, provider in tree.values()}
+
+def dltx_groups(tree, roots): #root -> its mod_ files, in the order they apply
+    groups = {}
+    for root in roots:
+        folder, name = os.path.split(root.replace('\\', '/').lower())
+        prefix = 'mod_{}_'.format(os.path.splitext(name)[0])
+        groups[root] = sorted((rel for rel in tree if is_dltx(rel) and os.path.dirname(rel.lower()) == folder
+                               and os.path.basename(rel.lower()).startswith(prefix)), key=lambda rel: os.path.basename(rel).lower())
+    return groups
+
+class ModdedConfig(LtxConfig):
+    # LtxConfig built from resolved sections; overrides[section][key] = (mod, file) for keys a DLTX file set,
+    # everything else came from the file the section was defined in
+
+    def __init__(self, sections, providers, overrides, deleted, warnings):
+        self.sections = sections
+        self.providers = providers #relative path -> mod that supplied it
+        self.overrides = overrides
+        self.deleted = deleted #section -> (mod, file) that deleted it
+        self.warnings = warnings
+        self._resolved = {}
+
+    def defined_in(self, name, key, _stack=()): #section in the inheritance chain the value comes from, or None
+        if name not in self.sections or name in _stack:
+            return None
+        parents, items, _ = self.sections[name]
+        if key in items:
+            return name
+        for parent in reversed(parents): #later parents win
+            found = self.defined_in(parent, key, _stack + (name,))
+            if found is not None:
+                return found
+        return None
+
+    def origin_of(self, name, key): #(mod, file, section the value is written in), or None if the key isn't set
+        owner = self.defined_in(name, key)
+        if owner is None:
+            return None
+        if key in self.overrides.get(owner, {}):
+            mod, rel = self.overrides[owner][key]
+        else:
+            rel = self.sections[owner][2]
+            mod = self.providers.get(rel, BASE)
+        return mod, rel, owner
+
+def apply_dltx(sections, overrides, deleted, entries, rel, provider, notes, only=None):
+    # applies one mod_ file's entries to sections in place; only: set of section names to touch (incremental rebuild)
+    # notes: section -> warnings about it, so an incremental rebuild can replace just the ones it redoes
+    warn = lambda name, text: notes.setdefault(name, []).append('{}: {}'.format(rel, text))
+    for entry in entries:
+        if entry[0] == 'include':
+            if only is None:
+                warn(None, '#include in a DLTX file is ignored')
+            continue
+        _, modifier, name, parents, items = entry
+        if only is not None and name not in only:
+            continue
+        if modifier == '!!':
+            if sections.pop(name, None) is None:
+                warn(name, '!![{}] deletes a section that does not exist'.format(name))
+            overrides.pop(name, None)
+            deleted[name] = (provider, rel)
+            continue
+        if name not in sections:
+            if modifier == '!':
+                warn(name, '![{}] edits a section that does not exist, skipped'.format(name))
+                continue
+            sections[name] = (parents, {}, rel) #new section: its keys belong to this file already
+            overrides.pop(name, None)
+            deleted.pop(name, None)
+        elif modifier == '':
+            warn(name, '[{}] is already defined in {}, use ![{}] to edit it'.format(name, sections[name][2], name))
+        old_parents, old_items, defined = sections[name]
+        values = dict(old_items) #copy, the base snapshot shares these dicts
+        touched = overrides.setdefault(name, {}) if defined != rel else None
+        for op, key, value in items:
+            if op == '!':
+                values.pop(key, None)
+            elif op == '>' and values.get(key):
+                existing = [v.strip() for v in values[key].split(',')]
+                values[key] = ', '.join(existing + [v.strip() for v in value.split(',') if v.strip() and v.strip() not in existing])
+            else:
+                values[key] = value
+            if touched is not None:
+                touched[key] = (provider, rel)
+        sections[name] = (parents or old_parents, values, defined)
+
+def touched_sections(entries): #section names a DLTX file mentions
+    return {entry[2] for entry in entries if entry[0] == 'section'}
+
+def read_state(path):
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    return state if state.get('version') == STATE_VERSION else None
+
+def write_state(state, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print('Error: could not write the DLTX state: {}'.format(e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def resolve(base_dir, mods_dir=None, modlist=None, roots=('system.ltx',), state_path=STATE_CACHE, parse_cache=PARSE_CACHE, workers=None):
+    # -> (ModdedConfig, stats). stats['mode'] is 'cached', 'incremental' or 'full'
+    mods = read_modlist(modlist) if modlist else []
+    tree = virtual_tree(base_dir, mods_dir, mods)
+    providers = {rel: provider for rel, (_, provider) in tree.items()}
+    stamps = {}
+    for rel, (path, _) in tree.items():
+        st = os.stat(path)
+        stamps[rel] = (path, st.st_mtime_ns, st.st_size)
+    base_stamps = {rel: stamp for rel, stamp in stamps.items() if not is_dltx(rel)}
+    dltx_stamps = {rel: stamp for rel, stamp in stamps.items() if is_dltx(rel)}
+    key = (os.path.abspath(base_dir), tuple(roots))
+    state = read_state(state_path) if state_path else None
+    if state is not None and (state['key'] != key or state['base_stamps'] != base_stamps):
+        state = None
+    stats = {'mods': len(mods), 'files': len(tree), 'dltx_files': len(dltx_stamps), 'parsed': 0, 'rebuilt_sections': None}
+
+    if state is not None and state['dltx_stamps'] == dltx_stamps:
+        stats['mode'] = 'cached'
+    elif state is not None: #base unchanged: reparse the DLTX files that changed, rebuild what they touch
+        stats['mode'] = 'incremental'
+        changed = [rel for rel, stamp in dltx_stamps.items() if state['dltx_stamps'].get(rel) != stamp]
+        removed = [rel for rel in state['dltx_entries'] if rel not in dltx_stamps]
+        affected = set()
+        for rel in removed:
+            affected |= touched_sections(state['dltx_entries'].pop(rel))
+        for rel in changed:
+            digest, entries = _parse_file(dltx_stamps[rel][0], None)
+            stats['parsed'] += 1
+            affected |= touched_sections(state['dltx_entries'].get(rel, []))
+            affected |= touched_sections(entries)
+            state['dltx_entries'][rel] = entries
+        sections, overrides, deleted = state['sections'], state['overrides'], state['deleted']
+        notes = state['notes']
+        for name in affected: #back to how the base tree has it, then replay every DLTX edit to these sections in order
+            overrides.pop(name, None)
+            deleted.pop(name, None)
+            notes.pop(name, None)
+            if name in state['base_sections']:
+                sections[name] = state['base_sections'][name]
+            else:
+                sections.pop(name, None)
+        for root, group in dltx_groups(tree, roots).items():
+            for rel in group:
+                apply_dltx(sections, overrides, deleted, state['dltx_entries'][rel], rel, providers[rel], notes, only=affected)
+        state['dltx_stamps'] = dltx_stamps
+        stats['rebuilt_sections'] = len(affected)
+    else:
+        stats['mode'] = 'full'
+        files, _, counts = parse_paths({rel: path for rel, (path, _) in tree.items()}, parse_cache, workers)
+        stats['parsed'] = counts['parsed']
+        base = LtxConfig({rel: entries for rel, entries in files.items()}, roots)
+        sections, overrides, deleted, notes = dict(base.sections), {}, {}, {}
+        for root, group in dltx_groups(tree, roots).items():
+            for rel in group:
+                apply_dltx(sections, overrides, deleted, files[rel], rel, providers[rel], notes)
+        state = {'version': STATE_VERSION, 'key': key, 'base_stamps': base_stamps, 'dltx_stamps': dltx_stamps,
+                 'base_sections': base.sections, 'base_warnings': base.warnings, 'sections': sections, 'overrides': overrides,
+                 'deleted': deleted, 'dltx_entries': {rel: files[rel] for rel in dltx_stamps}, 'notes': notes}
+        stats['rebuilt_sections'] = len(sections)
+    if state_path and stats['mode'] != 'cached':
+        write_state(state, state_path)
+    warnings = state['base_warnings'] + [text for texts in state['notes'].values() for text in texts]
+    config = ModdedConfig(state['sections'], providers, state['overrides'], state['deleted'], warnings)
+    return config, stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resolve DLTX edits from an MO2 mod list over the base configs')
+    parser.add_argument('configs', help='unpacked base gamedata/configs folder')
+    parser.add_argument('--mods', help='MO2 mods folder')
+    parser.add_argument('--modlist', help="MO2 profile's modlist.txt")
+    parser.add_argument('--root', nargs='+', default=['system.ltx'], help='root ltx files, relative to configs')
+    parser.add_argument('--why', nargs=2, action='append', metavar=('SECTION', 'KEY'), help='show the value and who set it')
+    parser.add_argument('--section', action='append', help='print a resolved section with the mod behind every key')
+    parser.add_argument('--verbose', action='store_true', help='print every warning')
+    args = parser.parse_args(argv)
+    if args.modlist and not args.mods:
+        parser.error('--modlist needs --mods')
+
+    start = time.perf_counter()
+    config, stats = resolve(args.configs, args.mods, args.modlist, args.root)
+    print('{mode}: {mods} mods, {files} files ({dltx_files} DLTX), {parsed} parsed, {n} sections in {t:.2f}s'.format(
+        n=len(config.sections), t=time.perf_counter() - start, **stats))
+    for warning in config.warnings[:None if args.verbose else 10]:
+        print('warning:', warning)
+    if len(config.warnings) > 10 and not args.verbose:
+        print('... {} more warnings, --verbose shows them'.format(len(config.warnings) - 10))
+    for name, key in args.why or []:
+        if name not in config:
+            print('[{}] {}'.format(name, 'deleted by {} ({})'.format(*config.deleted[name]) if name in config.deleted else 'not found'))
+            continue
+        origin = config.origin_of(name, key)
+        if origin is None:
+            print('[{}] {} is not set'.format(name, key))
+        else:
+            print('[{}] {} = {}  <- {} ({}{})'.format(name, key, config.get(name, key), origin[0], origin[1],
+                                                   ', inherited from [{}]'.format(origin[2]) if origin[2] != name else ''))
+    for name in args.section or []:
+        if name not in config:
+            print('[{}] not found'.format(name))
+            continue
+        print('[{}]'.format(name))
+        for key, value in config.section(name).items():
+            print('  {} = {}  <- {}'.format(key, value, config.origin_of(name, key)[0]))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# Best loadout leaderboard
+# Precomputes shots to kill + damage for every compatible weapon/ammo pair against every target, hitzone and
+# distance bucket, one (difficulty, faction) slice at a time. A query is then an index into the slice plus a sort.
+# Slices are computed on first use (the default one at build time) and kept until the leaderboard is rebuilt.
+import threading
+import numpy as np
+from batch_engine import hitzones_stalkers, hitzones_mutants, difficulties, factions
+
+DIST_BUCKETS = (0, 10, 25, 50, 75, 100, 150, 200, 300)
+TTK_CAP = np.iinfo(np.uint16).max #shot counts are stored as uint16, anything at or over this means "can't kill"
+
+def _counts(values): #float shot counts -> capped uint16
+    values = np.where(np.isfinite(values) & (values < TTK_CAP), values, TTK_CAP)
+    return np.maximum(values, 0).astype(np.uint16)
+
+class Leaderboard:
+
+    def __init__(self, engine, compatible_ammo, dist_buckets=DIST_BUCKETS, barrel=1.0, precompute=(('hard', 'other'),)):
+        # compatible_ammo: function weapon id -> list of ammo ids it can fire
+        registry = engine.registry
+        pairs = [(registry.weapons.idx_of(w), registry.ammo.idx_of(a))
+                 for w in registry.weapons.ids for a in compatible_ammo(w) if a in registry.ammo]
+        self.engine = engine
+        self.registry = registry
+        self.pair_weapon = np.array([p[0] for p in pairs], dtype=np.intp)
+        self.pair_ammo = np.array([p[1] for p in pairs], dtype=np.intp)
+        self.dist_buckets = np.array(dist_buckets, dtype=float)
+        self.barrel = barrel
+        self._slices = {}
+        self._lock = threading.Lock()
+        for difficulty, faction in precompute:
+            self.table('stalker', difficulty, faction)
+            self.table('mutant', difficulty)
+
+    def __len__(self): #number of weapon/ammo pairs
+        return len(self.pair_weapon)
+
+    def table(self, kind, difficulty='hard', faction='other'):
+        # arrays shaped (target, hitzone, dist bucket, pair) - pair last so a query reads one contiguous row
+        if kind == 'mutant':
+            faction = 'other' #mutants don't have factions
+        key = (kind, difficulty, faction)
+        with self._lock:
+            if key not in self._slices:
+                self._slices[key] = self._compute(kind, difficulty, faction)
+            return self._slices[key]
+
+    def _compute(self, kind, difficulty, faction):
+        if kind == 'stalker':
+            n_targets, n_zones = len(self.registry.stalkers), len(hitzones_stalkers)
+        else:
+            n_targets, n_zones = len(self.registry.mutants), len(hitzones_mutants)
+        targets = np.arange(n_targets)[:, None, None, None]
+        zones = np.arange(n_zones)[None, :, None, None]
+        dists = self.dist_buckets[None, None, :, None]
+        result = self.engine.evaluate(kind, self.pair_weapon, self.pair_ammo, targets, zones, factions.index(faction), dists,
+                                      self.barrel, difficulties.index(difficulty), False)
+        return {
+            'ttk': _counts(result.ttk),
+            'ttk_min': _counts(result.ttk_min),
+            'ttk_max': _counts(result.ttk_max),
+            'damage': result.damage.astype(np.float32),
+            'penetrated': np.ascontiguousarray(result.penetrated),
+            'ttk_seconds': result.ttk_seconds.astype(np.float32), #NaN for weapons without handling stats
+            'one_mag': np.ascontiguousarray(result.one_mag)
+        }
+
+    def bucket(self, dist): #index of the nearest distance bucket
+        return int(np.abs(self.dist_buckets - float(dist)).argmin())
+
+    def query(self, target, hitzone, dist=0, difficulty='hard', faction='other', sort_by='ttk', limit=None):
+        # returns rows sorted best first: fewest shots to kill (ties: most damage), most damage with sort_by='damage',
+        # or quickest kill in seconds with sort_by='time' (weapons with no fire rate go last)
+        if target in self.registry.stalkers:
+            kind, target_idx, zone_idx = 'stalker', self.registry.stalkers.idx_of(target), hitzones_stalkers.index(hitzone)
+        else:
+            kind, target_idx, zone_idx = 'mutant', self.registry.mutants.idx_of(target), hitzones_mutants.index(hitzone)
+        bucket = self.bucket(dist)
+        table = self.table(kind, difficulty, faction)
+        ttk = table['ttk'][target_idx, zone_idx, bucket]
+        damage = table['damage'][target_idx, zone_idx, bucket]
+        seconds = table['ttk_seconds'][target_idx, zone_idx, bucket]
+        if sort_by == 'damage':
+            order = np.lexsort((ttk, -damage))
+        elif sort_by == 'ttk':
+            order = np.lexsort((-damage, ttk))
+        elif sort_by == 'time':
+            order = np.lexsort((ttk, np.where(np.isfinite(seconds), seconds, np.inf)))
+        else:
+            raise ValueError('Unknown sort: {}'.format(sort_by))
+        if limit is not None:
+            order = order[:limit]
+        rows = []
+        for i in order:
+            weapon = self.registry.weapons.records[self.pair_weapon[i]]
+            ammo = self.registry.ammo.records[self.pair_ammo[i]]
+            rows.append({
+                'weapon': weapon.id,
+                'weapon_name': weapon.name,
+                'bullet': ammo.id,
+                'bullet_name': ammo.name,
+                'ttk': _count_or_none(ttk[i]),
+                'ttk_min': _count_or_none(table['ttk_min'][target_idx, zone_idx, bucket, i]),
+                'ttk_max': _count_or_none(table['ttk_max'][target_idx, zone_idx, bucket, i]),
+                'damage': float(damage[i]),
+                'penetrated': bool(table['penetrated'][target_idx, zone_idx, bucket, i]),
+                'ttk_seconds': float(seconds[i]) if np.isfinite(seconds[i]) else None,
+                'one_mag': bool(table['one_mag'][target_idx, zone_idx, bucket, i]),
+                'dist': float(self.dist_buckets[bucket])
+            })
+        return rows
+
+def _count_or_none(value): #None = can't kill
+    value = int(value)
+    return None if value >= TTK_CAP else value
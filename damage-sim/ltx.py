@@ -0,0 +1,234 @@
+# LTX config reader for an unpacked gamedata/configs tree
+# parse_ltx() turns one file into a flat list of entries: ('include', pattern) and
+# ('section', modifier, name, parents, items). Here modifier is '', or '!', '!!' or '@' on a DLTX header, and items
+# is a list of (op, key, value), where op is '' or a DLTX '!'/'>' prefix on the key.
+# load_files() parses every .ltx under the tree. Parses are cached by content hash and only new/changed files are
+# parsed again, across a process pool when there are enough of them. LtxConfig then follows #include from the root
+# files, in engine order, and resolves [section]:parent inheritance on lookup.
+import fnmatch
+import hashlib
+import os
+import pickle
+import re
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path: #workers started with spawn need this too
+    sys.path.insert(0, SIM_DIR)
+
+from sim_data import CACHE_DIR
+
+PARSE_VERSION = 1 #bump when parse_ltx output changes, old cache entries are thrown away
+PARSE_CACHE = os.path.join(CACHE_DIR, 'ltx_parse.pkl')
+PARALLEL_MIN_FILES = 200 #below this a process pool costs more than it saves
+ENCODING = 'cp1251' #what the game reads, ascii for everything that matters here
+
+INCLUDE_RE = re.compile(r'^#include\s+"([^"]+)"', re.IGNORECASE)
+SECTION_RE = re.compile(r'^(!!|!|@)?\[([^\]]+)\]\s*(?::\s*(.*))?$')
+
+def parse_ltx(text):
+    entries = []
+    items = None
+    for raw in text.splitlines():
+        line = raw.split(';', 1)[0].strip() if ';' in raw else raw.strip()
+        if not line or line.startswith('//'):
+            continue
+        first = line[0]
+        if first == '#':
+            include = INCLUDE_RE.match(line)
+            if include:
+                entries.append(('include', include.group(1).replace('\\', '/')))
+                items = None
+            continue
+        if first in '[!@':
+            header = SECTION_RE.match(line)
+            if header:
+                parents = tuple(p.strip() for p in (header.group(3) or '').split(',') if p.strip())
+                items = []
+                entries.append(('section', header.group(1) or '', header.group(2).strip(), parents, items))
+                continue
+        if items is None: #keys before any section
+            continue
+        op = ''
+        if first in '!>':
+            op, line = first, line[1:].lstrip()
+        key, eq, value = line.partition('=')
+        items.append((op, key.rstrip(), value.strip() if eq else ''))
+    return entries
+
+def _parse_file(path, known_hash): #worker: (hash, entries), entries None if the content hash didn't change
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha1(data).hexdigest()
+    if digest == known_hash:
+        return digest, None
+    return digest, parse_ltx(data.decode(ENCODING, errors='replace'))
+
+def _parse_batch(jobs):
+    return [(rel, ) + _parse_file(path, known_hash) for rel, path, known_hash in jobs]
+
+def is_dltx(rel): #mod_[root]_[name].ltx
+    return os.path.basename(rel).lower().startswith('mod_')
+
+def find_ltx(config_dir): #relative posix path -> absolute path, for every .ltx under config_dir
+    found = {}
+    for dirpath, _, filenames in os.walk(config_dir):
+        for filename in filenames:
+            if filename.lower().endswith('.ltx'):
+                path = os.path.join(dirpath, filename)
+                found[os.path.relpath(path, config_dir).replace(os.sep, '/')] = path
+    return found
+
+def read_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as f:
+            cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+    return cache.get('files', {}) if cache.get('version') == PARSE_VERSION else {}
+
+def write_cache(files, cache_path):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'version': PARSE_VERSION, 'files': files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print('Error: could not write the ltx parse cache: {}'.format(e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def parse_paths(paths, cache_path=PARSE_CACHE, workers=None, prune=None):
+    # paths: {relative path: file path} -> ({relative path: entries}, {relative path: content hash}, counts of what was read/parsed).
+    # Files with the same size and mtime as last time are trusted; others are hashed, and only parsed when the hash changed.
+    # Cache entries are keyed by absolute path, so one cache file serves several trees (base game + mod folders).
+    # prune: a folder whose cache entries for files that are gone get dropped
+    cache = read_cache(cache_path) if cache_path else {}
+    files, hashes, jobs = {}, {}, []
+    counts = {'files': 0, 'read': 0, 'parsed': 0}
+    seen = set()
+    for rel, path in sorted(paths.items()):
+        counts['files'] += 1
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        seen.add(key)
+        cached = cache.get(key)
+        if cached is not None and cached['mtime'] == st.st_mtime_ns and cached['size'] == st.st_size:
+            files[rel], hashes[rel] = cached['entries'], cached['hash']
+        else:
+            jobs.append((rel, path, cached['hash'] if cached else None))
+        cache[key] = dict(cached or {}, mtime=st.st_mtime_ns, size=st.st_size)
+    counts['read'] = len(jobs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if len(jobs) >= PARALLEL_MIN_FILES and workers > 1:
+        batches = [jobs[i::workers * 4] for i in range(workers * 4)] #interleaved, big and small files spread out
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = [r for batch in pool.map(_parse_batch, batches) for r in batch]
+    else:
+        results = _parse_batch(jobs)
+    keys = {rel: os.path.abspath(path) for rel, path, _ in jobs}
+    for rel, digest, entries in results:
+        entry = cache[keys[rel]]
+        if entries is None: #touched but same content
+            entries = entry['entries']
+        else:
+            counts['parsed'] += 1
+        entry.update(hash=digest, entries=entries)
+        files[rel], hashes[rel] = entries, digest
+    gone = []
+    if prune is not None:
+        tree = os.path.join(os.path.abspath(prune), '')
+        gone = [key for key in cache if key.startswith(tree) and key not in seen]
+        for key in gone:
+            del cache[key]
+    if cache_path and (jobs or gone):
+        write_cache(cache, cache_path)
+    return files, hashes, counts
+
+def load_files(config_dir, cache_path=PARSE_CACHE, workers=None): #every .ltx under config_dir, see parse_paths
+    return parse_paths(find_ltx(config_dir), cache_path, workers, prune=config_dir)
+
+class LtxConfig:
+    # sections from the root files and everything they #include, in load order. A section defined twice keeps the
+    # later definition (the engine would refuse to load, here it's a warning in self.warnings)
+
+    def __init__(self, files, roots=('system.ltx',)):
+        self.files = files
+        self._lower = {rel.lower(): rel for rel in files} #windows paths, any case goes
+        self.sections = {} #name -> (parents, {key: value}, file)
+        self.order = [] #files in the order they were loaded
+        self.warnings = []
+        self._resolved = {}
+        loaded = set()
+        for root in roots:
+            rel = self._lower.get(root.lower().replace('\\', '/'))
+            if rel is None:
+                self.warnings.append('root file {} not found'.format(root))
+                continue
+            self._load(rel, loaded)
+
+    def include_targets(self, rel, pattern): #files an #include in rel points at, wildcards in alphabetical order
+        base = os.path.dirname(rel)
+        target = os.path.normpath(os.path.join(base, pattern)).replace(os.sep, '/').lower()
+        if '*' not in target and '?' not in target:
+            return [self._lower[target]] if target in self._lower else []
+        folder = os.path.dirname(target)
+        return sorted((rel for low, rel in self._lower.items() if os.path.dirname(low) == folder and fnmatch.fnmatchcase(low, target)
+                       and not is_dltx(low)), key=str.lower) #mod_*.ltx only ever apply to their root, see dltx.py
+
+    def _load(self, rel, loaded):
+        if rel in loaded: #included twice, the engine only reads it once
+            return
+        loaded.add(rel)
+        self.order.append(rel)
+        for entry in self.files[rel]:
+            if entry[0] == 'include':
+                targets = self.include_targets(rel, entry[1])
+                if not targets and '*' not in entry[1]:
+                    self.warnings.append('{}: #include "{}" not found'.format(rel, entry[1]))
+                for target in targets:
+                    self._load(target, loaded)
+            else:
+                self.add_section(entry, rel)
+
+    def add_section(self, entry, rel):
+        _, modifier, name, parents, items = entry
+        if modifier:
+            self.warnings.append('{}: DLTX header {}[{}] in a base file, read as a plain section'.format(rel, modifier, name))
+        if name in self.sections:
+            self.warnings.append('{}: [{}] already defined in {}, later one wins'.format(rel, name, self.sections[name][2]))
+        self.sections[name] = (parents, {key: value for _, key, value in items}, rel)
+        self._resolved.clear()
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def section(self, name, _stack=()): #{key: value} with inherited keys; parents left to right, then the section's own
+        if name in self._resolved:
+            return self._resolved[name]
+        if name in _stack:
+            raise ValueError('inheritance loop: {}'.format(' -> '.join(_stack + (name,))))
+        parents, items, _ = self.sections[name] #KeyError for unknown sections
+        values = {}
+        for parent in parents:
+            if parent in self.sections:
+                values.update(self.section(parent, _stack + (name,)))
+            else:
+                self.warnings.append('[{}] inherits from unknown [{}]'.format(name, parent))
+        values.update(items)
+        self._resolved[name] = values
+        return values
+
+    def get(self, name, key, default=None):
+        return self.section(name).get(key, default)
+
+    def names(self, pattern='*'): #section names matching a glob, in load order
+        return [name for name in self.sections if fnmatch.fnmatchcase(name, pattern)]
+
+def load_config(config_dir, roots=('system.ltx',), cache_path=PARSE_CACHE, workers=None): #LtxConfig + parse counts
+    files, _, counts = load_files(config_dir, cache_path, workers)
+    return LtxConfig(files, roots), counts
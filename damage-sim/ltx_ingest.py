@@ -0,0 +1,236 @@
+# Builds weapons.csv, ammo.csv and mutants.csv straight from an unpacked gamedata/configs tree
+#   python damage-sim/ltx_ingest.py path/to/gamedata/configs --dry-run     show what would change
+#   python damage-sim/ltx_ingest.py path/to/gamedata/configs              rewrite damage-sim/src (a running server with
+#                                                                         GAMMA_RELOAD_INTERVAL set picks it up)
+# The tree is read with ltx.py, so reruns only parse files that changed. By default only ids already in the csvs are
+# updated, so the app's item lists don't change (--all adds every matching section). Ids the configs don't have
+# (the DEFAULT_* rows, knives...) are left as they are.
+# Columns with no ltx key in vanilla Anomaly (the GBO multipliers, mutant hitzone tables) are read from a key with the
+# same name if the configs have one, otherwise the current csv value is kept. Names are kept too, since some were
+# edited by hand to tell apart guns with the same in-game name; new ids get their inv_name from the string tables.
+# With --mods/--modlist the tree is the base configs plus an MO2 mod list with DLTX applied (dltx.py), and every
+# changed value says which mod set it:
+#   python damage-sim/ltx_ingest.py path/to/configs --mods path/to/MO2/mods --modlist path/to/profile/modlist.txt
+import argparse
+import csv
+import glob
+import os
+import re
+import sys
+import tempfile
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+from ltx import load_config, PARSE_CACHE
+from dltx import resolve, STATE_CACHE
+from sim_data import SRC_DIR
+
+STRING_RE = re.compile(r'<string\s+id="([^"]+)"\s*>\s*<text>(.*?)</text>', re.DOTALL)
+
+# Reading values
+
+def first(value): #'0.46, 0.46, 0.46, 0.46' -> '0.46'
+    return value.split(',')[0].strip() if value is not None else None
+
+def number(value):
+    try:
+        return float(first(value))
+    except (TypeError, ValueError):
+        return None
+
+def key(name, convert=number): #column read from a key of the same section
+    return lambda config, section: convert(config.section(section).get(name))
+
+def immunity(name): #fire_wound_immunity etc. live in the section named by immunities_sect
+    def read(config, section):
+        sect = config.section(section).get('immunities_sect')
+        if sect not in config:
+            return None
+        return number(config.section(sect).get(name))
+    return read
+
+def silencer(config, section): #silencer_status: 0 none, 1 built in, 2 attachable
+    status = number(config.section(section).get('silencer_status'))
+    return None if status is None else status == 1
+
+def pellets(config, section):
+    value = number(config.section(section).get('buck_shot'))
+    return None if value is None else int(value)
+
+# csv file, section glob for --all, keys a section needs to count, {column: reader}
+TABLES = {
+    'weapons': ('weapons.csv', 'wpn_*', ('hit_power', 'ammo_class'), {
+        'hit_power': key('hit_power'), #first of the per-difficulty values, the sim applies difficulty itself
+        'ammo_type': key('ammo_class', first), #the default ammo is the first one listed
+        'integrated_silencer': silencer
+    }),
+    'ammo': ('ammo.csv', 'ammo_*', ('k_hit', 'k_ap'), {
+        'k_hit': key('k_hit'),
+        'k_ap': key('k_ap'),
+        'air_res': key('k_air_resistance'),
+        'ammo_mult_mutant': key('ammo_mult_mutant'),
+        'gigant_ammo_mult': key('gigant_ammo_mult'),
+        'ammo_mult_stalker': key('ammo_mult_stalker'),
+        'hp_no_penetration_penalty': key('hp_no_penetration_penalty'),
+        'pellets': pellets
+    }),
+    'mutants': ('mutants.csv', 'm_*', ('species', 'immunities_sect'), {
+        'mutant_mult': key('mutant_mult'),
+        'spec_mutant_mult': key('spec_mutant_mult'),
+        'crit_zone': key('crit_zone', first),
+        'crit_hit': key('crit_hit'),
+        'head': key('head'),
+        'torso': key('torso'),
+        'limbs': key('limbs'),
+        'rear': key('rear'),
+        'other': key('other'),
+        'skin_armor': key('skin_armor'),
+        'hit_fraction': key('hit_fraction_monster'),
+        'fire_wound_immunity': immunity('fire_wound_immunity'),
+        'zombie_modifier': key('zombie_modifier')
+    })
+}
+LTX_KEYS = {'ammo_type': 'ammo_class', 'integrated_silencer': 'silencer_status', 'air_res': 'k_air_resistance',
+            'pellets': 'buck_shot', 'hit_fraction': 'hit_fraction_monster'} #column -> key it's read from, where the names differ
+DEFAULTS = { #for --all rows the configs and the csv both have nothing for
+    'ammo_mult_mutant': 0.85, 'gigant_ammo_mult': 0.85, 'ammo_mult_stalker': 1, 'hp_no_penetration_penalty': 1, 'pellets': 1,
+    'integrated_silencer': False, 'mutant_mult': 0.85, 'spec_mutant_mult': 1, 'crit_zone': 'none', 'crit_hit': 1,
+    'head': 1, 'torso': 1, 'limbs': 1, 'rear': 1, 'other': 1, 'skin_armor': 0, 'zombie_modifier': 1
+}
+
+def load_strings(config_dir, lang='eng'): #string table id -> text, later files win like the game's xml overrides
+    strings = {}
+    for path in sorted(glob.glob(os.path.join(config_dir, 'text', lang, '*.xml')), key=str.lower):
+        with open(path, 'rb') as f:
+            text = f.read().decode('cp1251', errors='replace')
+        for string_id, value in STRING_RE.findall(text):
+            strings[string_id] = value.strip()
+    return strings
+
+# Writing
+
+def read_csv(path): #(header, {id: row dict of strings}) keeping file order
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, {row[reader.fieldnames[0]]: row for row in reader}
+
+def format_value(value, old=None): #keeps the csv's own spelling when the number didn't change (1 vs 1.0)
+    if value is None:
+        return old if old is not None else ''
+    if old is not None:
+        try:
+            if isinstance(value, bool):
+                if old.lower() == str(value).lower():
+                    return old
+            elif not isinstance(value, str) and float(old) == float(value):
+                return old
+            elif old == value:
+                return old
+        except ValueError:
+            pass
+    return str(value)
+
+def build_table(config, strings, table, existing, all_sections=False):
+    # rows for one csv -> (header, rows, report). report: changed cells, ids kept as-is, ids added
+    _, pattern, required, readers = TABLES[table]
+    header, old_rows = existing
+    id_col, name_col = header[0], header[1]
+    ids = list(old_rows)
+    if all_sections:
+        for name in config.names(pattern):
+            values = config.section(name)
+            if name not in old_rows and all(k in values for k in required) and values.get('species') not in ('stalker', 'human'):
+                ids.append(name)
+    rows, changed, kept, added = [], [], [], []
+    for item_id in ids:
+        old = old_rows.get(item_id)
+        if item_id not in config:
+            kept.append(item_id)
+            rows.append(old)
+            continue
+        row = {id_col: item_id}
+        if old is not None:
+            row[name_col] = old[name_col]
+        else:
+            inv_name = config.section(item_id).get('inv_name')
+            row[name_col] = strings.get(inv_name, inv_name or item_id)
+            added.append(item_id)
+        for column in header[2:]:
+            reader = readers.get(column)
+            value = reader(config, item_id) if reader else None
+            if value is None and old is None:
+                value = DEFAULTS.get(column)
+            row[column] = format_value(value, old[column] if old is not None else None)
+            if old is not None and row[column] != old[column]:
+                changed.append((item_id, column, old[column], row[column]))
+        rows.append(row)
+    return header, rows, {'changed': changed, 'kept': kept, 'added': added}
+
+def changed_by(config, item_id, column): #' (mod name)' when a mod set the value a column came from
+    ltx_key = LTX_KEYS.get(column, column)
+    origin = config.origin_of(item_id, ltx_key) if hasattr(config, 'origin_of') else None
+    return ' ({})'.format(origin[0]) if origin is not None else ''
+
+def write_csv(path, header, rows): #atomic, so the reload watcher never sees half a file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=header, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the damage sim csvs from Anomaly/GAMMA ltx configs')
+    parser.add_argument('configs', help='unpacked gamedata/configs folder')
+    parser.add_argument('--out', default=SRC_DIR, help='folder with the csvs to update (default: damage-sim/src)')
+    parser.add_argument('--mods', help='MO2 mods folder, to build the tables for a modded setup')
+    parser.add_argument('--modlist', help="MO2 profile's modlist.txt, enabled mods in priority order")
+    parser.add_argument('--root', nargs='+', default=['system.ltx'], help='root ltx files, relative to configs')
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    parser.add_argument('--all', action='store_true', help='add every matching section, not just ids already in the csvs')
+    parser.add_argument('--lang', default='eng', help='string table language for names of new ids')
+    parser.add_argument('--workers', type=int, default=None, help='parser processes (default: one per core)')
+    parser.add_argument('--no-cache', action='store_true', help='parse everything again and leave the cache alone')
+    parser.add_argument('--dry-run', action='store_true', help="report changes, don't write")
+    parser.add_argument('--verbose', action='store_true', help='list every changed value and config warning')
+    args = parser.parse_args(argv)
+    if args.modlist and not args.mods:
+        parser.error('--modlist needs --mods')
+
+    if not os.path.isdir(args.configs):
+        print('Error: {} is not a folder'.format(args.configs))
+        return 2
+    start = time.perf_counter()
+    if args.mods:
+        config, counts = resolve(args.configs, args.mods, args.modlist, args.root, None if args.no_cache else STATE_CACHE,
+                                 None if args.no_cache else PARSE_CACHE, args.workers)
+        print('{mode}: {mods} mods, {files} ltx files ({dltx_files} DLTX), {parsed} parsed in {t:.2f}s; {n} sections'.format(
+            t=time.perf_counter() - start, n=len(config.sections), **counts))
+    else:
+        config, counts = load_config(args.configs, args.root, None if args.no_cache else PARSE_CACHE, args.workers)
+        print('{files} ltx files, {read} read, {parsed} parsed in {t:.2f}s; {n} sections'.format(
+            t=time.perf_counter() - start, n=len(config.sections), **counts))
+    strings = load_strings(args.configs, args.lang) if args.all else {}
+    for warning in config.warnings[:None if args.verbose else 10]:
+        print('warning:', warning)
+    if len(config.warnings) > 10 and not args.verbose:
+        print('... {} more warnings, --verbose shows them'.format(len(config.warnings) - 10))
+
+    for table in args.tables:
+        path = os.path.join(args.out, TABLES[table][0])
+        header, rows, report = build_table(config, strings, table, read_csv(path), args.all)
+        print('{}: {} rows, {} values changed, {} added, {} not in the configs (kept)'.format(
+            TABLES[table][0], len(rows), len(report['changed']), len(report['added']), len(report['kept'])))
+        for item_id, column, old, new in report['changed'][:None if args.verbose else 15]:
+            print('  {}.{}: {} -> {}{}'.format(item_id, column, old, new, changed_by(config, item_id, column)))
+        if args.verbose and report['kept']:
+            print('  kept:', ', '.join(report['kept']))
+        if not args.dry_run and (report['changed'] or report['added']):
+            write_csv(path, header, rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# Latency histograms and counters, served as Prometheus-style text on /metrics
+# Off unless GAMMA_METRICS=1. When it's off, timed() hands back the undecorated function and stage() is a shared
+# no-op context manager, so the instrumented code costs next to nothing.
+# Three families: callbacks (Dash callbacks and the helpers they call), engine stages (lookup, AP, armor, TTK)
+# and HTTP requests per endpoint. The gap between a Dash request and its callback is the serialization time.
+import functools
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+ENABLED = os.environ.get('GAMMA_METRICS', '0') == '1'
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) #seconds
+_NULL = nullcontext()
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) #last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(self.buckets) and seconds > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+class Metrics:
+
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.histograms = {} #(family, label value) -> Histogram
+        self.counters = {} #(counter name, labels tuple) -> int
+
+    def observe(self, family, name, seconds):
+        with self._lock:
+            hist = self.histograms.get((family, name))
+            if hist is None:
+                hist = self.histograms[(family, name)] = Histogram()
+            hist.observe(seconds)
+
+    def count(self, counter, labels=(), n=1):
+        with self._lock:
+            self.counters[(counter, labels)] = self.counters.get((counter, labels), 0) + n
+
+    def timed(self, name, family='callback'): #decorator: latency histogram + call/error counts for a function
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    if type(e).__name__ != 'PreventUpdate': #Dash's "nothing to do" isn't an error
+                        self.count(family + '_errors_total', ((family, name),))
+                    raise
+                finally:
+                    self.observe(family, name, time.perf_counter() - start)
+                    self.count(family + '_calls_total', ((family, name),))
+            return wrapper
+        return decorate
+
+    def stage(self, name): #context manager timing one engine stage
+        if not self.enabled:
+            return _NULL
+        return _Stage(self, name)
+
+    def install(self, server): #request timing hooks on a Flask server
+        if not self.enabled:
+            return
+        from flask import request, g
+
+        @server.before_request
+        def _start_timer():
+            g.metrics_start = time.perf_counter()
+
+        @server.after_request
+        def _stop_timer(response):
+            start = g.pop('metrics_start', None)
+            if start is not None:
+                endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                self.observe('http', endpoint, time.perf_counter() - start)
+                self.count('http_requests_total', (('endpoint', endpoint), ('status', str(response.status_code))))
+            return response
+
+        @server.teardown_request
+        def _count_errors(exc):
+            if exc is not None:
+                endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                self.count('http_errors_total', (('endpoint', endpoint),))
+
+    def render(self, gauges=None): #Prometheus text exposition; gauges: {name: value} for extra numbers like cache size
+        lines = ['# gamma-dashboard metrics', 'gamma_metrics_enabled {}'.format(1 if self.enabled else 0)]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        families = {}
+        for (family, name), hist in histograms:
+            families.setdefault(family, []).append((name, hist))
+        label_names = {'callback': 'callback', 'stage': 'stage', 'http': 'endpoint'}
+        for family, items in families.items():
+            metric = 'gamma_{}_seconds'.format(family)
+            label = label_names.get(family, 'name')
+            lines.append('# TYPE {} histogram'.format(metric))
+            for name, hist in items:
+                cumulative = 0
+                for bound, n in zip(hist.buckets + ('+Inf',), hist.counts):
+                    cumulative += n
+                    lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(metric, label, name, bound, cumulative))
+                lines.append('{}_sum{{{}="{}"}} {:.6f}'.format(metric, label, name, hist.sum))
+                lines.append('{}_count{{{}="{}"}} {}'.format(metric, label, name, hist.count))
+        seen = set()
+        for (counter, labels), value in counters:
+            metric = 'gamma_' + counter
+            if metric not in seen:
+                lines.append('# TYPE {} counter'.format(metric))
+                seen.add(metric)
+            label_text = ','.join('{}="{}"'.format(k, v) for k, v in labels)
+            lines.append('{}{{{}}} {}'.format(metric, label_text, value) if label_text else '{} {}'.format(metric, value))
+        for name, value in sorted((gauges or {}).items()):
+            if value is None:
+                continue
+            lines.append('# TYPE gamma_{} gauge'.format(name))
+            lines.append('gamma_{} {}'.format(name, float(value)))
+        return '\n'.join(lines) + '\n'
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe('stage', self.name, time.perf_counter() - self.start)
+        return False
+
+metrics = Metrics() #process-wide instance, everything instruments against this
@@ -0,0 +1,109 @@
+# Monte Carlo shots to kill for the random non-penetration damage roll
+# time_to_kill only knows the 25/62.5/100 min/avg/max of the roll, so its spread is a guess. This runs the shots one by one
+# instead: armor drops by 0.6 * AP every shot (same as stalker_armor_calc), each shot takes whichever branch the
+# current armor puts it in, and the random branch rolls an integer 25-100 like the game's math.random(25, 100).
+# Armor degradation doesn't depend on the roll, so the branch of shot k is the same in every trial. Only the
+# random shots need sampling, and those always come first (armor is highest then), so trials are
+# vectorized over the random stretch in blocks and the deterministic tail is solved in closed form.
+# Shots that can't kill anyone even on max rolls (no trial's health is under the max roll total) aren't rolled one by one:
+# only their total matters then, and that's drawn from the normal approximation of a sum of rolls. So a long random
+# stretch (low barrel, lots of armor) costs about the same as a short one, only the shots where trials die are rolled.
+from collections import namedtuple
+import numpy as np
+from batch_engine import RAND_DMG_MIN, RAND_DMG_MAX
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+DEFAULT_TRIALS = 100000
+MAX_SHOTS = 1000 #trials still standing after this many shots count as not killed
+BLOCK_CELLS = 2 ** 22 #trials x shots sampled at once, caps memory at ~32MB of rolls
+SKIP_MIN_SHOTS = 16 #fewer safe shots than this are rolled one by one, the normal approximation is rough for short sums
+
+# shots: shots to kill per trial (MAX_SHOTS + 1 = not killed), histogram: (shot counts, number of trials)
+ShotsToKill = namedtuple('ShotsToKill', ['trials', 'shots', 'mean', 'percentiles', 'histogram', 'unkilled', 'random_shots'])
+
+def shot_plan(ap, damage, armor, hit_fraction, hp_no_penetration_penalty, max_shots=MAX_SHOTS):
+    # splits the shots into: `random` leading shots doing `roll_scale` * roll each, then `fixed` non-pen shots doing
+    # `fixed_damage` each, then penetrating shots doing `damage` each
+    loss = 0.6 * ap
+    if not np.isfinite(ap): #zero air resistance left, goes through anything
+        random_shots, fixed_shots = 0, 0
+    elif ap <= 0: #armor never goes down, every shot rolls
+        random_shots, fixed_shots = max_shots, 0
+    else:
+        # shot k (from 0) sees armor - k*loss. random while ap <= armor after the hit, penetrating once ap > armor before it
+        random_shots = int(np.clip(np.floor((armor - ap - loss) / loss) + 1, 0, max_shots))
+        pen_from = int(np.clip(np.floor((armor - ap) / loss) + 1, 0, max_shots)) if armor >= ap else 0
+        fixed_shots = max(pen_from - random_shots, 0)
+    roll_scale = 0.0025 * damage * hit_fraction / hp_no_penetration_penalty
+    return random_shots, roll_scale, fixed_shots, damage * hit_fraction
+
+def _tail_shots(health, fixed_shots, fixed_damage, pen_damage): #shots after the random stretch to take `health` off
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fixed_total = fixed_shots * fixed_damage
+        in_fixed = np.ceil(health / fixed_damage)
+        in_pen = fixed_shots + np.ceil((health - fixed_total) / pen_damage)
+        shots = np.where(health <= fixed_total, in_fixed, in_pen)
+    return np.where(health <= 0, 0, np.maximum(shots, 1)) #inf damage still takes a shot
+
+def _roll_totals(rng, shots, size): #sum of `shots` rolls for `size` trials, normal approximation rounded to whole rolls
+    mean = shots * (RAND_DMG_MIN + RAND_DMG_MAX) / 2
+    sd = np.sqrt(shots * ((RAND_DMG_MAX - RAND_DMG_MIN + 1) ** 2 - 1) / 12)
+    return np.clip(np.rint(rng.normal(mean, sd, size)), shots * RAND_DMG_MIN, shots * RAND_DMG_MAX)
+
+def simulate(ap, damage, armor, hit_fraction, hp_no_penetration_penalty, trials=DEFAULT_TRIALS, max_shots=MAX_SHOTS, seed=None):
+    # one scenario, scalar inputs (the same numbers stalker_armor_calc gets); returns ShotsToKill
+    rng = np.random.default_rng(seed)
+    random_shots, roll_scale, fixed_shots, fixed_damage = shot_plan(ap, damage, armor, hit_fraction, hp_no_penetration_penalty, max_shots)
+    health = np.ones(trials)
+    shots = np.zeros(trials, dtype=np.int64) #0 = still alive
+    alive = np.arange(trials)
+    done = 0
+    if roll_scale <= 0: #rolls can't do anything, skip straight past them
+        done = random_shots
+    while done < random_shots and len(alive):
+        safe = int(min(random_shots - done, np.ceil(health[alive].min() / (RAND_DMG_MAX * roll_scale)) - 1)) #nobody dies in these
+        if safe >= SKIP_MIN_SHOTS:
+            health[alive] -= _roll_totals(rng, safe, len(alive)) * roll_scale
+            done += safe
+            continue
+        block = int(min(random_shots - done, max(1, BLOCK_CELLS // len(alive))))
+        rolls = rng.integers(RAND_DMG_MIN, RAND_DMG_MAX + 1, size=(len(alive), block), dtype=np.int16)
+        dealt = np.cumsum(rolls, axis=1, dtype=np.float64) * roll_scale
+        killed = dealt >= health[alive, None]
+        hit = killed.any(axis=1)
+        shots[alive[hit]] = done + killed[hit].argmax(axis=1) + 1
+        health[alive] -= dealt[:, -1]
+        alive = alive[~hit]
+        done += block
+    if len(alive): #survived every random shot, the rest is deterministic
+        tail = _tail_shots(health[alive], fixed_shots, fixed_damage, damage)
+        shots[alive] = np.where(np.isfinite(tail), done + np.nan_to_num(tail, posinf=0), max_shots + 1)
+    shots = np.minimum(shots, max_shots + 1)
+    return summarize(shots, max_shots, random_shots)
+
+def summarize(shots, max_shots=MAX_SHOTS, random_shots=0):
+    values, counts = np.unique(shots, return_counts=True)
+    killed = shots <= max_shots
+    percentiles = dict(zip(PERCENTILES, np.percentile(shots, PERCENTILES, method='inverted_cdf').astype(int).tolist()))
+    return ShotsToKill(
+        trials=len(shots),
+        shots=shots,
+        mean=float(shots[killed].mean()) if killed.any() else float('inf'),
+        percentiles=percentiles,
+        histogram=(values, counts),
+        unkilled=int((~killed).sum()),
+        random_shots=random_shots
+    )
+
+def simulate_stalker(engine, weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer, armor_override=None,
+                     trials=DEFAULT_TRIALS, max_shots=MAX_SHOTS, seed=None):
+    # engine codes for one stalker scenario (see BatchEngine.encode), armor_override None/NaN = profile armor
+    args = (weapon, ammo, target, hitzone, faction, dist, barrel, difficulty, silencer)
+    armor = float(engine.stalker_armor_at(target, hitzone))
+    if armor_override is not None and not np.isnan(armor_override):
+        armor = float(armor_override)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ap = float(engine.stalker_ap(*args))
+        damage = float(engine.stalker_damage(*args))
+    return simulate(ap, damage, armor, float(engine.stalker_hit_fraction[target]), float(engine.hp_no_penetration_penalty[ammo]),
+                    trials=trials, max_shots=max_shots, seed=seed)
@@ -0,0 +1,80 @@
+# Id <-> display name index over weapons, ammo, mutants and stalkers
+# Built once at load. Id -> name and name -> ids are plain dict lookups. Names shared by several ids are
+# kept in `collisions`, and id_of() refuses to guess between them.
+# search() does the typeahead matching: prefix first, then word prefix, then substring, then close spellings.
+import bisect
+import difflib
+from types import MappingProxyType
+
+KINDS = ('weapon', 'ammo', 'mutant', 'stalker') #same order ids_df used to be concatenated in
+
+def _key(name): #case/whitespace-insensitive form used for matching
+    return ' '.join(str(name).casefold().split())
+
+class NameIndex:
+
+    def __init__(self, registry):
+        tables = dict(weapon=registry.weapons, ammo=registry.ammo, mutant=registry.mutants, stalker=registry.stalkers)
+        names, kinds, by_name = {}, {}, {}
+        for kind in KINDS:
+            for record in tables[kind]:
+                if record.id in names:
+                    raise ValueError('id {} is in both {} and {}'.format(record.id, kinds[record.id], kind))
+                names[record.id] = record.name
+                kinds[record.id] = kind
+                by_name.setdefault(record.name, []).append(record.id)
+        self.names = MappingProxyType(names)
+        self.kinds = MappingProxyType(kinds)
+        self.by_name = MappingProxyType({n: tuple(ids) for n, ids in by_name.items()})
+        self.collisions = MappingProxyType({n: ids for n, ids in self.by_name.items() if len(ids) > 1})
+        # sorted (match key, id) pairs for prefix search with bisect
+        self._keys = sorted((_key(n), i) for i, n in names.items())
+        self._key_list = [k for k, _ in self._keys]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, some_id):
+        return some_id in self.names
+
+    def name(self, some_id): #KeyError for unknown ids
+        return self.names[some_id]
+
+    def ids_of(self, name): #every id with this display name, empty if none
+        return self.by_name.get(name, ())
+
+    def id_of(self, name, kind=None):
+        # KeyError if nothing has this name, ValueError if several ids share it (narrow with kind=)
+        ids = self.ids_of(name)
+        if kind is not None:
+            ids = tuple(i for i in ids if self.kinds[i] == kind)
+        if not ids:
+            raise KeyError(name)
+        if len(ids) > 1:
+            raise ValueError('{} is the name of {}'.format(name, ', '.join(ids)))
+        return ids[0]
+
+    def search(self, query, kind=None, limit=10):
+        # returns [{'id', 'name', 'kind'}] best match first
+        query = _key(query)
+        if not query:
+            return []
+        found = []
+        seen = set()
+        def add(ids):
+            for i in ids:
+                if i in seen or (kind is not None and self.kinds[i] != kind):
+                    continue
+                seen.add(i)
+                found.append(i)
+        start = bisect.bisect_left(self._key_list, query) #whole-name prefix, already in alphabetical order
+        end = start
+        while end < len(self._keys) and self._key_list[end].startswith(query):
+            end += 1
+        add(i for _, i in self._keys[start:end])
+        add(i for k, i in self._keys if any(word.startswith(query) for word in k.split()))
+        add(i for k, i in self._keys if query in k)
+        if len(found) < limit: #nothing literal left, try misspellings
+            close = difflib.get_close_matches(query, self._key_list, n=limit, cutoff=0.6)
+            add(i for c in close for k, i in self._keys if k == c)
+        return [{'id': i, 'name': self.names[i], 'kind': self.kinds[i]} for i in found[:limit]]
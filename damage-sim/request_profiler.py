@@ -0,0 +1,118 @@
+# Opt-in cProfile dumps for slow requests
+# Off unless GAMMA_PROFILE=1. Once on, a request gets profiled if it asks for it (X-Gamma-Profile: 1 header, or
+# ?profile=1 on the request or on the page that sent it, so opening the dashboard with ?profile=1 profiles its
+# callbacks), or at random with probability GAMMA_PROFILE_RATE (default 0, i.e. only on request).
+# Only Dash callback requests and /api/ routes are profiled. Each one writes <name>.prof (pstats, open with
+# python -m pstats or snakeviz) and <name>.json (endpoint, duration, status, and the scenario inputs) to
+# GAMMA_PROFILE_DIR; only the newest GAMMA_PROFILE_KEEP pairs are kept.
+import cProfile
+import json
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ENABLED = os.environ.get('GAMMA_PROFILE', '0') == '1'
+SAMPLE_RATE = float(os.environ.get('GAMMA_PROFILE_RATE', 0))
+PROFILE_DIR = os.environ.get('GAMMA_PROFILE_DIR', os.path.join(SIM_DIR, 'profiles'))
+KEEP = int(os.environ.get('GAMMA_PROFILE_KEEP', 50))
+FLAG_VALUES = ('1', 'true', 'yes')
+
+def _flagged(value):
+    return value is not None and value.lower() in FLAG_VALUES
+
+def request_scenario(request): #what the request was computing, for the sidecar json
+    body = request.get_json(silent=True)
+    if request.path.endswith('_dash-update-component') and isinstance(body, dict):
+        values = {}
+        for item in body.get('inputs', []) + body.get('state', []):
+            if isinstance(item, dict) and 'id' in item:
+                values[item['id'] if isinstance(item['id'], str) else json.dumps(item['id'])] = item.get('value')
+        return {'output': body.get('output'), 'values': values}
+    if isinstance(body, dict) and isinstance(body.get('scenarios'), list):
+        return {'scenarios': len(body['scenarios']), 'first': body['scenarios'][0] if body['scenarios'] else None}
+    return {'args': request.args.to_dict()}
+
+class RequestProfiler:
+
+    def __init__(self, enabled=ENABLED, rate=SAMPLE_RATE, directory=PROFILE_DIR, keep=KEEP):
+        self.enabled = enabled
+        self.rate = rate
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock() #cProfile can only run one profile at a time, and rotation shouldn't race
+
+    def wanted(self, request):
+        if not (request.path.endswith('_dash-update-component') or request.path.startswith('/api/')):
+            return False
+        if _flagged(request.headers.get('X-Gamma-Profile')) or _flagged(request.args.get('profile')):
+            return True
+        if request.referrer and any(_flagged(v) for v in parse_qs(urlparse(request.referrer).query).get('profile', [])):
+            return True
+        return self.rate > 0 and random.random() < self.rate
+
+    def start(self):
+        if not self._lock.acquire(blocking=False): #another request is being profiled, skip this one
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError: #something else (a debugger, another profiler) is already hooked in
+            self._lock.release()
+            return None
+        return profile
+
+    def finish(self, profile, request, status, seconds):
+        profile.disable()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            endpoint = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+            name = '{}_{:06d}_{}'.format(time.strftime('%Y%m%d-%H%M%S'), int(time.time() * 1e6) % 1000000, endpoint)
+            path = os.path.join(self.directory, name)
+            profile.dump_stats(path + '.prof')
+            with open(path + '.json', 'w') as f:
+                json.dump({'path': request.path, 'status': status, 'seconds': seconds, 'scenario': request_scenario(request)},
+                          f, indent=2, default=str)
+            self.rotate()
+        except OSError as e:
+            print('Error: could not write request profile: {}'.format(e))
+        finally:
+            self._lock.release()
+
+    def rotate(self): #drop the oldest profiles past self.keep
+        profiles = sorted(f for f in os.listdir(self.directory) if f.endswith('.prof'))
+        for old in profiles[:max(0, len(profiles) - self.keep)]:
+            for ext in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, old[:-len('.prof')] + ext))
+                except FileNotFoundError:
+                    pass
+
+    def install(self, server): #profiling hooks on a Flask server
+        if not self.enabled:
+            return
+        from flask import request, g
+
+        @server.before_request
+        def _start_profile():
+            if self.wanted(request):
+                g.profile = self.start()
+                g.profile_start = time.perf_counter()
+
+        @server.after_request
+        def _stop_profile(response):
+            profile = g.pop('profile', None)
+            if profile is not None:
+                self.finish(profile, request, response.status_code, time.perf_counter() - g.pop('profile_start'))
+            return response
+
+        @server.teardown_request
+        def _drop_profile(exc): #request blew up before after_request, still save what we have
+            profile = g.pop('profile', None)
+            if profile is not None:
+                self.finish(profile, request, 500, time.perf_counter() - g.pop('profile_start'))
+
+profiler = RequestProfiler() #process-wide instance
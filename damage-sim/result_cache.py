@@ -0,0 +1,143 @@
+# Memo cache for Calculate results
+# Keys are the normalized scenario tuple plus the data hash, so a new data snapshot never serves old numbers
+# (reset() drops the old entries too). Local entries are a bounded LRU per process. With a SqliteStore, workers share
+# results through a local sqlite file as well: a local miss checks the file before computing, and new results
+# are written to both. hits/misses/shared_hits/evictions are counted for the stats endpoint.
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_SIZE = int(os.environ.get('GAMMA_RESULT_CACHE_SIZE', 2048)) #0 turns caching off
+SHARED_DB = os.environ.get('GAMMA_RESULT_CACHE_DB') #path to a sqlite file shared by all workers, unset = local only
+
+def scenario_key(show_override, armor_override, scale_display, weapon, bullet, target, hitzone, faction, dist, barrel, game_difficulty, silencer):
+    # same inputs as the Calculate form -> hashable tuple where equivalent inputs compare equal
+    is_stalker = target.find('stalker') != -1
+    armor_override = float(armor_override) if show_override == True and armor_override is not None else None
+    return (weapon, bullet, target, hitzone, faction if is_stalker else 'other', float(dist), float(barrel), game_difficulty,
+            bool(silencer), armor_override, scale_display == True)
+
+class SqliteStore:
+    # key/value table in a sqlite file, values pickled. max_rows bounds the file, oldest writes go first
+
+    def __init__(self, path, max_rows=100000):
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn, self._pid = None, None
+        self._db().execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, data_hash TEXT, value BLOB, used REAL)')
+
+    def _db(self): #one connection per process, sqlite connections don't survive a fork
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL') #readers don't block the writer, several processes can share it
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key, data_hash):
+        with self._lock:
+            try:
+                row = self._db().execute('SELECT value FROM results WHERE key = ? AND data_hash = ?', (key, data_hash)).fetchone()
+            except sqlite3.Error as e:
+                print('Error: result cache read failed: {}'.format(e))
+                return None
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, key, data_hash, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            try:
+                self._db().execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, data_hash, blob, time.time()))
+                self._writes += 1
+                if self._writes % 500 == 0: #trim now and then, not on every write
+                    self._db().execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                                       (self.max_rows,))
+            except sqlite3.Error as e:
+                print('Error: result cache write failed: {}'.format(e))
+
+    def drop_other(self, data_hash): #removes results computed from any other data
+        with self._lock:
+            try:
+                self._db().execute('DELETE FROM results WHERE data_hash != ?', (data_hash,))
+            except sqlite3.Error as e:
+                print('Error: result cache cleanup failed: {}'.format(e))
+
+class ResultCache:
+
+    def __init__(self, data_hash, maxsize=DEFAULT_SIZE, shared=None):
+        self.data_hash = data_hash
+        self.maxsize = maxsize
+        self.shared = shared
+        self._entries = OrderedDict() #key -> value, most recent last
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.shared_hits = self.evictions = 0
+        if shared is not None:
+            shared.drop_other(data_hash)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, key, compute, data_hash=None): #cached value for key, or compute() and remember it
+        # data_hash: the data compute() will use, if it's not the cache's current data the result isn't cached
+        if self.maxsize <= 0 or (data_hash is not None and data_hash != self.data_hash):
+            return compute()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            data_hash = self.data_hash
+        value = None
+        if self.shared is not None:
+            value = self.shared.get(repr(key), data_hash)
+        with self._lock:
+            if value is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+        if value is None:
+            value = compute()
+            if self.shared is not None:
+                self.shared.put(repr(key), data_hash, value)
+        with self._lock:
+            if data_hash == self.data_hash: #data didn't get swapped out while computing
+                self._entries[key] = value
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def reset(self, data_hash): #new data snapshot: forget everything computed from the old one
+        with self._lock:
+            self.data_hash = data_hash
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.drop_other(data_hash)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else None,
+                'shared': self.shared.path if self.shared is not None else None,
+                'data_hash': self.data_hash
+            }
+
+def make_cache(data_hash, maxsize=DEFAULT_SIZE, shared_db=SHARED_DB): #ResultCache from the environment settings
+    shared = None
+    if shared_db:
+        try:
+            shared = SqliteStore(shared_db)
+        except sqlite3.Error as e:
+            print('Error: could not open shared result cache {}: {}'.format(shared_db, e))
+    return ResultCache(data_hash, maxsize, shared)
@@ -0,0 +1,107 @@
+# Bulk scenario evaluation for the JSON API
+# Takes a list of scenario dicts (same fields as the Calculate form), checks them, splits them into stalker and
+# mutant groups and runs each group through the batch engine in one call. Bad scenarios get an error entry
+# in their slot instead of failing the whole request.
+import math
+import numpy as np
+from batch_engine import hitzones_stalkers, hitzones_mutants, difficulties, factions
+
+# barrel is a percentage like the form slider, armor_override None = use the profile's armor
+SCENARIO_DEFAULTS = dict(faction='other', dist=0, barrel=100, game_difficulty='hard', silencer=False, armor_override=None)
+SCENARIO_FIELDS = ('weapon', 'bullet', 'target', 'hitzone', 'faction', 'dist', 'barrel', 'game_difficulty', 'silencer', 'armor_override')
+RESULT_FIELDS = ('penetrated', 'random_damage', 'damage', 'min_damage', 'max_damage', 'pen_damage', 'new_armor',
+                 'shots_to_pen', 'ttk', 'ttk_min', 'ttk_max', 'travel_time', 'ttk_seconds', 'one_mag')
+
+def _number(value, name, low, high):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError('{} must be a number'.format(name))
+    if not low <= value <= high:
+        raise ValueError('{} must be between {} and {}'.format(name, low, high))
+    return float(value)
+
+def _bool(value, name): #true/false, or 0/1 - bool() would make the string "false" true
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    raise ValueError('{} must be true or false'.format(name))
+
+def normalize_scenario(registry, scenario): #fills in defaults and checks every field, raises ValueError on bad input
+    if not isinstance(scenario, dict):
+        raise ValueError('scenario must be an object')
+    unknown = set(scenario) - set(SCENARIO_FIELDS)
+    if unknown:
+        raise ValueError('unknown fields: {}'.format(', '.join(sorted(unknown))))
+    sc = dict(SCENARIO_DEFAULTS, **scenario)
+    for key in ('weapon', 'bullet', 'target', 'hitzone'):
+        if key not in sc:
+            raise ValueError('missing {}'.format(key))
+        if not isinstance(sc[key], str): #a list/object id would blow up the registry lookups with a TypeError
+            raise ValueError('{} must be a string'.format(key))
+    if sc['weapon'] not in registry.weapons:
+        raise ValueError('unknown weapon: {}'.format(sc['weapon']))
+    if sc['bullet'] not in registry.ammo:
+        raise ValueError('unknown bullet: {}'.format(sc['bullet']))
+    if not isinstance(sc['faction'], str) or not isinstance(sc['game_difficulty'], str):
+        raise ValueError('faction and game_difficulty must be strings')
+    if sc['faction'] not in factions: #the engine would quietly read an unknown faction as 'other'
+        raise ValueError('faction must be one of {}'.format(', '.join(factions)))
+    if sc['target'] in registry.stalkers:
+        kind, zones = 'stalker', hitzones_stalkers
+    elif sc['target'] in registry.mutants:
+        kind, zones = 'mutant', hitzones_mutants
+        sc['faction'] = 'other' #mutants don't have factions
+    else:
+        raise ValueError('unknown target: {}'.format(sc['target']))
+    if sc['hitzone'] not in zones:
+        raise ValueError('hitzone must be one of {}'.format(', '.join(zones)))
+    if sc['game_difficulty'] not in difficulties:
+        raise ValueError('game_difficulty must be one of {}'.format(', '.join(difficulties)))
+    sc['dist'] = _number(sc['dist'], 'dist', 0, 300)
+    sc['barrel'] = _number(sc['barrel'], 'barrel', 0, 100)
+    sc['silencer'] = _bool(sc['silencer'], 'silencer')
+    if sc['armor_override'] is not None:
+        sc['armor_override'] = _number(sc['armor_override'], 'armor_override', 0, 1)
+    return kind, sc
+
+def _json_number(value): #inf/nan aren't valid json, they mean "can't kill" here
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def evaluate_scenarios(engine, scenarios): #list of scenario dicts -> list of result dicts, same order
+    results = [None] * len(scenarios)
+    groups = {'stalker': [], 'mutant': []}
+    for i, scenario in enumerate(scenarios):
+        try:
+            kind, sc = normalize_scenario(engine.registry, scenario)
+        except ValueError as e:
+            results[i] = {'error': str(e)}
+            continue
+        groups[kind].append((i, sc))
+
+    for kind, items in groups.items():
+        if not items:
+            continue
+        columns = {key: [sc[key] for _, sc in items] for key in SCENARIO_FIELDS}
+        columns['barrel'] = [b / 100 for b in columns['barrel']]
+        armor_override = np.array([np.nan if a is None else a for a in columns['armor_override']], dtype=float)
+        result = engine.evaluate(kind, *engine.encode(columns, kind), armor_override=armor_override)
+        values = result_values(result)
+        for j, (i, _) in enumerate(items):
+            results[i] = result_row(values, j)
+    return results
+
+def result_values(result): #HitResult -> {field: flat list}, for result_row
+    return {field: np.ravel(getattr(result, field)).tolist() for field in RESULT_FIELDS}
+
+def result_row(values, j): #json-ready dict for entry j, shot counts as ints
+    row = {field: _json_number(values[field][j]) for field in RESULT_FIELDS}
+    for field in ('shots_to_pen', 'ttk', 'ttk_min', 'ttk_max'):
+        if row[field] is not None:
+            row[field] = int(row[field])
+    return row
+
+def iter_evaluate_scenarios(engine, scenarios, chunk_size=5000): #same as above, a chunk at a time, for streaming
+    for start in range(0, len(scenarios), chunk_size):
+        yield from evaluate_scenarios(engine, scenarios[start:start + chunk_size])
@@ -0,0 +1,92 @@
+# Data loading for the damage sim
+# Reads the bundled csvs in damage-sim/src by default and keeps a compiled snapshot on disk,
+# keyed by a hash of the csv contents, so restarts don't have to parse anything.
+# Set GAMMA_SIM_SOURCE=remote (or pass source='remote') to pull the csvs from Github instead.
+import os, hashlib, pickle, tempfile
+from collections import namedtuple
+import pandas as pd
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(SIM_DIR, 'src')
+REMOTE_URL = 'https://raw.githubusercontent.com/veerserif/gamma-dashboard/main/damage-sim/src/'
+CACHE_DIR = os.environ.get('GAMMA_SIM_CACHE', os.path.join(SIM_DIR, '.cache'))
+SNAPSHOT_VERSION = 1 #bump if the snapshot layout or the read options below change
+
+# table name: (file, read_csv options)
+TABLE_FILES = {
+    'weapons': ('weapons.csv', dict(index_col=0)),
+    'ammo': ('ammo.csv', dict(index_col=0, skiprows=[1,2,3,4,5,6,7,8])), #skip defaults + knives
+    'stalkers': ('curated_npc_profiles.csv', dict(index_col=0)),
+    'mutants': ('mutants.csv', dict(index_col=0, skiprows=[1])) #skip m_DEFAULT
+}
+
+SimTables = namedtuple('SimTables', ['weapons', 'ammo', 'stalkers', 'mutants', 'data_hash', 'source'])
+
+def source_paths(src_dir=SRC_DIR): #csv path per table
+    return {name: os.path.join(src_dir, f[0]) for name, f in TABLE_FILES.items()}
+
+def hash_sources(src_dir=SRC_DIR): #one hash over all four csvs, in table order
+    h = hashlib.sha256()
+    h.update(str(SNAPSHOT_VERSION).encode())
+    for name, path in source_paths(src_dir).items():
+        with open(path, 'rb') as f:
+            h.update(name.encode())
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+def parse_csvs(location): #location is a directory or a url prefix
+    tables = {}
+    for name, (filename, options) in TABLE_FILES.items():
+        if location.startswith('http'):
+            path = location + filename
+        else:
+            path = os.path.join(location, filename)
+        tables[name] = pd.read_csv(path, **options)
+    return tables
+
+def snapshot_path(data_hash, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, 'sim_tables_{}.pkl'.format(data_hash))
+
+def read_snapshot(data_hash, cache_dir=CACHE_DIR): #returns dict of tables, or None if there's no usable snapshot
+    path = snapshot_path(data_hash, cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('data_hash') != data_hash:
+        return None
+    return snapshot['tables']
+
+def write_snapshot(tables, data_hash, cache_dir=CACHE_DIR): #atomic write, then clear out stale snapshots
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'version': SNAPSHOT_VERSION, 'data_hash': data_hash, 'tables': tables}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path(data_hash, cache_dir))
+    except OSError as e: #read-only deploys still work, they just parse every time
+        print('Warning: could not write data snapshot ({})'.format(e))
+        return
+    for filename in os.listdir(cache_dir):
+        if filename.startswith('sim_tables_') and filename != os.path.basename(snapshot_path(data_hash, cache_dir)):
+            try:
+                os.remove(os.path.join(cache_dir, filename))
+            except OSError:
+                pass
+
+def load_tables(source=None, src_dir=SRC_DIR, cache_dir=CACHE_DIR):
+    if source is None:
+        source = os.environ.get('GAMMA_SIM_SOURCE', 'local')
+    if source == 'remote': #explicit opt-in, always re-downloads
+        tables = parse_csvs(REMOTE_URL)
+        return SimTables(data_hash=None, source='remote', **tables)
+    elif source != 'local':
+        raise ValueError('Unknown data source: {}'.format(source))
+
+    data_hash = hash_sources(src_dir)
+    tables = read_snapshot(data_hash, cache_dir)
+    if tables is None:
+        tables = parse_csvs(src_dir)
+        write_snapshot(tables, data_hash, cache_dir)
+    return SimTables(data_hash=data_hash, source='local', **tables)
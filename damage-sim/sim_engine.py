@@ -0,0 +1,306 @@
+# Damage sim engine, no Dash in here
+# Loads the data tables and indexes and defines the damage functions that the app's callbacks, the JSON API and
+# scripts (bench, sweeps, guides) all use. Importing this only needs numpy/pandas and takes a few tens of ms with a
+# warm snapshot. The best-loadout leaderboard costs a few hundred ms to precompute, so it's built on first get_leaderboard().
+# Servers that fork (gunicorn --preload) should load this, and call get_leaderboard(), in the parent so workers share it.
+import contextvars
+import threading
+from contextlib import contextmanager
+import numpy as np
+from sim_data import load_tables
+from stat_registry import build_registry
+from caliber_index import CaliberIndex
+from weapon_catalog import load_catalog, combined_hash
+from name_index import NameIndex
+import batch_engine
+from leaderboard import Leaderboard
+import monte_carlo
+import breakpoints
+from batch_engine import BatchEngine, INPUT_KEYS, scalar_result, legmeta, hitzones_mutants, hitzones_stalkers, faction_res_table
+
+# Incorporate data
+# Reads local csvs via a cached snapshot; GAMMA_SIM_SOURCE=remote pulls them from Github instead
+# Everything built from one version of the csvs lives on a DataSnapshot. reload_data() builds a new one and swaps
+# it in with a single assignment; code that needs several lookups to agree (a whole callback) pins the snapshot
+# it started with, see pin()/pinned(). sim_engine.engine, sim_engine.stats etc. still work and follow the current one.
+SNAPSHOT_FIELDS = ('sim_tables', 'weapons_df', 'ammo_df', 'stalkers_df', 'mutants_df', 'stats', 'catalog', 'engine', 'calibers', 'names')
+
+class DataSnapshot:
+
+    def __init__(self, sim_tables):
+        self.sim_tables = sim_tables
+        self.weapons_df = sim_tables.weapons
+        self.ammo_df = sim_tables.ammo
+        self.stalkers_df = sim_tables.stalkers
+        self.mutants_df = sim_tables.mutants
+        self.stats = build_registry(sim_tables) #read-only stat records, use this instead of df.loc in the engine
+        self.catalog = load_catalog(self.stats) #fire rate, mag size, muzzle velocity from the items database, by weapon id
+        self.data_hash = combined_hash(sim_tables.data_hash, self.catalog) #sim csvs + items csv, what the result caches key on
+        self.engine = BatchEngine(self.stats, self.catalog) #vectorized maths, the scalar damage functions below wrap this
+        self.calibers = CaliberIndex(self.stats) #weapon -> compatible ammo ids and prebuilt dropdown options
+        self.names = NameIndex(self.stats) #id <-> name lookups and name search, duplicate names are in names.collisions
+        self._leaderboard = None
+        self._leaderboard_lock = threading.Lock()
+
+    def leaderboard(self): #precomputed best-loadout table, default difficulty/faction is filled in when it's built, the rest on first use
+        with self._leaderboard_lock:
+            if self._leaderboard is None:
+                self._leaderboard = Leaderboard(self.engine, self.calibers.compatible)
+            return self._leaderboard
+
+    def has_leaderboard(self):
+        return self._leaderboard is not None
+
+_current = DataSnapshot(load_tables())
+_pinned = contextvars.ContextVar('sim_snapshot', default=None)
+_swap_lock = threading.Lock()
+_swap_listeners = []
+
+def snapshot(): #the pinned snapshot if there is one, else the current one
+    return _pinned.get() or _current
+
+def pin(): #holds on to the current snapshot for this thread/context until unpin(token)
+    return _pinned.set(_current)
+
+def unpin(token):
+    _pinned.reset(token)
+
+@contextmanager
+def pinned():
+    token = pin()
+    try:
+        yield _pinned.get()
+    finally:
+        unpin(token)
+
+def on_swap(listener): #listener(old, new) runs right after a new snapshot is swapped in, for caches built from the old one
+    _swap_listeners.append(listener)
+    return listener
+
+def reload_data(source=None, force=False): #rebuilds everything from the csvs; returns the new snapshot, or None if nothing changed
+    global _current
+    tables = load_tables(source)
+    old = _current
+    if not force and tables.data_hash is not None and tables.data_hash == old.sim_tables.data_hash:
+        if combined_hash(tables.data_hash, load_catalog(old.stats)) == old.data_hash: #same tables, so only the items csv can differ
+            return None
+    new = DataSnapshot(tables)
+    if old.has_leaderboard(): #build it before the swap, so no request waits on it
+        new.leaderboard()
+    with _swap_lock:
+        _current = new
+        for listener in _swap_listeners:
+            listener(old, new)
+    return new
+
+def __getattr__(name): #sim_engine.engine & co. resolve against the snapshot
+    if name in SNAPSHOT_FIELDS:
+        return getattr(snapshot(), name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+# # # # # # # # # # # # # # # # # # # #
+# Damage sim functions
+# # # # # # # # # # # # # # # # # # # #
+
+def get_name(some_id): #gets name from namecol if it exists
+    return snapshot().names.name(some_id)
+
+def get_id(some_name, kind=None): #gets id from name, kind narrows it down when several things share a name
+    try:
+        return snapshot().names.id_of(some_name, kind)
+    except KeyError:
+        print('Error: no id for name {}'.format(some_name))
+        return
+    except ValueError as e:
+        print('Error: {}'.format(e))
+        return
+
+def compatible_ammo(weapon): #returns list of allowable ammos for the weapon, exceptions like 12ga live in caliber_index.FAMILY_OVERRIDES
+    return snapshot().calibers.compatible(weapon)
+
+def get_wpn_hit_power(weapon): #takes some string that we will match to weapon ID
+    wpn_name = str(weapon) # we convert to string
+    hit_power = 0.0
+    try:
+        hit_power = float(snapshot().stats.weapons[wpn_name].hit_power)
+    except (TypeError, KeyError):
+        print('Error: bad input wpn name')
+        return
+    return hit_power
+
+def get_ammo_stats(ammo): #we want k_hit, k_ap, air_res, ammo_mult_mutant, ammo_mult_gigant, ammo_mult_stalker, hp_no_pen, pellets
+    ammo_name = str(ammo)
+    try:
+        ammo_s = snapshot().stats.ammo[ammo_name]
+    except (TypeError, KeyError):
+        print('Error: bad input ammo name')
+        return
+    return ammo_s
+
+def get_npc_stats(npc): #see above but npcs version
+    npc_id = str(npc)
+    try:
+        npc_data = snapshot().stats.stalkers[npc_id]
+    except (TypeError, KeyError):
+        print('Error: bad input stalker profile')
+        return
+    return npc_data
+
+def get_mutant_stats(mutant): #clone of npc function
+    mutant_id = str(mutant)
+    try:
+        mutant_data = snapshot().stats.mutants[mutant_id]
+    except (TypeError, KeyError):
+        print('Error: bad input mutant profile')
+        return
+    return mutant_data
+
+def is_wpn_silenced(weapon, silenced=False):
+    wpn_name = str(weapon)
+    silenced = bool(silenced) #whether or not there's an additional silencer
+    if silenced == False:
+        try:
+            silenced = snapshot().stats.weapons[wpn_name].integrated_silencer
+            return silenced #always returns True if there's an integrated silencer
+        except (TypeError, KeyError):
+            print('Bad input, silenced status')
+            return
+    else:
+        return silenced
+
+def get_armor(target, hitzone="torso"): #args: target (str), id of mutant/stalker; hitzone, area hit, opt
+    armor = 0.0
+    bodyzone = [ "torso", "arms", "legs"]
+    stats = snapshot().stats
+    if target.find('stalker') == -1: #if target is not a stalker
+        armor = stats.mutants[target].skin_armor
+        return armor
+    elif hitzone in bodyzone: #body shot
+        armor = stats.stalkers[target].body_bonearmor
+        return armor
+    elif hitzone == "head":
+        armor = stats.stalkers[target].head_bonearmor
+        return armor
+    else:
+        return armor
+    return
+
+# Damage sub-functions
+
+def barrel_cond(barrel): #takes a float
+    barrel_health = float(barrel)
+    barrel_corrected = 0.0
+    try:
+        barrel_corrected = ( 130 - ( 1.12 * barrel_health ) ) * ( barrel_health * 1.12 ) / 100
+        if barrel_corrected < 1:
+            return barrel_corrected
+        else:
+            return 1.0
+    except TypeError:
+        print('Error: bad barrel cond input')
+        return
+    return
+
+def stalker_legs_ap(weapon, bullet): #leg-specific AP boosts; only call if target is lowerbody
+    buckshot = ["ammo_12x70_buck", "ammo_20x70_buck", "ammo_23x75_shrapnel"]
+    base_ap = get_ammo_stats(bullet)['k_ap'] * 10
+    final_ap = 0.0
+    if bullet in buckshot:
+        final_ap = base_ap + 0.013
+        return final_ap
+    elif (weapon in legmeta) or (bullet in legmeta):
+        final_ap = base_ap
+        return final_ap
+    else:
+        final_ap = base_ap + 0.075
+        return final_ap
+
+def npc_faction_res(faction): #per-faction resistances
+    faction_res = faction_res_table.get(faction, faction_res_table['other'])
+    return dict(faction_res) #isg_res = ap res, sin_res = dmg res
+
+def get_stalkerhit_ap(input_array):
+    # Array parsing
+    input_dict = dict(zip(INPUT_KEYS, input_array))
+    engine = snapshot().engine
+    return float(engine.stalker_ap(*engine.encode(input_dict)))
+
+def stalker_hit_tuple(hit): #one StalkerHit from the batch engine -> old-style result tuple
+    if hit.penetrated:
+        return True, float(hit.new_armor), float(hit.damage)
+    elif hit.random_damage: #random damage, avg/min/max
+        return False, float(hit.new_armor), float(hit.damage), float(hit.min_damage), float(hit.max_damage)
+    else:
+        return False, float(hit.new_armor), float(hit.damage)
+
+# Actual damage functions
+
+def mutant_hit(input_array):
+    input_dict = dict(zip(INPUT_KEYS, input_array))
+    engine = snapshot().engine
+    return float(engine.mutant_hit(*engine.encode(input_dict, 'mutant')))
+
+def stalker_armor_calc(ap, dmg, bone_armor, hit_fraction, hp_no_penetration_penalty):
+    return stalker_hit_tuple(batch_engine.stalker_armor_calc(ap, dmg, bone_armor, hit_fraction, hp_no_penetration_penalty))
+
+def evaluate_hit(input_array, armor_override=None): #single pass: AP, damage, shots to pen and TTK for one shot, as a HitResult
+    input_dict = dict(zip(INPUT_KEYS, input_array))
+    engine = snapshot().engine
+    kind = 'mutant' if input_dict['target'].find('stalker') == -1 else 'stalker'
+    result = engine.evaluate(kind, *engine.encode(input_dict, kind), armor_override=armor_override)
+    return scalar_result(result)
+
+def shots_to_pen(input_array): #how many shots needed to destroy armor at hitzone
+    return evaluate_hit(input_array).shots_to_pen
+
+def stalker_hit(input_array, bone_armor = None): #bone_armor allows passing of a new armor value
+    # Array parsing
+    input_dict = dict(zip(INPUT_KEYS, input_array))
+    engine = snapshot().engine
+    return stalker_hit_tuple(engine.stalker_hit(*engine.encode(input_dict), bone_armor=bone_armor))
+
+def anomaly_engine_pen(gbo_dmg, bullet, target, hitzone, armor_override=None): #how the engine handles pen or non-pen hits
+    snap = snapshot()
+    stats, engine = snap.stats, snap.engine
+    if target.find('stalker') == -1: #if not NPC
+        kind, target_code, hitzone_code = 'mutant', stats.mutants.idx_of(target), hitzones_mutants.index(hitzone)
+    else:
+        kind, target_code, hitzone_code = 'stalker', stats.stalkers.idx_of(target), hitzones_stalkers.index(hitzone)
+    is_pen, final_dmg = engine.anomaly_engine_pen(gbo_dmg, stats.ammo.idx_of(bullet), target_code, hitzone_code, armor_override, kind)
+    return bool(is_pen), float(final_dmg)
+
+# Curves over the whole distance (and optionally barrel) range, one engine call for all of it
+CURVE_DISTANCES = np.arange(0, 301)
+CURVE_BARRELS = np.arange(0, 101)
+
+def hit_curves(input_array, armor_override=None, vary_barrel=False): #HitResult arrays shaped (barrel, distance)
+    input_dict = dict(zip(INPUT_KEYS, input_array))
+    engine = snapshot().engine
+    kind = 'mutant' if input_dict['target'].find('stalker') == -1 else 'stalker'
+    input_dict['dist'] = CURVE_DISTANCES[None, :]
+    if vary_barrel:
+        input_dict['barrel'] = (CURVE_BARRELS / 100)[:, None]
+    else:
+        input_dict['barrel'] = np.full((1, 1), input_dict['barrel'])
+    return engine.evaluate(kind, *engine.encode(input_dict, kind), armor_override=armor_override)
+
+def time_to_kill(input_array): #shots to kill, (avg, min, max) - all the same unless random damage is in play
+    result = evaluate_hit(input_array)
+    return result.ttk, result.ttk_min, result.ttk_max
+
+def simulate_ttk(input_array, armor_override=None, trials=monte_carlo.DEFAULT_TRIALS, seed=None): #stalkers only, shot-by-shot random rolls -> monte_carlo.ShotsToKill
+    input_dict = dict(zip(INPUT_KEYS, input_array))
+    engine = snapshot().engine
+    return monte_carlo.simulate_stalker(engine, *engine.encode(input_dict), armor_override=armor_override, trials=trials, seed=seed)
+
+def ttk_breakpoints(input_array, axis='dist', armor_override=None, max_shots=breakpoints.MAX_SHOTS): #piecewise shots to kill over dist/barrel/armor, see breakpoints.py
+    scenario = dict(zip(INPUT_KEYS, input_array), armor_override=armor_override)
+    scenario['barrel'] = scenario['barrel'] * 100 #scenarios take barrel as a percentage
+    result = breakpoints.solve_breakpoints(snapshot().engine, [scenario], axis, max_shots=max_shots)[0]
+    if 'error' in result:
+        print('Error: bad breakpoint input: {}'.format(result['error']))
+        return
+    return result['segments']
+
+def get_leaderboard(): #best-loadout table for the snapshot in use
+    return snapshot().leaderboard()
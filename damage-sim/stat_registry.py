@@ -0,0 +1,137 @@
+# Precompiled stat index for weapons, ammo, stalker profiles and mutants
+# Built once from the loaded tables. Every row becomes a small read-only record with an integer id,
+# and each table also keeps read-only numpy columns (same row order) for batched maths.
+# Nothing in here can be modified after it's built, so one registry can be shared between threads.
+from types import MappingProxyType
+
+class StatRecord: #base class, one row of a table
+    __slots__ = ('id', 'idx')
+    fields = ()
+
+    def __init__(self, id, idx, **values):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'idx', idx)
+        for field in self.fields:
+            object.__setattr__(self, field, values[field])
+
+    def __setattr__(self, key, value):
+        raise AttributeError('stat records are read-only')
+
+    def __delattr__(self, key):
+        raise AttributeError('stat records are read-only')
+
+    def __getitem__(self, key): #dict-style access, so old ammo['k_ap'] style code keeps working
+        if key in self.fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def get(self, key, default=None):
+        if key in self.fields:
+            return getattr(self, key)
+        return default
+
+    def as_dict(self): #same shape as the old df.loc[some_id][1:].to_dict(), i.e. no name
+        return {field: getattr(self, field) for field in self.fields[1:]}
+
+    def __repr__(self):
+        return '{}({!r}, {})'.format(type(self).__name__, self.id, ', '.join('{}={!r}'.format(f, getattr(self, f)) for f in self.fields))
+
+class WeaponStats(StatRecord):
+    fields = ('name', 'hit_power', 'ammo_type', 'integrated_silencer')
+    __slots__ = fields
+
+class AmmoStats(StatRecord):
+    fields = ('name', 'k_hit', 'k_ap', 'air_res', 'ammo_mult_mutant', 'gigant_ammo_mult', 'ammo_mult_stalker', 'hp_no_penetration_penalty', 'pellets')
+    __slots__ = fields
+
+class StalkerStats(StatRecord):
+    fields = ('name', 'hit_fraction', 'ap_scale', 'body_bonearmor', 'head_bonearmor')
+    __slots__ = fields
+
+class MutantStats(StatRecord):
+    fields = ('name', 'mutant_mult', 'spec_mutant_mult', 'crit_zone', 'crit_hit', 'head', 'torso', 'limbs', 'rear', 'other',
+              'skin_armor', 'hit_fraction', 'fire_wound_immunity', 'zombie_modifier')
+    __slots__ = fields
+
+class StatTable: #records in csv order + id -> integer index map + numeric columns
+    __slots__ = ('record_type', 'records', 'index', 'columns')
+
+    def __init__(self, record_type, df):
+        missing = [f for f in record_type.fields if f not in df.columns]
+        if missing:
+            raise ValueError('{} table is missing columns: {}'.format(record_type.__name__, missing))
+        if not df.index.is_unique:
+            raise ValueError('{} table has duplicate ids: {}'.format(record_type.__name__, list(df.index[df.index.duplicated()])))
+        values = {f: df[f].tolist() for f in record_type.fields} #tolist gives plain python scalars
+        records = tuple(
+            record_type(some_id, i, **{f: values[f][i] for f in record_type.fields})
+            for i, some_id in enumerate(df.index.tolist())
+        )
+        columns = {}
+        for f in record_type.fields:
+            if df[f].dtype.kind in 'biuf': #only numeric/bool columns get an array
+                column = df[f].to_numpy(copy=True)
+                column.setflags(write=False)
+                columns[f] = column
+        object.__setattr__(self, 'record_type', record_type)
+        object.__setattr__(self, 'records', records)
+        object.__setattr__(self, 'index', MappingProxyType({r.id: r.idx for r in records}))
+        object.__setattr__(self, 'columns', MappingProxyType(columns))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('stat tables are read-only')
+
+    def __getitem__(self, some_id): #KeyError if the id doesn't exist, same as df.loc
+        return self.records[self.index[some_id]]
+
+    def __contains__(self, some_id):
+        return some_id in self.index
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    @property
+    def ids(self):
+        return tuple(r.id for r in self.records)
+
+    def idx_of(self, some_id): #string id -> integer id
+        return self.index[some_id]
+
+    def get(self, some_id, default=None):
+        idx = self.index.get(some_id)
+        if idx is None:
+            return default
+        return self.records[idx]
+
+class StatRegistry:
+    __slots__ = ('weapons', 'ammo', 'stalkers', 'mutants', 'data_hash')
+
+    def __init__(self, weapons, ammo, stalkers, mutants, data_hash=None):
+        object.__setattr__(self, 'weapons', weapons)
+        object.__setattr__(self, 'ammo', ammo)
+        object.__setattr__(self, 'stalkers', stalkers)
+        object.__setattr__(self, 'mutants', mutants)
+        object.__setattr__(self, 'data_hash', data_hash)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('stat registry is read-only')
+
+    def target(self, some_id): #stalker or mutant record, whichever the id belongs to
+        if some_id in self.stalkers:
+            return self.stalkers[some_id]
+        return self.mutants[some_id]
+
+def build_registry(sim_tables): #takes sim_data.SimTables
+    return StatRegistry(
+        weapons=StatTable(WeaponStats, sim_tables.weapons),
+        ammo=StatTable(AmmoStats, sim_tables.ammo),
+        stalkers=StatTable(StalkerStats, sim_tables.stalkers),
+        mutants=StatTable(MutantStats, sim_tables.mutants),
+        data_hash=sim_tables.data_hash
+    )
@@ -0,0 +1,297 @@
+# Headless sweep: evaluates the cartesian product of the given inputs and writes every row to disk
+# Doesn't import the Dash app. The product is split into shards (a few weapons of one target kind each) that run in a
+# process pool. Every worker builds its own engine and writes its shard straight to the output directory, so
+# nothing big goes back through the pool and throughput scales with cores. Shards are written atomically and listed
+# in manifest.json, so rerunning the same command after an interruption only computes the missing ones.
+#   python damage-sim/sweep.py --out sweeps/ak --weapons 'wpn_ak*' --targets 'stalker_*' --dist 0:300:25 --barrel 50,100
+#   python damage-sim/sweep.py --out sweeps/all --workers 8          everything at 0m, 100% barrel, hard, no faction
+# Output is columnar: one .npz (or .parquet with --format parquet, needs pyarrow) per shard, with input columns stored as
+# integer codes into the value lists in manifest.json. load_sweep() reads a directory back as one DataFrame.
+import argparse
+import fnmatch
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path: #workers started with spawn need this too
+    sys.path.insert(0, SIM_DIR)
+
+from batch_engine import BatchEngine, INPUT_KEYS, HitResult, hitzones_stalkers, hitzones_mutants, difficulties, factions
+from caliber_index import CaliberIndex
+from sim_data import load_tables
+from stat_registry import build_registry
+from weapon_catalog import load_catalog, combined_hash
+
+MANIFEST_VERSION = 1
+DEFAULT_FIELDS = ('penetrated', 'damage', 'shots_to_pen', 'ttk', 'ttk_min', 'ttk_max', 'ttk_seconds', 'one_mag')
+FLOAT_DTYPE = np.float32 #results are stored as float32 to halve the file size, plenty for damage numbers
+
+# Input parsing
+
+def parse_list(text): #'a,b,c' -> ['a', 'b', 'c']
+    return [v.strip() for v in text.split(',') if v.strip()]
+
+def parse_numbers(text): #'0:300:25' (stop included) or '0,10,50' -> sorted list of floats
+    values = set()
+    for part in parse_list(text):
+        if ':' in part:
+            start, stop, step = (float(v) for v in (part.split(':') + ['1'])[:3])
+            if step <= 0:
+                raise ValueError('step must be positive: {}'.format(part))
+            values.update(np.round(np.arange(start, stop + step / 2, step), 6).tolist())
+        else:
+            values.add(float(part))
+    return sorted(values)
+
+def match_ids(patterns, ids, what): #glob patterns -> matching ids in table order, errors on patterns that match nothing
+    if patterns is None:
+        return list(ids)
+    matched = []
+    for pattern in parse_list(patterns):
+        hits = fnmatch.filter(ids, pattern)
+        if not hits:
+            raise ValueError('no {} matches {}'.format(what, pattern))
+        matched.extend(h for h in hits if h not in matched)
+    return [i for i in ids if i in matched]
+
+def build_spec(registry, args, data_hash): #command line -> json-able description of the whole sweep, data_hash covers the catalog too
+    targets = match_ids(args.targets, registry.stalkers.ids + registry.mutants.ids, 'target')
+    spec = {
+        'version': MANIFEST_VERSION,
+        'data_hash': data_hash,
+        'weapons': match_ids(args.weapons, registry.weapons.ids, 'weapon'),
+        'ammo': match_ids(args.ammo, registry.ammo.ids, 'ammo'),
+        'compatible_only': not args.all_ammo,
+        'dist': parse_numbers(args.dist),
+        'barrel': parse_numbers(args.barrel),
+        'game_difficulty': parse_list(args.difficulty),
+        'silencer': {'no': [False], 'yes': [True], 'both': [False, True]}[args.silencer],
+        'fields': parse_list(args.fields),
+        'shard_size': args.shard_size,
+        'kinds': {}
+    }
+    for d in spec['game_difficulty']:
+        if d not in difficulties:
+            raise ValueError('difficulty must be one of {}'.format(', '.join(difficulties)))
+    for f in spec['fields']:
+        if f not in HitResult._fields:
+            raise ValueError('unknown field {}, pick from {}'.format(f, ', '.join(HitResult._fields)))
+    if any(b < 0 or b > 100 for b in spec['barrel']):
+        raise ValueError('barrel is a percentage, 0-100')
+    for kind, table, zones in (('stalker', registry.stalkers, hitzones_stalkers), ('mutant', registry.mutants, hitzones_mutants)):
+        kind_targets = [t for t in targets if t in table]
+        if not kind_targets:
+            continue
+        spec['kinds'][kind] = {
+            'target': kind_targets,
+            'hitzone': [z for z in zones if args.hitzones is None or z in parse_list(args.hitzones)],
+            'faction': parse_list(args.factions) if kind == 'stalker' else ['other'], #mutants don't have factions
+        }
+        if not spec['kinds'][kind]['hitzone']:
+            raise ValueError('none of the hitzones apply to {} targets ({})'.format(kind, ', '.join(zones)))
+        for f in spec['kinds'][kind]['faction']:
+            if f not in factions:
+                raise ValueError('faction must be one of {}'.format(', '.join(factions)))
+    if not spec['kinds']:
+        raise ValueError('no targets selected')
+    return spec
+
+def shards(spec): #[(kind, shard number, weapon ids)]
+    out = []
+    for kind in spec['kinds']:
+        weapons = spec['weapons']
+        for n, start in enumerate(range(0, len(weapons), spec['shard_size'])):
+            out.append((kind, n, weapons[start:start + spec['shard_size']]))
+    return out
+
+def shard_name(kind, n, fmt):
+    return '{}-{:05d}.{}'.format(kind, n, fmt)
+
+# Workers
+
+_worker = {}
+
+def _init_worker():
+    sim_tables = load_tables()
+    registry = build_registry(sim_tables)
+    catalog = load_catalog(registry)
+    _worker['engine'] = BatchEngine(registry, catalog)
+    _worker['data_hash'] = combined_hash(registry.data_hash, catalog)
+    _worker['calibers'] = CaliberIndex(registry)
+
+def _code_dtype(n): #smallest unsigned int that can index n values
+    return np.uint8 if n <= 256 else np.uint16 if n <= 65536 else np.uint32
+
+def run_shard(spec, kind, n, weapons, out_dir, fmt, compress=False): #evaluates one shard and writes it, returns (file name, rows)
+    engine, calibers = _worker['engine'], _worker['calibers']
+    axes = spec['kinds'][kind]
+    values = dict(axes, weapon=spec['weapons'], bullet=spec['ammo'], dist=spec['dist'], barrel=spec['barrel'],
+                  game_difficulty=spec['game_difficulty'], silencer=spec['silencer'])
+    lookups = {key: {v: i for i, v in enumerate(values[key])} for key in INPUT_KEYS}
+    columns = {key: [] for key in INPUT_KEYS + tuple(spec['fields'])}
+    for weapon in weapons: #one weapon at a time, so the ammo axis can be just what it fires
+        ammo = spec['ammo']
+        if spec['compatible_only']:
+            fires = set(calibers.compatible(weapon))
+            ammo = [a for a in ammo if a in fires]
+        if not ammo:
+            continue
+        grid_values = dict(values, weapon=[weapon], bullet=ammo, barrel=[b / 100 for b in spec['barrel']])
+        codes = [c.astype(np.intp) if c.dtype == bool else c for c in engine.encode(grid_values, kind)] #np.ix_ treats bools as masks
+        grid = np.ix_(*codes)
+        result = engine.evaluate(kind, *grid, armor_override=None)
+        shape = result.ttk.shape
+        # row codes per input column: position in the manifest's value list for that input
+        local = dict(grid_values, barrel=spec['barrel'])
+        for axis, key in enumerate(INPUT_KEYS):
+            axis_codes = np.array([lookups[key][v] for v in local[key]], dtype=_code_dtype(len(values[key])))
+            index = [None] * len(INPUT_KEYS)
+            index[axis] = slice(None)
+            columns[key].append(np.broadcast_to(axis_codes[tuple(index)], shape).ravel())
+        for field in spec['fields']:
+            column = getattr(result, field).ravel()
+            columns[field].append(column.astype(FLOAT_DTYPE) if column.dtype.kind == 'f' else column)
+    columns = {k: np.concatenate(v) if v else np.array([]) for k, v in columns.items()}
+    name = shard_name(kind, n, fmt)
+    _write_atomic(os.path.join(out_dir, name), columns, fmt, compress)
+    return name, len(columns['weapon'])
+
+def _write_atomic(path, columns, fmt, compress=False):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if fmt == 'parquet':
+                import pandas as pd
+                pd.DataFrame(columns).to_parquet(f, index=False, compression='zstd' if compress else 'snappy')
+            elif compress:
+                np.savez_compressed(f, **columns)
+            else:
+                np.savez(f, **columns)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+# Manifest
+
+def read_manifest(out_dir):
+    path = os.path.join(out_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, 'manifest.json')
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+
+def load_sweep(out_dir): #whole sweep directory -> one DataFrame with the input columns decoded as categoricals
+    import pandas as pd
+    manifest = read_manifest(out_dir)
+    if manifest is None:
+        raise ValueError('{} has no manifest.json'.format(out_dir))
+    spec, frames = manifest['spec'], []
+    for kind in spec['kinds']:
+        values = dict(spec['kinds'][kind], weapon=spec['weapons'], bullet=spec['ammo'], dist=spec['dist'], barrel=spec['barrel'],
+                      game_difficulty=spec['game_difficulty'], silencer=spec['silencer'])
+        for name in sorted(n for n in manifest['done'] if n.startswith(kind + '-')):
+            path = os.path.join(out_dir, name)
+            if name.endswith('.parquet'):
+                columns = pd.read_parquet(path).to_dict('series')
+            else:
+                with np.load(path) as data:
+                    columns = {k: data[k] for k in data.files}
+            if not len(columns['weapon']):
+                continue
+            frame = pd.DataFrame({k: np.asarray(v) for k, v in columns.items()})
+            for key in INPUT_KEYS:
+                frame[key] = pd.Categorical.from_codes(frame[key].astype(np.int64), categories=pd.Index(values[key]))
+            frame.insert(0, 'kind', kind)
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# CLI
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate a grid of damage sim inputs and write every row to disk')
+    parser.add_argument('--out', required=True, help='output directory, rerun with the same one to resume')
+    parser.add_argument('--weapons', help="comma separated ids or globs, e.g. 'wpn_ak*,wpn_svd' (default: all)")
+    parser.add_argument('--ammo', help='ids or globs (default: all)')
+    parser.add_argument('--all-ammo', action='store_true', help="pair weapons with ammo they can't fire as well")
+    parser.add_argument('--targets', help="stalker and/or mutant ids or globs (default: all)")
+    parser.add_argument('--hitzones', help='hitzones, ones that do not apply to a target kind are skipped (default: all)')
+    parser.add_argument('--factions', default='other', help='stalker factions: {}'.format(','.join(factions)))
+    parser.add_argument('--dist', default='0', help="metres, '0,50,100' or start:stop:step like '0:300:10'")
+    parser.add_argument('--barrel', default='100', help='barrel condition in percent, same syntax as --dist')
+    parser.add_argument('--difficulty', default='hard', help='difficulties: {}'.format(','.join(difficulties)))
+    parser.add_argument('--silencer', choices=['no', 'yes', 'both'], default='no')
+    parser.add_argument('--fields', default=','.join(DEFAULT_FIELDS), help='result columns to keep')
+    parser.add_argument('--shard-size', type=int, default=4, help='weapons per shard')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes (default: one per core)')
+    parser.add_argument('--format', choices=['npz', 'parquet'], default='npz')
+    parser.add_argument('--compress', action='store_true', help='smaller files, slower to write')
+    parser.add_argument('--overwrite', action='store_true', help='start over if --out holds a different sweep')
+    args = parser.parse_args(argv)
+
+    _init_worker() #the parent builds one too, for validating the inputs
+    try:
+        spec = build_spec(_worker['engine'].registry, args, _worker['data_hash'])
+    except ValueError as e:
+        parser.error(str(e))
+    if args.format == 'parquet' and importlib.util.find_spec('pyarrow') is None: #only checks it's there, the shards import it
+        parser.error('--format parquet needs pyarrow installed')
+
+    os.makedirs(args.out, exist_ok=True)
+    for name in os.listdir(args.out): #half-written shards from an interrupted run
+        if name.endswith('.tmp'):
+            os.remove(os.path.join(args.out, name))
+    manifest = read_manifest(args.out)
+    if manifest is not None and (manifest['spec'] != spec or manifest['format'] != args.format):
+        if not args.overwrite:
+            parser.error('{} holds a different sweep (or the data changed), pass --overwrite to replace it'.format(args.out))
+        for name in manifest['done']:
+            if os.path.exists(os.path.join(args.out, name)):
+                os.remove(os.path.join(args.out, name))
+        manifest = None
+    if manifest is None:
+        manifest = {'spec': spec, 'format': args.format, 'done': {}}
+        write_manifest(args.out, manifest)
+
+    todo = [(kind, n, weapons) for kind, n, weapons in shards(spec)
+            if shard_name(kind, n, args.format) not in manifest['done']
+            or not os.path.exists(os.path.join(args.out, shard_name(kind, n, args.format)))]
+    total = len(shards(spec))
+    print('{} shards, {} already done'.format(total, total - len(todo)))
+    start = time.perf_counter()
+    rows = 0
+    def finished(name, count):
+        nonlocal rows
+        rows += count
+        manifest['done'][name] = count
+        write_manifest(args.out, manifest) #after every shard, so a kill loses at most the shards in flight
+        elapsed = time.perf_counter() - start
+        print('{}/{} {} ({:,} rows, {:,.0f} rows/s)'.format(len(manifest['done']), total, name, count, rows / elapsed))
+
+    if args.workers <= 1:
+        for kind, n, weapons in todo:
+            finished(*run_shard(spec, kind, n, weapons, args.out, args.format, args.compress))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(run_shard, spec, kind, n, weapons, args.out, args.format, args.compress) for kind, n, weapons in todo]
+            for future in as_completed(futures):
+                finished(*future.result())
+    print('done: {:,} rows in {:.1f}s, {:,} rows total in {}'.format(rows, time.perf_counter() - start, sum(manifest['done'].values()), args.out))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# Weapon handling stats from the items database, joined onto the damage sim's weapons
+# The items spreadsheet has fire rate, magazine size and muzzle velocity for the same wpn_* ids. Those are
+# what turn a shot count into seconds. Weapons missing from the spreadsheet get NaN,
+# and the engine reports NaN timings for them instead of guessing.
+import os
+import hashlib
+import pandas as pd
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ITEMS_CSV = os.environ.get('GAMMA_ITEMS_CSV', os.path.join(os.path.dirname(SIM_DIR), 'items-database', 'src', '240628_weapons.csv'))
+
+# spreadsheet column: catalog column
+CATALOG_COLUMNS = {
+    'Fire Rate': 'fire_rate', #rounds per minute
+    'Mag Size': 'mag_size',
+    'Muzzle Velocity (m/s)': 'muzzle_velocity'
+}
+
+def read_items(path=ITEMS_CSV): #handling columns only, indexed by weapon id
+    items = pd.read_csv(path, index_col=0, usecols=['Unnamed: 0'] + list(CATALOG_COLUMNS))
+    items.index.name = 'id'
+    items = items.rename(columns=CATALOG_COLUMNS)
+    items = items[~items.index.duplicated()] #first row wins, same as the items page
+    for col in CATALOG_COLUMNS.values():
+        items[col] = pd.to_numeric(items[col], errors='coerce').astype(float)
+    return items
+
+def load_catalog(registry, path=ITEMS_CSV):
+    # one row per damage-sim weapon, in registry order, with name/hit_power plus the handling columns
+    weapons = pd.DataFrame({'name': [w.name for w in registry.weapons], 'hit_power': registry.weapons.columns['hit_power']},
+                           index=pd.Index(registry.weapons.ids, name='id'))
+    try:
+        items = read_items(path)
+    except (OSError, ValueError) as e:
+        print('Error: could not read weapon handling stats from {}: {}'.format(path, e))
+        items = pd.DataFrame(columns=list(CATALOG_COLUMNS.values()), dtype=float)
+    catalog = weapons.join(items, how='left')
+    # 0 rpm / 0 m/s would turn into inf seconds, treat them as unknown
+    for col in ('fire_rate', 'muzzle_velocity'):
+        catalog.loc[catalog[col] <= 0, col] = float('nan')
+    return catalog
+
+def combined_hash(data_hash, catalog):
+    # sim tables hash (sim_data.hash_sources) + the catalog's handling columns -> one hash for everything results depend on,
+    # so an items csv change alone still gives new data. None stays None (remote tables aren't hashed)
+    if data_hash is None:
+        return None
+    h = hashlib.sha256(data_hash.encode())
+    h.update(pd.util.hash_pandas_object(catalog[list(CATALOG_COLUMNS.values())]).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+def missing_weapons(catalog): #weapon ids the items database doesn't cover
+    return list(catalog.index[catalog[list(CATALOG_COLUMNS.values())].isna().any(axis=1)])
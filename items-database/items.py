@@ -5,12 +5,15 @@ from dash.exceptions import PreventUpdate
 #import plotly.express as px
 import pandas as pd
 import re, math, os
+from items_query import TableQuery
+from items_schema import load_items, column_defs, display_records
 
 # Import data
 
-wpns_df = pd.read_csv('items-database/src/240628_weapons.csv')
-wpns_df.rename(columns={'Unnamed: 0':'Weapon ID'}, inplace=True)
+wpns_df = load_items('items-database/src/240628_weapons.csv') #typed columns, see items_schema
 # Do stuff here
+wpns_query = TableQuery(wpns_df, to_records=display_records) #filtering/sorting/paging happens server-side, see update_table
+PAGE_SIZE = 25
 
 
 # Initialize app
@@ -25,8 +28,16 @@ title_section = dbc.NavbarSimple( #header
 
 wpn_table = html.Div(
     dash_table.DataTable(
-        wpns_df.to_dict('records'), 
-        [{"name": i, "id": i} for i in wpns_df.columns],
+        id='wpn-table',
+        columns=column_defs(wpns_df),
+        page_current=0,
+        page_size=PAGE_SIZE,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='multi',
+        sort_by=[],
+        filter_action='custom',
+        filter_query='',
         style_table={'overflowX': 'scroll'}
     )
 )
@@ -41,6 +52,21 @@ app.layout = [
 ]
 
 # Callbacks
+@callback(
+    Output('wpn-table', 'data'),
+    Output('wpn-table', 'page_count'),
+    Output('wpn-table', 'page_current'),
+    Input('wpn-table', 'page_current'),
+    Input('wpn-table', 'page_size'),
+    Input('wpn-table', 'sort_by'),
+    Input('wpn-table', 'filter_query')
+)
+
+def update_table(page_current, page_size, sort_by, filter_query): #only the visible page goes to the browser
+    if ctx.triggered_id is not None and 'wpn-table.page_current' not in ctx.triggered_prop_ids: #new filter/sort, back to the first page
+        page_current = 0
+    records, page_count, total = wpns_query.page(page_current, page_size, sort_by, filter_query)
+    return records, page_count, page_current
 
 # Run the app
 
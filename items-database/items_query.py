@@ -0,0 +1,120 @@
+# Server-side filtering, sorting and paging for the items DataTable
+# Understands the DataTable filter_query syntax ({Col} op value && ...) and sort_by list, so the table can run with
+# page_action/sort_action/filter_action='custom' and only the visible page gets sent to the browser.
+# Filter + sort results are cached as row orders, so flipping through pages is just a slice.
+import math
+from collections import OrderedDict
+import threading
+import pandas as pd
+
+# (operator as typed in the filter box, internal name); longest first so '>=' wins over '>'
+OPERATORS = [
+    ('>=', 'ge'), ('<=', 'le'), ('!=', 'ne'),
+    ('ge ', 'ge'), ('le ', 'le'), ('lt ', 'lt'), ('gt ', 'gt'), ('ne ', 'ne'), ('eq ', 'eq'),
+    ('<', 'lt'), ('>', 'gt'), ('=', 'eq'),
+    ('contains ', 'contains'), ('datestartswith ', 'datestartswith')
+]
+
+def split_filter_part(filter_part): #'{Name} icontains ak' -> ('Name', 'contains', 'ak', False), or (None, None, None, None)
+    # last item is the case prefix: True for s (sensitive), False for i (insensitive), None for no prefix
+    for typed, name in OPERATORS:
+        for prefix, case in (('', None), ('s', True), ('i', False)):
+            op = prefix + typed
+            if op not in filter_part:
+                continue
+            left, _, right = filter_part.partition(op)
+            left, right = left.strip(), right.strip()
+            if not (left.startswith('{') and left.endswith('}')):
+                continue
+            column = left[1:-1]
+            if right and right[0] == right[-1] and right[0] in ('"', "'", '`'): #quoted value
+                right = right[1:-1].replace('\\' + right[0], right[0])
+            return column, name, right, case
+    return None, None, None, None
+
+def _mask(series, op, value, case=None):
+    # case None = the defaults: contains ignores case, everything else on text is exact
+    if op in ('contains', 'datestartswith'):
+        text = series.astype(str)
+        if op == 'contains':
+            return text.str.contains(value, case=bool(case), regex=False)
+        if case is False:
+            return text.str.lower().str.startswith(value.lower())
+        return text.str.startswith(value)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        try:
+            value = float(value)
+        except ValueError: #text compared against a number column never matches
+            return pd.Series(False, index=series.index)
+    elif pd.api.types.is_bool_dtype(series):
+        value = str(value).strip().lower() in ('true', 'yes', '1')
+    else:
+        series = series.astype(str)
+        if case is False:
+            series, value = series.str.lower(), str(value).lower()
+    if op == 'eq':
+        return series == value
+    elif op == 'ne':
+        return series != value
+    elif op == 'lt':
+        return series < value
+    elif op == 'le':
+        return series <= value
+    elif op == 'gt':
+        return series > value
+    elif op == 'ge':
+        return series >= value
+    raise ValueError('Unknown filter operator: {}'.format(op))
+
+def filter_df(df, filter_query):
+    if not filter_query:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for part in filter_query.split(' && '):
+        column, op, value, case = split_filter_part(part)
+        if column is None or column not in df.columns: #half-typed filters are ignored
+            continue
+        mask &= _mask(df[column], op, value, case).fillna(False).astype(bool)
+    return df[mask]
+
+def sort_df(df, sort_by):
+    sort_by = [s for s in (sort_by or []) if s.get('column_id') in df.columns]
+    if not sort_by:
+        return df
+    return df.sort_values(
+        [s['column_id'] for s in sort_by],
+        ascending=[s.get('direction', 'asc') == 'asc' for s in sort_by],
+        na_position='last',
+        kind='mergesort' #stable, so ties keep csv order
+    )
+
+class TableQuery:
+
+    def __init__(self, df, cache_size=64, to_records=None):
+        self.df = df.reset_index(drop=True) #labels double as row positions from here on
+        self.to_records = to_records or (lambda page: page.to_dict('records')) #page df -> DataTable records
+        self.cache_size = cache_size
+        self._orders = OrderedDict() #(filter_query, sort key) -> row positions, most recent last
+        self._lock = threading.Lock()
+
+    def _order(self, filter_query, sort_by):
+        key = (filter_query or '', tuple((s.get('column_id'), s.get('direction')) for s in (sort_by or [])))
+        with self._lock:
+            if key in self._orders:
+                self._orders.move_to_end(key)
+                return self._orders[key]
+        order = sort_df(filter_df(self.df, filter_query), sort_by).index.to_numpy()
+        with self._lock:
+            self._orders[key] = order
+            while len(self._orders) > self.cache_size:
+                self._orders.popitem(last=False)
+        return order
+
+    def page(self, page_current=0, page_size=25, sort_by=None, filter_query=''):
+        # returns (records for this page, page count, number of matching rows)
+        order = self._order(filter_query, sort_by)
+        page_current = page_current or 0
+        start = page_current * page_size
+        page = self.df.iloc[order[start:start + page_size]]
+        page_count = max(1, math.ceil(len(order) / page_size))
+        return self.to_records(page), page_count, len(order)
@@ -0,0 +1,72 @@
+# Load-time schema for the items spreadsheet
+# The csv stores percentages as "54%", repeats a handful of category strings on every row and uses Yes/No text.
+# apply_schema turns those into numbers, categoricals and booleans so filters and sorts are numeric and vectorized
+# ("54%" used to sort as text) and the table takes less memory. column_defs/display_records put the % and Yes/No back for display.
+import pandas as pd
+from dash.dash_table.Format import Format, Group, Symbol
+
+ID_COLUMN = 'Weapon ID'
+PERCENT_COLUMNS = ['Reliability']
+CURRENCY_COLUMNS = ['Cost (₽)']
+CATEGORY_COLUMNS = ['Ammo Type', 'Weapon Kit Type', 'Weapon Class'] #low cardinality, repeated on every row
+BOOL_COLUMNS = ['Obtainable in GAMMA']
+YES_NO = {'yes': True, 'no': False, 'true': True, 'false': False}
+
+def parse_percent(series): #"54%" -> 54.0
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return pd.to_numeric(series.astype(str).str.strip().str.rstrip('%'), errors='coerce')
+
+def parse_currency(series): #"33,000 ₽" -> 33000
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    cleaned = series.astype(str).str.replace(r'[^\d.\-]', '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce', downcast='integer')
+
+def parse_yes_no(series): #Yes/No -> nullable boolean, anything else -> NA
+    return series.astype(str).str.strip().str.lower().map(YES_NO).astype('boolean')
+
+def apply_schema(df):
+    df = df.copy()
+    for col in PERCENT_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_percent(df[col])
+    for col in CURRENCY_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_currency(df[col])
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in BOOL_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_yes_no(df[col])
+    for col in df.select_dtypes('integer').columns: #int64 is overkill for stats like mag size
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+def load_items(path): #reads the spreadsheet export and applies the schema
+    df = pd.read_csv(path)
+    df.rename(columns={'Unnamed: 0': ID_COLUMN}, inplace=True)
+    return apply_schema(df)
+
+def column_defs(df): #DataTable columns, numeric ones typed so the filter box compares numbers
+    columns = []
+    for col in df.columns:
+        column = {'name': col, 'id': col}
+        if col in PERCENT_COLUMNS:
+            column.update(type='numeric', format=Format(symbol=Symbol.yes, symbol_suffix='%'))
+        elif col in CURRENCY_COLUMNS:
+            column.update(type='numeric', format=Format(group=Group.yes))
+        elif pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+            column['type'] = 'numeric'
+        columns.append(column)
+    return columns
+
+def display_records(df): #one page of the typed table -> DataTable records, booleans shown as Yes/No again
+    records = df.to_dict('records')
+    bool_cols = [col for col in BOOL_COLUMNS if col in df.columns]
+    for row in records:
+        for col in bool_cols:
+            value = row[col]
+            row[col] = None if pd.isna(value) else ('Yes' if value else 'No')
+    return records